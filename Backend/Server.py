@@ -1,17 +1,82 @@
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form
-from pydantic import BaseModel, EmailStr
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Request, Depends, Header, Body
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, FileResponse
+from pydantic import BaseModel, EmailStr, ValidationError, validator
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.staticfiles import StaticFiles
+from typing import Any, List, Optional
 from datetime import datetime
+from contextlib import asynccontextmanager
 from bson import ObjectId
-import shutil
 import os
 import json
-import re
 
-app = FastAPI()
+from storage import Storage, DRIVER_ASYNC, pool_options_from_env
+from indexes import ensure_indexes
+from analytics import (
+    STATS_COLLECTION, ensure_counters, read_analytics,
+    record_orders_placed, record_status_changes,
+)
+from health import Readiness
+from auth import PasswordHasher, InvalidToken, issue_token, verify_token
+from profiling import PROFILE_DIR, ProfilerMiddleware, list_profiles, profile_path
+from metrics import registry, CommandMetrics, CheckoutMetrics, MetricsMiddleware
+from slow_queries import SlowQueryLog
+from order_journal import WRITE_BEHIND, JOURNAL_DIR, OrderJournal
+from user_cache import KnownUsers
+from single_flight import SingleFlight
+from response_cache import (
+    ANALYTICS_TAG, ResponseCache, backend_from_env, order_tag, status_tag, user_tag,
+)
+from repositories import (
+    RECENT_HISTORY, DuplicateError, MongoUserRepository, MongoOrderRepository, MongoOrderEventRepository,
+    MongoFoodRepository, MongoVersionRepository,
+)
+from sqlite_repositories import (
+    SqliteStore, SqliteUserRepository, SqliteOrderRepository, SqliteOrderEventRepository, SqliteFoodRepository,
+    SqliteVersionRepository, read_order_analytics,
+)
+from order_history import (
+    EVENTS_COLLECTION, DEFAULT_TIMELINE_PAGE, HISTORY_IN_EVENTS, decode_event_cursor, history_events,
+    legacy_history_events, timeline_page,
+)
+from events import hub, stream_events, ORDER_CREATED, STATUS_CHANGED
+from assets_js import AssetsJsWriter
+from image_variants import VARIANTS_SUBDIR, VARIANTS_URL, VariantQueue, variant_urls
+from images import MAX_IMAGE_BYTES, ImageTooLarge, UnsupportedImage, store_upload, release_image
+from menu_cache import VERSIONS_COLLECTION, MenuSnapshot
+from responses import FAST_JSON, dumps, body_response
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, fetch_page, stream_orders
+
+@asynccontextmanager
+async def lifespan(app):
+    # Runs in each worker after uvicorn/gunicorn has forked it, so every
+    # process opens its own Mongo client and connection pool (or SQLite connections)
+    connect_store()
+    await startup_db()
+    try:
+        yield
+    finally:
+        await shutdown_db()
+
+app = FastAPI(lifespan=lifespan)
+
+# Optional shared secret for /admin/* routes and request profiling (sent as X-Admin-Token)
+ADMIN_TOKEN = os.getenv("FOODPREP_ADMIN_TOKEN")
+
+# Uploads are parsed in full before add_food_item runs, so turn away
+# oversized requests from their Content-Length before the body is read
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path == "/add_food_item":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGE_BYTES + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Image exceeds the {MAX_IMAGE_BYTES // 1024} KB upload limit"}
+            )
+    return await call_next(request)
 
 # Enable CORS (adjust in production)
 app.add_middleware(
@@ -22,18 +87,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# X-Profile: 1 with the admin token, or FOODPREP_PROFILE_SAMPLE_EVERY=N, profiles requests into PROFILE_DIR
+app.add_middleware(ProfilerMiddleware, admin_token=ADMIN_TOKEN)
+
+# Outermost, so every request is counted, including ones turned away by the layers above
+app.add_middleware(MetricsMiddleware, router=app.router)
+
 # MongoDB connection
-MONGO_URI = "mongodb://localhost:27017/"
-DB_NAME = "foodprep"
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-db = client[DB_NAME]
-user_collection = db["user_data"]
-order_collection = db["orders"]
-food_collection = db["food_items"]  # New collection for food items
+MONGO_URI = os.getenv("FOODPREP_MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME = os.getenv("FOODPREP_DB_NAME", "foodprep")
+# "async" uses PyMongo's asyncio client; "sync" keeps the blocking MongoClient
+# but runs every call in the threadpool (the pre-async behaviour, for comparison)
+DB_DRIVER = os.getenv("FOODPREP_DB_DRIVER", DRIVER_ASYNC)
+# Nothing connects here: the client is created per process by the lifespan
+# (or on first use by the CLIs), with pool sizes from FOODPREP_MONGO_* variables
+# Reads slower than FOODPREP_SLOW_QUERY_MS are logged with their redacted shape and plan
+slow_query_log = SlowQueryLog()
+storage = Storage(
+    MONGO_URI, DB_NAME, driver=DB_DRIVER,
+    listeners=[CommandMetrics(), CheckoutMetrics(), slow_query_log],
+    **pool_options_from_env()
+)
+# "mongo" (default), or "sqlite" for a single node: one WAL-mode file at FOODPREP_SQLITE_PATH,
+# shared by every worker.  SQLite has no analytics counters (/order_analytics aggregates the
+# orders table instead), and the Mongo-only admin tools (pool stats, the CLIs) refuse to run.
+STORE = os.getenv("FOODPREP_STORE", "mongo")
+SQLITE_PATH = os.getenv("FOODPREP_SQLITE_PATH", "foodprep.sqlite3")
+# Entity reads and writes go through repositories, so the routes run unchanged on either store
+if STORE == "mongo":
+    sqlite_store = None
+    user_collection = storage.collection("user_data")
+    order_collection = storage.collection("orders")
+    food_collection = storage.collection("food_items")  # New collection for food items
+    stats_collection = storage.collection(STATS_COLLECTION)  # Running totals for /order_analytics
+    user_repo = MongoUserRepository(user_collection)
+    order_repo = MongoOrderRepository(order_collection)
+    food_repo = MongoFoodRepository(food_collection)
+    # Full status timelines; orders keep only their last RECENT_HISTORY entries (see order_history.py)
+    order_event_repo = MongoOrderEventRepository(storage.collection(EVENTS_COLLECTION))
+    # Cross-worker cache versions
+    version_repo = MongoVersionRepository(storage.collection(VERSIONS_COLLECTION))
+elif STORE == "sqlite":
+    sqlite_store = SqliteStore(SQLITE_PATH)
+    user_collection = order_collection = food_collection = stats_collection = None
+    user_repo = SqliteUserRepository(sqlite_store)
+    order_repo = SqliteOrderRepository(sqlite_store)
+    food_repo = SqliteFoodRepository(sqlite_store)
+    order_event_repo = SqliteOrderEventRepository(sqlite_store)
+    version_repo = SqliteVersionRepository(sqlite_store)
+else:
+    raise RuntimeError(f"Unknown FOODPREP_STORE {STORE!r}; use 'mongo' or 'sqlite'")
+
+def connect_store():
+    if sqlite_store is not None:
+        sqlite_store.connect()
+    else:
+        storage.connect()
+
+async def close_store():
+    if sqlite_store is not None:
+        sqlite_store.close()
+    else:
+        await storage.close()
+
+def require_mongo(feature):
+    if sqlite_store is not None:
+        raise HTTPException(status_code=501, detail=f"{feature} needs FOODPREP_STORE=mongo")
+
+# Emails of registered users, so most checkouts skip the user lookup
+known_users = KnownUsers(user_repo)
+# Identical concurrent reads of hot order endpoints share one query (see single_flight.py)
+read_flights = SingleFlight()
+# Encoded order responses shared by every worker, invalidated by tag (FOODPREP_RESPONSE_CACHE)
+response_cache = ResponseCache(backend_from_env())
+
+async def forget_order_reads(order_ids=(), statuses=(), emails=()):
+    """Drop coalesced and cached reads that a write to these orders/statuses/users makes stale"""
+    statuses, emails = set(statuses), set(emails)
+    read_flights.invalidate(
+        ("order_analytics",),
+        *[(route, order_id) for order_id in order_ids
+          for route in ("track_order", "order_status", "order_timeline")],
+        *[("orders_by_status", status) for status in statuses],
+        *[(route, email) for email in emails for route in ("get_user_orders", "get_latest_order")],
+    )
+    await response_cache.invalidate(
+        ANALYTICS_TAG,
+        *map(order_tag, order_ids),
+        *map(status_tag, statuses),
+        *map(user_tag, emails),
+    )
+
+async def count_orders_placed(orders):
+    """Add ``(status, total, orderDate)`` new orders to the analytics counters; SQLite keeps none"""
+    if stats_collection is not None:
+        await record_orders_placed(stats_collection, orders)
+
+async def count_status_changes(changes):
+    """Move ``(old_status, new_status, total)`` orders between the analytics counters; SQLite keeps none"""
+    if stats_collection is not None:
+        await record_status_changes(stats_collection, changes)
+
+async def journal_flushed(flushed):
+    await order_event_repo.add_many([event for o in flushed for event in history_events(o)])
+    await forget_order_reads(
+        [o["orderId"] for o in flushed], [o["status"] for o in flushed], [o["userEmail"] for o in flushed]
+    )
+    await count_orders_placed([(o["status"], o["total"], o["orderDate"]) for o in flushed])
+
+async def journal_rejected(rejected):
+    # Acknowledged but clashing with a stored orderId; reads must stop showing the buffered copy
+    await forget_order_reads([o["orderId"] for o in rejected], emails=[o["userEmail"] for o in rejected])
+
+# FOODPREP_ORDER_WRITE_BEHIND=1: place_order acknowledges once the order is in a local
+# fsync'd journal; a background flusher batch-inserts it and updates analytics
+order_journal = (
+    OrderJournal(JOURNAL_DIR, order_repo, on_flushed=journal_flushed, on_rejected=journal_rejected)
+    if WRITE_BEHIND else None
+)
+# scrypt hashing/verification runs here, never on the event loop (FOODPREP_AUTH_WORKERS)
+password_hasher = PasswordHasher()
 
 # File paths - adjust these according to your project structure
 ASSETS_JS_PATH = "./../src/assets/assets/assets.js"
 IMAGES_DIR = "./../src/assets/assets"
+assets_writer = AssetsJsWriter(ASSETS_JS_PATH, food_repo)
+variant_queue = VariantQueue(IMAGES_DIR, food_repo, on_change=lambda: menu_snapshot.invalidate())
+
+# Resized variants are produced by the server, so it serves them too
+app.mount(VARIANTS_URL, StaticFiles(directory=os.path.join(IMAGES_DIR, VARIANTS_SUBDIR), check_dir=False))
 
 # ==============================
 # Models
@@ -79,11 +261,34 @@ class PlaceOrderRequest(BaseModel):
     orderDate: str
     status: str
 
+    # Both feed the analytics counters' $inc paths, so reject bad values before any write
+    @validator("status")
+    def status_is_known(cls, value):
+        if value not in ORDER_STATUSES:
+            raise ValueError(f"Invalid status. Valid statuses are: {', '.join(ORDER_STATUSES)}")
+        return value
+
+    @validator("orderDate")
+    def order_date_is_iso(cls, value):
+        try:
+            # fromisoformat only accepts a trailing Z from Python 3.11
+            parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+        except ValueError:
+            raise ValueError("orderDate must be an ISO-8601 date or timestamp")
+        if value[:10] != parsed.date().isoformat():
+            raise ValueError("orderDate must start with the date as YYYY-MM-DD")
+        return value
+
 class UpdateOrderStatusRequest(BaseModel):
     orderId: str
     status: str
     updatedAt: Optional[str] = None
 
+class BulkUpdateOrderStatusRequest(BaseModel):
+    orderIds: List[str]
+    status: str
+    updatedAt: Optional[str] = None
+
 class FoodItem(BaseModel):
     name: str
     price: float
@@ -94,195 +299,137 @@ class FoodItem(BaseModel):
 # DB Initializer
 # ==============================
 
-def initialize_db():
-    if user_collection.count_documents({}) == 0:
+async def initialize_db():
+    if await user_repo.count() == 0:
         default_users = [
             {
                 "userid": "admin",
                 "email": "admin@prep.com",
-                "password": "admin",
+                "password_hash": await password_hasher.hash("admin"),
                 "role": "owner"
             },
             {
                 "userid": "testuser",
                 "email": "test@example.com",
-                "password": "password123",
+                "password_hash": await password_hasher.hash("password123"),
                 "role": "user"
             }
         ]
-        user_collection.insert_many(default_users)
+        await user_repo.add_many(default_users)
         print("✅ Default users created.")
     else:
         print("ℹ️ Users already exist in database.")
 
-@app.on_event("startup")
-def startup_db():
-    try:
-        client.server_info()
-        initialize_db()
-        # Ensure images directory exists
-        os.makedirs(IMAGES_DIR, exist_ok=True)
-        print("✅ Database connected and initialized.")
-    except ServerSelectionTimeoutError:
-        print("❌ Could not connect to MongoDB.")
+async def warm_up():
+    if sqlite_store is None:
+        await ensure_indexes(storage)
+    await initialize_db()
+    if stats_collection is not None:
+        await ensure_counters(order_collection, stats_collection)
+    print("✅ Database connected and initialized.")
+    # Preload the menu snapshot so the first menu requests after a deploy are not the slow ones
+    await menu_snapshot.current()
+
+# Probes read this cached state instead of pinging MongoDB themselves
+readiness = Readiness(sqlite_store or storage, warm_up)
+
+async def startup_db():
+    # Ensure images directory exists
+    os.makedirs(os.path.join(IMAGES_DIR, VARIANTS_SUBDIR), exist_ok=True)
+    # Connecting, setup and warm-up happen in the background; startup never blocks on MongoDB
+    readiness.start()
+    if sqlite_store is None:
+        slow_query_log.start(storage)
+    if order_journal is not None:
+        # Replays orders journaled before a crash; they are flushed once MongoDB answers
+        await order_journal.start()
+
+async def shutdown_db():
+    await readiness.stop()
+    await slow_query_log.stop()
+    if order_journal is not None:
+        await order_journal.stop()
+    await assets_writer.flush()
+    variant_queue.shutdown()
+    password_hasher.shutdown()
+    await response_cache.close()
+    await close_store()
 
 # ==============================
 # Auth Routes
 # ==============================
 
 @app.post("/login")
-def login_user(request: LoginRequest):
-    user = user_collection.find_one({"email": request.email, "password": request.password})
-    if user:
-        return {
-            "status": "success",
-            "message": "User authenticated",
-            "user": {
-                "userid": user["userid"],
-                "email": user["email"],
-                "name": user.get("name", user["userid"].title()),
-                "role": user.get("role", "user")
-            }
-        }
-    raise HTTPException(status_code=401, detail="Invalid email or password")
+async def login_user(request: LoginRequest):
+    user = await user_repo.get_by_email(request.email)
+    ok, new_hash = await password_hasher.check_user(user, request.password)
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Plaintext password from before hashing: replace it now that we know it
+        await user_repo.set_password_hash(user["email"], new_hash)
+    known_users.remember(user["email"])
+    token, expires_at = issue_token(user)
+    return {
+        "status": "success",
+        "message": "User authenticated",
+        "user": {
+            "userid": user["userid"],
+            "email": user["email"],
+            "name": user.get("name", user["userid"].title()),
+            "role": user.get("role", "user")
+        },
+        "token": token,
+        "expiresAt": datetime.fromtimestamp(expires_at).isoformat()
+    }
+
+def require_session(authorization: Optional[str] = Header(None)):
+    """Claims of the caller's session token (Authorization: Bearer ...); no database lookup"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Session token required",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_token(token.strip())
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/session")
+async def get_session(claims: dict = Depends(require_session)):
+    """Who the session token belongs to and when it expires"""
+    return {
+        "status": "success",
+        "user": {"userid": claims["uid"], "email": claims["sub"], "role": claims["role"]},
+        "expiresAt": datetime.fromtimestamp(claims["exp"]).isoformat()
+    }
 
 @app.post("/register")
-def register_user(request: RegisterRequest):
-    if user_collection.find_one({"userid": request.userid}):
+async def register_user(request: RegisterRequest):
+    if await user_repo.get_by_userid(request.userid):
         raise HTTPException(status_code=409, detail="User ID already exists")
-    if user_collection.find_one({"email": request.email}):
+    if await user_repo.get_by_email(request.email):
         raise HTTPException(status_code=409, detail="Email already exists")
 
     valid_roles = ["user", "manager", "owner"]
     role = request.role if request.role in valid_roles else "user"
 
-    user_collection.insert_one({
-        "userid": request.userid,
-        "password": request.password,
-        "email": request.email,
-        "role": role
-    })
+    try:
+        await user_repo.add({
+            "userid": request.userid,
+            "password_hash": await password_hasher.hash(request.password),
+            "email": request.email,
+            "role": role
+        })
+    except DuplicateError:
+        # Lost a race with a concurrent registration
+        raise HTTPException(status_code=409, detail="User ID or email already exists")
+    known_users.remember(request.email)
     return {"status": "success", "message": f"User registered successfully as {role}"}
 
 # ==============================
 # Food Item Management
 # ==============================
 
-def update_assets_js(item_data, image_filename):
-    """Update the assets.js file with new food item"""
-    try:
-        # Check if assets.js exists
-        if not os.path.exists(ASSETS_JS_PATH):
-            # Create a basic assets.js file
-            initial_content = '''// Food imports will be added here automatically
-
-export const food_list = [
-    // Food items will be added here automatically
-];
-
-export const menu_list = [
-    {
-        menu_name: "Salad",
-        menu_image: ""
-    },
-    {
-        menu_name: "Rolls", 
-        menu_image: ""
-    },
-    {
-        menu_name: "Deserts",
-        menu_image: ""
-    },
-    {
-        menu_name: "Sandwich",
-        menu_image: ""
-    },
-    {
-        menu_name: "Cake",
-        menu_image: ""
-    },
-    {
-        menu_name: "Pure Veg",
-        menu_image: ""
-    },
-    {
-        menu_name: "Pasta",
-        menu_image: ""
-    },
-    {
-        menu_name: "Noodles",
-        menu_image: ""
-    }
-];
-'''
-            with open(ASSETS_JS_PATH, "w", encoding="utf-8") as f:
-                f.write(initial_content)
-
-        with open(ASSETS_JS_PATH, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        # Create import statement
-        import_var_name = f"food_{item_data['id']}"
-        image_import = f'import {import_var_name} from "./{image_filename}";\n'
-        
-        # Add import at the top if not already there
-        if import_var_name not in content:
-            # Find where to insert the import (after existing imports or at the beginning)
-            import_pattern = r'(import.*?from.*?;[\n\r]*)*'
-            match = re.search(import_pattern, content)
-            if match:
-                insert_pos = match.end()
-            else:
-                insert_pos = 0
-            content = content[:insert_pos] + image_import + content[insert_pos:]
-
-        # Create food item object
-        new_item = f'''    {{
-        _id: "{item_data['id']}",
-        name: "{item_data['name']}",
-        image: {import_var_name},
-        price: {item_data['price']},
-        description: "{item_data['description']}",
-        category: "{item_data['category']}"
-    }},'''
-
-        # Find the food_list array and add the new item
-        if "export const food_list = [" in content:
-            # Find the position right after the opening bracket
-            food_list_start = content.find("export const food_list = [") + len("export const food_list = [")
-            
-            # Look for the first non-comment, non-whitespace content after the bracket
-            # If there's already content, add comma and newline before our item
-            remaining_content = content[food_list_start:]
-            first_non_empty_line = ""
-            for line in remaining_content.split('\n'):
-                stripped = line.strip()
-                if stripped and not stripped.startswith('//') and stripped != ']':
-                    first_non_empty_line = stripped
-                    break
-            
-            if first_non_empty_line:
-                # There's existing content, add our item at the beginning with proper formatting
-                content = content[:food_list_start] + "\n" + new_item + content[food_list_start:]
-            else:
-                # Empty array, add our item
-                insert_pos = food_list_start
-                # Find the closing bracket
-                closing_bracket_pos = content.find("];", food_list_start)
-                if closing_bracket_pos != -1:
-                    content = content[:insert_pos] + "\n" + new_item + "\n" + content[closing_bracket_pos:]
-        else:
-            raise ValueError("Could not find food_list export in assets.js")
-
-        # Write the updated content back to the file
-        with open(ASSETS_JS_PATH, "w", encoding="utf-8") as f:
-            f.write(content)
-            
-        return True
-    except Exception as e:
-        print(f"Error updating assets.js: {e}")
-        return False
-
 @app.post("/add_food_item")
 async def add_food_item(
     id: str = Form(...),
@@ -310,53 +457,52 @@ async def add_food_item(
         if image.content_type not in allowed_types:
             raise HTTPException(status_code=400, detail="Invalid image type. Only JPEG, PNG, and WEBP are allowed")
 
-        # Ensure images directory exists
-        os.makedirs(IMAGES_DIR, exist_ok=True)
-
-        # Generate image filename
-        file_extension = os.path.splitext(image.filename)[-1]
-        image_filename = f"food_{id}{file_extension}"
-        image_path = os.path.join(IMAGES_DIR, image_filename)
+        if await food_repo.get(id):
+            raise HTTPException(status_code=409, detail="A food item with this ID already exists")
 
-        # Save image file
+        # Stream to disk in a worker thread, stored under its content hash.
+        # The file stays locked until the item is saved, so deleting another
+        # item that shares the same image cannot remove it meanwhile.
         try:
-            with open(image_path, "wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
+            async with store_upload(image, IMAGES_DIR) as image_filename:
+                # Prepare item data
+                item_data = {
+                    "id": id,
+                    "name": name.strip(),
+                    "price": price,
+                    "description": description.strip(),
+                    "category": category,
+                    "image_filename": image_filename,
+                    "created_at": datetime.now().isoformat()
+                }
+
+                # Save to MongoDB
+                try:
+                    await food_repo.add(item_data)
+                except Exception as e:
+                    # Clean up image file if database save fails and nothing else uses it
+                    await release_image(food_repo, IMAGES_DIR, image_filename)
+                    raise HTTPException(status_code=500, detail=f"Failed to save to database: {str(e)}")
+        except HTTPException:
+            raise
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UnsupportedImage as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
 
-        # Prepare item data
-        item_data = {
-            "id": id,
-            "name": name.strip(),
-            "price": price,
-            "description": description.strip(),
-            "category": category,
-            "image_filename": image_filename,
-            "created_at": datetime.now().isoformat()
-        }
+        # Rebuild assets.js in the background; bursts of adds share one write
+        assets_writer.schedule()
+        await menu_snapshot.invalidate()
+        # Resize in the process pool; the item gains image_variants when done
+        variant_queue.submit(image_filename)
 
-        # Save to MongoDB
-        try:
-            food_collection.insert_one(item_data)
-        except Exception as e:
-            # Clean up image file if database save fails
-            if os.path.exists(image_path):
-                os.remove(image_path)
-            raise HTTPException(status_code=500, detail=f"Failed to save to database: {str(e)}")
-
-        # Update assets.js file
-        assets_updated = update_assets_js(item_data, image_filename)
-        
-        if not assets_updated:
-            print("Warning: Failed to update assets.js file")
-            # Don't fail the entire operation, but log the warning
-            
         return {
             "success": True, 
             "message": f"Item '{name}' added successfully",
             "item_id": id,
-            "assets_updated": assets_updated
+            "assets_updated": True
         }
         
     except HTTPException:
@@ -365,38 +511,47 @@ async def add_food_item(
         print(f"Unexpected error in add_food_item: {e}")
         raise HTTPException(status_code=500, detail="Internal server error occurred")
 
+async def load_menu_items():
+    items = await food_repo.list()
+    for item in items:
+        if "image_variants" in item:
+            item["image_variants"] = variant_urls(item["image_variants"])
+    return items
+
+menu_snapshot = MenuSnapshot(version_repo, load_menu_items)
+
 # Get all food items
 @app.get("/get_food_items")
-def get_food_items():
-    """Get all food items from database"""
+async def get_food_items(request: Request):
+    """Get all food items, served from the pre-encoded menu snapshot"""
     try:
-        items = list(food_collection.find({}, {"_id": 0}))  # Exclude MongoDB's _id field
-        return {"success": True, "items": items}
+        snapshot = await menu_snapshot.current()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve food items: {str(e)}")
+    return snapshot.response(request)
 
 # Delete food item
 @app.delete("/delete_food_item/{item_id}")
-def delete_food_item(item_id: str):
+async def delete_food_item(item_id: str):
     """Delete a food item"""
     try:
         # Find the item first
-        item = food_collection.find_one({"id": item_id})
+        item = await food_repo.get(item_id)
         if not item:
             raise HTTPException(status_code=404, detail="Food item not found")
         
         # Delete from database
-        result = food_collection.delete_one({"id": item_id})
-        
-        if result.deleted_count > 0:
-            # Clean up image file
-            image_path = os.path.join(IMAGES_DIR, item.get("image_filename", ""))
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                except Exception as e:
-                    print(f"Warning: Failed to delete image file: {e}")
+        deleted = await food_repo.delete(item_id)
+        
+        if deleted:
+            # Clean up image file once no other item shares it
+            try:
+                await release_image(food_repo, IMAGES_DIR, item.get("image_filename"))
+            except Exception as e:
+                print(f"Warning: Failed to delete image file: {e}")
             
+            assets_writer.schedule()
+            await menu_snapshot.invalidate()
             return {"success": True, "message": f"Item deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail="Failed to delete item")
@@ -410,13 +565,10 @@ def delete_food_item(item_id: str):
 # Order Placement Routes (Existing)
 # ==============================
 
-@app.post("/place_order")
-async def place_order(order: PlaceOrderRequest):
-    user = user_collection.find_one({"email": order.userEmail})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found. Please register first.")
+MAX_BATCH_ORDERS = 500
 
-    # Add status history for tracking
+def build_order_document(order):
+    """Order as stored, with the initial status history entry"""
     order_data = order.dict()
     order_data["statusHistory"] = [
         {
@@ -426,17 +578,174 @@ async def place_order(order: PlaceOrderRequest):
         }
     ]
     order_data["lastUpdated"] = datetime.now().isoformat()
+    # Its events are written along with it
+    order_data[HISTORY_IN_EVENTS] = True
+    return order_data
 
-    result = order_collection.insert_one(order_data)
-    if result.inserted_id:
+@app.post("/place_order")
+async def place_order(order: PlaceOrderRequest):
+    if not await known_users.exists(order.userEmail):
+        raise HTTPException(status_code=404, detail="User not found. Please register first.")
+
+    order_data = build_order_document(order)
+    if order_journal is not None:
+        try:
+            await order_journal.append(order_data)
+        except DuplicateError:
+            raise HTTPException(status_code=409, detail="Order already exists")
+        await forget_order_reads([order.orderId], emails=[order.userEmail])
+        hub.publish(ORDER_CREATED, serialize_order(dict(order_data)))
         return {"success": True, "orderId": order.orderId}
-    else:
-        raise HTTPException(status_code=500, detail="Order not saved due to server error.")
+
+    try:
+        await order_repo.add(order_data)
+    except DuplicateError:
+        raise HTTPException(status_code=409, detail="Order already exists")
+    await order_event_repo.add_many(history_events(order_data))
+    await count_orders_placed([(order.status, order.total, order.orderDate)])
+    await forget_order_reads([order.orderId], [order.status], [order.userEmail])
+    hub.publish(ORDER_CREATED, serialize_order(order_data))
+    return {"success": True, "orderId": order.orderId}
+
+def validation_detail(error):
+    """A pydantic ValidationError as one line, e.g. 'status: Value error, Invalid status...'"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+@app.post("/place_orders_batch")
+async def place_orders_batch(raw_orders: List[Any] = Body(...)):
+    """Insert a burst of orders from an aggregator or POS feed.
+
+    Safe to retry: an orderId that already exists is reported as a duplicate
+    rather than inserted again.  Each order is validated on its own, so an
+    invalid one is reported as failed instead of rejecting the whole batch.
+    """
+    if not raw_orders:
+        raise HTTPException(status_code=400, detail="No orders provided")
+    if len(raw_orders) > MAX_BATCH_ORDERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ORDERS} orders can be placed at once")
+
+    results = [None] * len(raw_orders)
+    orders = {}  # position in request -> validated order
+    for position, raw in enumerate(raw_orders):
+        if not isinstance(raw, dict):
+            results[position] = {"orderId": None, "status": "failed", "detail": "Order must be a JSON object"}
+            continue
+        try:
+            orders[position] = PlaceOrderRequest(**raw)
+        except ValidationError as e:
+            results[position] = {"orderId": raw.get("orderId"), "status": "failed", "detail": validation_detail(e)}
+
+    known_emails = await known_users.known({order.userEmail for order in orders.values()})
+
+    to_insert = []  # (position in request, order, document)
+    seen_ids = set()
+    for position, order in orders.items():
+        if order.userEmail not in known_emails:
+            results[position] = {"orderId": order.orderId, "status": "failed",
+                                 "detail": "User not found. Please register first."}
+        elif order.orderId in seen_ids:
+            results[position] = {"orderId": order.orderId, "status": "duplicate",
+                                 "detail": "Order ID repeated within the batch"}
+        else:
+            seen_ids.add(order.orderId)
+            to_insert.append((position, order, build_order_document(order)))
+
+    write_errors = await order_repo.add_many([doc for _, _, doc in to_insert])
+
+    inserted = []
+    for index, (position, order, document) in enumerate(to_insert):
+        error = write_errors.get(index)
+        if error is None:
+            inserted.append((order, document))
+            results[position] = {"orderId": order.orderId, "status": "created"}
+        else:
+            code, detail = error
+            results[position] = {"orderId": order.orderId, "status": code, "detail": detail}
+
+    await order_event_repo.add_many([event for _, document in inserted for event in history_events(document)])
+    await count_orders_placed([(order.status, order.total, order.orderDate) for order, _ in inserted])
+    await forget_order_reads(
+        [order.orderId for order, _ in inserted],
+        [order.status for order, _ in inserted],
+        [order.userEmail for order, _ in inserted],
+    )
+    for _, document in inserted:
+        hub.publish(ORDER_CREATED, serialize_order(document))
+
+    return {
+        "success": all(result["status"] != "failed" for result in results),
+        "created": len(inserted),
+        "results": results
+    }
 
 # ==============================
 # Order Tracking Routes (Existing)
 # ==============================
 
+ORDER_STATUSES = ["confirmed", "preparing", "out_for_delivery", "delivered", "cancelled"]
+
+STATUS_DESCRIPTIONS = {
+    "confirmed": "Order confirmed and being processed",
+    "preparing": "Your order is being prepared",
+    "out_for_delivery": "Order is out for delivery",
+    "delivered": "Order has been delivered successfully",
+    "cancelled": "Order has been cancelled"
+}
+
+# Statuses an order may move to from each status; delivered and cancelled are final
+ALLOWED_TRANSITIONS = {
+    "confirmed": ["preparing", "cancelled"],
+    "preparing": ["out_for_delivery", "cancelled"],
+    "out_for_delivery": ["delivered", "cancelled"],
+    "delivered": [],
+    "cancelled": []
+}
+
+MAX_BULK_STATUS_UPDATES = 500
+
+def check_valid_status(status):
+    if status not in ORDER_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid status. Valid statuses are: {', '.join(ORDER_STATUSES)}"
+        )
+
+def allowed_previous_statuses(status):
+    return [previous for previous, nexts in ALLOWED_TRANSITIONS.items() if status in nexts]
+
+def build_status_update(status, updated_at=None):
+    """$set/$push that moves an order to status and records it in its recent statusHistory"""
+    return {
+        "$set": {
+            "status": status,
+            "lastUpdated": datetime.now().isoformat(),
+            # Callers copy any legacy inline history to order_events first
+            HISTORY_IN_EVENTS: True
+        },
+        "$push": {
+            "statusHistory": {
+                "$each": [{
+                    "status": status,
+                    "timestamp": updated_at or datetime.now().isoformat(),
+                    "description": STATUS_DESCRIPTIONS.get(status, "Status updated")
+                }],
+                "$slice": -RECENT_HISTORY
+            }
+        }
+    }
+
+def status_entry(update_data):
+    """The statusHistory entry (and order event) recorded by update_data"""
+    return update_data["$push"]["statusHistory"]["$each"][0]
+
+def apply_status_update(order, update_data):
+    """Return order as it looks after update_data, without re-reading it"""
+    updated = {**order, **update_data["$set"]}
+    updated["statusHistory"] = (list(order.get("statusHistory", [])) + [status_entry(update_data)])[-RECENT_HISTORY:]
+    return updated
+
 def serialize_order(order):
     if "_id" in order:
         order["_id"] = str(order["_id"])
@@ -446,175 +755,445 @@ def serialize_order(order):
         order["lastUpdated"] = order["lastUpdated"].isoformat()
     return order
 
+def encode_order(order):
+    """One order as JSON text, for the streamed list responses"""
+    if FAST_JSON:
+        return dumps(order).decode()
+    return json.dumps(serialize_order(order), default=str)
+
+def encode_body(payload):
+    """A route's JSON response body; orders must already be serialized unless FAST_JSON is on"""
+    if FAST_JSON:
+        return dumps(payload)
+    return json.dumps(payload, default=str).encode()
+
+def encode_order_body(order):
+    return encode_order(order).encode()
+
+def encode_order_list(result):
+    """fetch_orders' result as a response body, through serialize_order unless FAST_JSON is on"""
+    if FAST_JSON:
+        return dumps(result)
+    if isinstance(result, dict):
+        return encode_body({**result, "orders": [serialize_order(order) for order in result["orders"]]})
+    return encode_body([serialize_order(order) for order in result])
+
+def page_position(limit, cursor):
+    """Decode a 'next' cursor; returns the position to continue before and the page size"""
+    if not cursor:
+        return None, limit
+    try:
+        return decode_cursor(cursor), limit or DEFAULT_PAGE_SIZE
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def fetch_orders(filters, limit, before):
+    """Raw orders for a list route: the full array, or one page and its cursor"""
+    if not limit:
+        return await order_repo.list(**filters)
+    orders, next_cursor = await fetch_page(order_repo, filters, limit, before)
+    return {"orders": orders, "next": next_cursor}
+
+async def coalesced(request, key, fetch, tags=(), encode=encode_body):
+    """JSON response built once for all identical concurrent requests for ``key``,
+    and shared through the response cache under ``tags``"""
+    async def load():
+        return encode(await fetch())
+
+    async def cached():
+        return await response_cache.get_or_load(key, tags, load)
+    return await body_response(request, await read_flights.do(key, cached))
+
+def stream_order_list(filters, limit, cursor):
+    """Streamed body of the order list routes, written as the orders are read"""
+    before, limit = page_position(limit, cursor)
+    return StreamingResponse(
+        stream_orders(order_repo, filters, encode_order, limit, before),
+        media_type="application/json",
+    )
+
+async def find_order(order_id, fields=None):
+    """Order by ID, including one still waiting in this or another worker's write-behind journal"""
+    order = order_journal.get(order_id) if order_journal is not None else None
+    if order is None:
+        order = await order_repo.get(order_id, fields)
+        if order is not None or order_journal is None:
+            return order
+        order = (await order_journal.peer_orders()).get(order_id)
+        if order is None:
+            return None
+    return {field: order[field] for field in fields if field in order} if fields else order
+
+async def journaled_elsewhere(order_ids):
+    """The IDs that only another worker's write-behind journal holds so far"""
+    if order_journal is None:
+        return set()
+    peers = await order_journal.peer_orders()
+    return {order_id for order_id in order_ids if order_id in peers}
+
+async def flush_buffered_orders(order_ids):
+    """Store journaled orders before changing them; returns the IDs still buffered"""
+    if order_journal is None or not any(order_journal.get(order_id) for order_id in order_ids):
+        return []
+    try:
+        await order_journal.flush()
+    except Exception as e:
+        print(f"⚠️ Order journal flush failed: {e}")
+    return [order_id for order_id in order_ids if order_journal.get(order_id)]
+
 @app.get("/track_order/{order_id}")
-def track_order(order_id: str):
+async def track_order(request: Request, order_id: str):
     """Track order by order ID"""
-    order = order_collection.find_one({"orderId": order_id})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    return serialize_order(order)
+    async def fetch():
+        order = await find_order(order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return order
+
+    return await coalesced(request, ("track_order", order_id), fetch, [order_tag(order_id)], encode_order_body)
 
 @app.post("/update_order_status")
-def update_order_status(request: UpdateOrderStatusRequest):
+async def update_order_status(request: UpdateOrderStatusRequest):
     """Update order status with history tracking"""
-    valid_statuses = ["confirmed", "preparing", "out_for_delivery", "delivered", "cancelled"]
-    
-    if request.status not in valid_statuses:
+    check_valid_status(request.status)
+    if await flush_buffered_orders([request.orderId]):
+        raise HTTPException(status_code=503, detail="Order is still being saved; try again shortly")
+
+    # An order from before order_events keeps its history inline; store it
+    # as events before the $slice below can trim it
+    legacy = await order_repo.get(request.orderId, ["orderId", "statusHistory", HISTORY_IN_EVENTS])
+    if legacy:
+        await order_event_repo.add_many(legacy_history_events([legacy]))
+
+    # One atomic round trip: the filter only matches while the order is in a
+    # state that may move to the requested one
+    update_data = build_status_update(request.status, request.updatedAt)
+    order = await order_repo.transition(
+        request.orderId,
+        allowed_previous_statuses(request.status),
+        update_data["$set"],
+        status_entry(update_data),
+    )
+
+    if not order:
+        current = await order_repo.get(request.orderId, ["status"])
+        if not current:
+            if await journaled_elsewhere([request.orderId]):
+                raise HTTPException(status_code=503, detail="Order is still being saved; try again shortly")
+            raise HTTPException(status_code=404, detail="Order not found")
         raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid status. Valid statuses are: {', '.join(valid_statuses)}"
+            status_code=409,
+            detail=f"Cannot change order status from {current.get('status')} to {request.status}"
         )
-    
-    order = order_collection.find_one({"orderId": request.orderId})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    # Status descriptions
-    status_descriptions = {
-        "confirmed": "Order confirmed and being processed",
-        "preparing": "Your order is being prepared",
-        "out_for_delivery": "Order is out for delivery",
-        "delivered": "Order has been delivered successfully",
-        "cancelled": "Order has been cancelled"
-    }
-    
-    # Create new status entry
-    new_status_entry = {
-        "status": request.status,
-        "timestamp": request.updatedAt or datetime.now().isoformat(),
-        "description": status_descriptions.get(request.status, "Status updated")
-    }
-    
-    # Update order with new status and add to history
-    update_data = {
-        "$set": {
-            "status": request.status,
-            "lastUpdated": datetime.now().isoformat()
-        },
-        "$push": {
-            "statusHistory": new_status_entry
-        }
+
+    previous_status = order.get("status")
+    updated_order = serialize_order(apply_status_update(order, update_data))
+    await order_event_repo.add_many([{"orderId": request.orderId, **status_entry(update_data)}])
+    await count_status_changes([(previous_status, request.status, order.get("total", 0))])
+    await forget_order_reads([request.orderId], [previous_status, request.status], [order.get("userEmail")])
+    hub.publish(STATUS_CHANGED, updated_order, previous_status=previous_status)
+    return {
+        "success": True,
+        "message": f"Order status updated to {request.status}",
+        "order": updated_order
     }
-    
-    result = order_collection.update_one(
-        {"orderId": request.orderId},
-        update_data
+
+@app.post("/bulk_update_order_status")
+async def bulk_update_order_status(request: BulkUpdateOrderStatusRequest):
+    """Move many orders to the same status in one bulk write"""
+    check_valid_status(request.status)
+    order_ids = list(dict.fromkeys(request.orderIds))
+    if not order_ids:
+        raise HTTPException(status_code=400, detail="No order IDs provided")
+    if len(order_ids) > MAX_BULK_STATUS_UPDATES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_STATUS_UPDATES} orders can be updated at once"
+        )
+
+    # Orders still in the write-behind journal are stored first; any that cannot be show as not found
+    await flush_buffered_orders(order_ids)
+    current = {order["orderId"]: order for order in await order_repo.get_many(order_ids)}
+    allowed = allowed_previous_statuses(request.status)
+    update_data = build_status_update(request.status, request.updatedAt)
+
+    saving = await journaled_elsewhere([order_id for order_id in order_ids if order_id not in current])
+    failed = []
+    candidates = []
+    for order_id in order_ids:
+        order = current.get(order_id)
+        if order_id in saving:
+            failed.append({"orderId": order_id, "reason": "Order is still being saved; try again shortly"})
+        elif not order:
+            failed.append({"orderId": order_id, "reason": "Order not found"})
+        elif order.get("status") not in allowed:
+            failed.append({
+                "orderId": order_id,
+                "reason": f"Cannot change order status from {order.get('status')} to {request.status}"
+            })
+        else:
+            candidates.append(order)
+
+    # Legacy inline histories go to order_events before the $slice trims them
+    await order_event_repo.add_many(legacy_history_events(candidates))
+    # Each update is guarded on the status we just read, so an order that
+    # changed in between is left alone rather than overwritten
+    updated = await order_repo.transition_many(candidates, update_data["$set"], status_entry(update_data))
+    landed = {order["orderId"] for order in updated}
+    failed.extend(
+        {"orderId": order["orderId"], "reason": "Order status changed concurrently"}
+        for order in candidates if order["orderId"] not in landed
     )
-    
-    if result.modified_count > 0:
-        updated_order = order_collection.find_one({"orderId": request.orderId})
-        return {
-            "success": True,
-            "message": f"Order status updated to {request.status}",
-            "order": serialize_order(updated_order)
-        }
-    else:
-        raise HTTPException(status_code=500, detail="Failed to update order status")
+
+    await order_event_repo.add_many([{"orderId": order["orderId"], **status_entry(update_data)} for order in updated])
+    await count_status_changes([(order.get("status"), request.status, order.get("total", 0)) for order in updated])
+    if updated:
+        await forget_order_reads(
+            [order["orderId"] for order in updated],
+            [order.get("status") for order in updated] + [request.status],
+            [order.get("userEmail") for order in updated],
+        )
+    for order in updated:
+        previous_status = order.get("status")
+        hub.publish(
+            STATUS_CHANGED,
+            serialize_order(apply_status_update(order, update_data)),
+            previous_status=previous_status
+        )
+
+    return {
+        "success": not failed,
+        "message": f"{len(updated)} of {len(order_ids)} orders updated to {request.status}",
+        "updated": [order["orderId"] for order in updated],
+        "failed": failed
+    }
 
 @app.get("/order_status/{order_id}")
-def get_order_status(order_id: str):
+async def get_order_status(request: Request, order_id: str):
     """Get current status of an order"""
-    order = order_collection.find_one(
-        {"orderId": order_id},
-        {"orderId": 1, "status": 1, "statusHistory": 1, "lastUpdated": 1}
-    )
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    return serialize_order(order)
+    async def fetch():
+        order = await find_order(order_id, ["orderId", "status", "statusHistory", "lastUpdated"])
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return order
+
+    return await coalesced(request, ("order_status", order_id), fetch, [order_tag(order_id)], encode_order_body)
+
+@app.get("/order_timeline/{order_id}")
+async def get_order_timeline(
+    request: Request,
+    order_id: str,
+    limit: int = Query(DEFAULT_TIMELINE_PAGE, ge=1, le=MAX_PAGE_SIZE, description="Events per page"),
+    cursor: Optional[str] = Query(None, description="'next' token from the previous page"),
+):
+    """Every status change of an order, oldest first, a page at a time"""
+    if cursor:
+        try:
+            decode_event_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def fetch():
+        events, next_cursor = await timeline_page(order_event_repo, order_id, limit, cursor)
+        if not events and not cursor:
+            # Still in the write-behind journal, or placed before order_events existed
+            order = await find_order(order_id, ["orderId", "statusHistory"])
+            if not order:
+                raise HTTPException(status_code=404, detail="Order not found")
+            events = history_events(order)[:limit]
+        return {"orderId": order_id, "events": events, "next": next_cursor}
+
+    return await coalesced(request, ("order_timeline", order_id, limit, cursor), fetch, [order_tag(order_id)])
 
 @app.get("/orders_by_status")
-def get_orders_by_status(status: str = Query(..., description="Order status to filter by")):
+async def get_orders_by_status(
+    request: Request,
+    status: str = Query(..., description="Order status to filter by"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables pagination"),
+    cursor: Optional[str] = Query(None, description="'next' token from the previous page"),
+    stream: bool = Query(False, description="Stream the response as the cursor is read"),
+):
     """Get all orders with a specific status (admin/manager use)"""
-    valid_statuses = ["confirmed", "preparing", "out_for_delivery", "delivered", "cancelled"]
-    
-    if status not in valid_statuses:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid status. Valid statuses are: {', '.join(valid_statuses)}"
-        )
-    
-    orders = list(order_collection.find({"status": status}).sort("orderDate", -1))
-    return [serialize_order(order) for order in orders]
+    check_valid_status(status)
+    if stream:
+        return stream_order_list({"status": status}, limit, cursor)
+
+    before, page_size = page_position(limit, cursor)
+    return await coalesced(
+        request, ("orders_by_status", status, limit, cursor),
+        lambda: fetch_orders({"status": status}, page_size, before),
+        [status_tag(status)], encode_order_list,
+    )
+
+@app.get("/order_events")
+async def order_events(
+    request: Request,
+    status: Optional[List[str]] = Query(None, description="Only events entering or leaving these statuses"),
+    orderId: Optional[List[str]] = Query(None, description="Only events for these order IDs"),
+    since: Optional[str] = Query(None, description="Resume token; Last-Event-ID takes precedence"),
+):
+    """Server-sent stream of order_created and status_changed events"""
+    for requested in status or []:
+        check_valid_status(requested)
+
+    resume_token = request.headers.get("last-event-id") or since
+    return StreamingResponse(
+        stream_events(hub, status, orderId, resume_token),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ==============================
 # Order Retrieval Routes (Existing)
 # ==============================
 
 @app.get("/get_user_orders")
-def get_user_orders(userEmail: EmailStr, after: Optional[str] = Query(None)):
-    query = {"userEmail": userEmail}
+async def get_user_orders(
+    request: Request,
+    userEmail: EmailStr,
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables pagination"),
+    cursor: Optional[str] = Query(None, description="'next' token from the previous page"),
+    stream: bool = Query(False, description="Stream the response as the cursor is read"),
+):
+    filters = {"user_email": userEmail}
     if after:
         try:
             after_dt = datetime.fromisoformat(after)
-            query["orderDate"] = {"$gt": after_dt.isoformat()}
+            filters["placed_after"] = after_dt.isoformat()
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid 'after' timestamp format. Use ISO format.")
 
-    orders = list(order_collection.find(query).sort("orderDate", -1))
-    return [serialize_order(order) for order in orders]
+    if stream:
+        return stream_order_list(filters, limit, cursor)
+    before, page_size = page_position(limit, cursor)
+    return await coalesced(
+        request, ("get_user_orders", userEmail, after, limit, cursor),
+        lambda: fetch_orders(filters, page_size, before),
+        [user_tag(userEmail)], encode_order_list,
+    )
 
 @app.get("/get_latest_order")
-def get_latest_order(userEmail: EmailStr):
-    latest_order = order_collection.find_one(
-        {"userEmail": userEmail},
-        sort=[("orderDate", -1)]
-    )
-    if not latest_order:
-        raise HTTPException(status_code=404, detail="No orders found for this user")
-    return serialize_order(latest_order)
+async def get_latest_order(request: Request, userEmail: EmailStr):
+    async def fetch():
+        latest_order = await order_repo.latest_for_user(userEmail)
+        if order_journal is not None:
+            # Buffered here or in other workers; the stored copy wins for an order in both
+            candidates = {
+                order["orderId"]: order for order in (await order_journal.peer_orders()).values()
+                if order.get("userEmail") == userEmail
+            }
+            candidates.update((order["orderId"], order) for order in order_journal.buffered_for_user(userEmail))
+            if latest_order:
+                candidates[latest_order["orderId"]] = latest_order
+            latest_order = max(candidates.values(), key=lambda o: (o["orderDate"], o["orderId"]), default=None)
+        if not latest_order:
+            raise HTTPException(status_code=404, detail="No orders found for this user")
+        return latest_order
+
+    return await coalesced(request, ("get_latest_order", userEmail), fetch, [user_tag(userEmail)], encode_order_body)
 
 # ==============================
 # Analytics Routes (Existing)
 # ==============================
 
 @app.get("/order_analytics")
-def get_order_analytics():
+async def get_order_analytics(request: Request):
     """Get order statistics for dashboard"""
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$status",
-                "count": {"$sum": 1},
-                "total_amount": {"$sum": "$total"}
-            }
-        }
-    ]
-    
-    analytics = list(order_collection.aggregate(pipeline))
-    
-    # Get total orders
-    total_orders = order_collection.count_documents({})
-    
-    # Get today's orders
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_orders = order_collection.count_documents({
-        "orderDate": {"$regex": f"^{today}"}
-    })
-    
-    return {
-        "total_orders": total_orders,
-        "today_orders": today_orders,
-        "status_breakdown": analytics
-    }
+    def load():
+        if sqlite_store is not None:
+            return read_order_analytics(sqlite_store)
+        return read_analytics(stats_collection)
+    return await coalesced(request, ("order_analytics",), load, [ANALYTICS_TAG])
 
 # ==============================
 # Basic Endpoints
 # ==============================
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "FastAPI with MongoDB is running"}
 
 @app.get("/health")
-def health_check():
-    try:
-        client.server_info()
+async def health_check():
+    """Cached database status (kept for existing monitors)"""
+    if readiness.database_ok:
         return {"status": "healthy", "database": "connected"}
-    except ServerSelectionTimeoutError:
-        return {"status": "unhealthy", "database": "disconnected"}
+    return {"status": "unhealthy", "database": "disconnected"}
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the event loop is answering"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe from the background pinger; 503 until warmed up and connected"""
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=readiness.status())
+
+# ==============================
+# Admin Routes
+# ==============================
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/pool_stats", dependencies=[Depends(require_admin)])
+async def get_pool_stats():
+    """Mongo connection pool settings and counters for this worker process"""
+    require_mongo("Connection pool stats")
+    return {"success": True, **storage.stats()}
+
+@app.get("/metrics", dependencies=[Depends(require_admin)])
+async def get_metrics():
+    """Prometheus metrics for this worker: routes, MongoDB commands and pool checkouts"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/slow_queries", dependencies=[Depends(require_admin)])
+async def get_slow_queries(
+    collection: Optional[str] = Query(None, description="Only this collection, e.g. orders"),
+    command: Optional[str] = Query(None, description="find, aggregate or count"),
+    min_ms: float = Query(0, ge=0, description="Only entries at least this slow"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Slow find/aggregate/count shapes with their explain plans, and the latest slow calls"""
+    return {"success": True, **slow_query_log.report(collection, command, min_ms, limit)}
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def get_profiles():
+    """Stored request profiles, newest first"""
+    return {"success": True, "profiles": list_profiles(PROFILE_DIR)}
+
+@app.get("/admin/profiles/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    """One profile as folded stacks (flamegraph.pl / speedscope)"""
+    path = profile_path(PROFILE_DIR, name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+@app.get("/admin/user_cache", dependencies=[Depends(require_admin)])
+async def get_user_cache_stats():
+    """Size and hit rate of the known-user cache used by order placement"""
+    return {"success": True, **known_users.stats()}
+
+@app.get("/admin/coalescing", dependencies=[Depends(require_admin)])
+async def get_coalescing_stats():
+    """How many hot reads shared an in-flight query or a micro-TTL result"""
+    return {"success": True, **read_flights.stats()}
+
+@app.get("/admin/response_cache", dependencies=[Depends(require_admin)])
+async def get_response_cache_stats():
+    """Backend, hit rate and errors of the shared response cache"""
+    return {"success": True, **response_cache.stats()}
+
+@app.get("/admin/order_journal", dependencies=[Depends(require_admin)])
+async def get_order_journal_stats():
+    """Write-behind journal depth and flush counters for this worker process"""
+    if order_journal is None:
+        return {"success": True, "enabled": False}
+    return {"success": True, "enabled": True, **order_journal.stats()}
 
 """const express = require('express');
 const cors = require('cors');
@@ -0,0 +1,249 @@
+"""Materialized order counters backing /order_analytics.
+
+A single document in ``order_stats`` holds running totals that
+``place_order`` and ``update_order_status`` adjust with ``$inc``, so the
+dashboard endpoint is one indexed read instead of a scan over every order:
+
+    {
+        "_id": "orders",
+        "total_orders": 1234,
+        "statuses": {"confirmed": {"count": 10, "total_amount": 250.0}, ...},
+        "days": {"2025-07-01": {"count": 42, "total_amount": 980.5}, ...}
+    }
+
+Day buckets are keyed on the first ten characters of ``orderDate`` (the
+client-supplied ISO timestamp), the same prefix the old ``$regex`` count used.
+
+The counters can be recomputed from the orders collection at any time:
+
+    python analytics.py --check      # report drift only
+    python analytics.py --rebuild    # report drift and correct the counters
+
+A rebuild corrects the counters with ``$inc`` deltas rather than replacing
+the document, so increments made by live traffic meanwhile are kept (an
+order placed while the aggregation runs can still be off by one; run
+``--check`` again if that matters).  Only the holder of a lease document
+rebuilds, and the counters document is marked ``built`` afterwards, so the
+warm-up of every other worker skips it.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+STATS_COLLECTION = "order_stats"
+COUNTERS_ID = "orders"
+REBUILD_LEASE_ID = "orders-rebuild"
+# A rebuild holding the lease longer than this is presumed dead and can be taken over
+REBUILD_LEASE_SECONDS = 600
+
+# Tolerance when comparing float totals accumulated by $inc
+AMOUNT_TOLERANCE = 0.01
+
+
+def day_key(order_date):
+    return str(order_date or "")[:10]
+
+
+async def record_order_placed(stats_collection, status, total, order_date):
+    """Count a new order against its status and day buckets."""
+    await record_orders_placed(stats_collection, [(status, total, order_date)])
+
+
+async def record_orders_placed(stats_collection, orders):
+    """Count many ``(status, total, order_date)`` new orders in a single ``$inc``."""
+    if not orders:
+        return
+    inc = {"total_orders": len(orders)}
+    for status, total, order_date in orders:
+        day = day_key(order_date)
+        for prefix in (f"statuses.{status}", f"days.{day}"):
+            inc[f"{prefix}.count"] = inc.get(f"{prefix}.count", 0) + 1
+            inc[f"{prefix}.total_amount"] = inc.get(f"{prefix}.total_amount", 0) + total
+    await stats_collection.update_one({"_id": COUNTERS_ID}, {"$inc": inc}, upsert=True)
+
+
+async def record_status_change(stats_collection, old_status, new_status, total):
+    """Move one order's count and amount from ``old_status`` to ``new_status``."""
+    await record_status_changes(stats_collection, [(old_status, new_status, total)])
+
+
+async def record_status_changes(stats_collection, changes):
+    """Apply many ``(old_status, new_status, total)`` moves in a single ``$inc``."""
+    inc = {}
+    for old_status, new_status, total in changes:
+        if old_status == new_status:
+            continue
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            inc[f"statuses.{status}.count"] = inc.get(f"statuses.{status}.count", 0) + sign
+            inc[f"statuses.{status}.total_amount"] = inc.get(f"statuses.{status}.total_amount", 0) + sign * total
+    if not inc:
+        return
+    await stats_collection.update_one({"_id": COUNTERS_ID}, {"$inc": inc}, upsert=True)
+
+
+async def read_analytics(stats_collection):
+    """Return the /order_analytics payload from the counters document."""
+    counters = await stats_collection.find_one({"_id": COUNTERS_ID}) or {}
+    today = datetime.now().strftime("%Y-%m-%d")
+    status_breakdown = [
+        {"_id": status, "count": bucket["count"], "total_amount": round(bucket["total_amount"], 2)}
+        for status, bucket in counters.get("statuses", {}).items()
+        if bucket.get("count", 0) > 0
+    ]
+    return {
+        "total_orders": counters.get("total_orders", 0),
+        "today_orders": counters.get("days", {}).get(today, {}).get("count", 0),
+        "status_breakdown": status_breakdown,
+    }
+
+
+async def compute_counters(order_collection):
+    """Recompute the counters document from scratch with two aggregations."""
+    by_status = await order_collection.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}, "total_amount": {"$sum": "$total"}}}
+    ])
+    by_day = await order_collection.aggregate([
+        {"$group": {
+            "_id": {"$substrCP": [{"$ifNull": ["$orderDate", ""]}, 0, 10]},
+            "count": {"$sum": 1},
+            "total_amount": {"$sum": "$total"},
+        }}
+    ])
+    return {
+        "_id": COUNTERS_ID,
+        "total_orders": sum(row["count"] for row in by_status),
+        "statuses": {
+            row["_id"]: {"count": row["count"], "total_amount": row["total_amount"]}
+            for row in by_status
+        },
+        "days": {
+            row["_id"]: {"count": row["count"], "total_amount": row["total_amount"]}
+            for row in by_day
+        },
+    }
+
+
+def find_drift(stored, expected):
+    """List human-readable differences between two counters documents."""
+    drift = []
+    if stored.get("total_orders", 0) != expected["total_orders"]:
+        drift.append(f"total_orders: stored {stored.get('total_orders', 0)}, actual {expected['total_orders']}")
+    for section in ("statuses", "days"):
+        stored_section = stored.get(section, {})
+        expected_section = expected[section]
+        for key in sorted(set(stored_section) | set(expected_section)):
+            have = stored_section.get(key, {})
+            want = expected_section.get(key, {})
+            if have.get("count", 0) != want.get("count", 0):
+                drift.append(f"{section}.{key}.count: stored {have.get('count', 0)}, actual {want.get('count', 0)}")
+            if abs(have.get("total_amount", 0) - want.get("total_amount", 0)) > AMOUNT_TOLERANCE:
+                drift.append(
+                    f"{section}.{key}.total_amount: stored {have.get('total_amount', 0)}, "
+                    f"actual {want.get('total_amount', 0)}"
+                )
+    return drift
+
+
+def counter_deltas(stored, expected):
+    """The ``$inc`` that turns ``stored`` counters into ``expected`` ones."""
+    inc = {}
+    if stored.get("total_orders", 0) != expected["total_orders"]:
+        inc["total_orders"] = expected["total_orders"] - stored.get("total_orders", 0)
+    for section in ("statuses", "days"):
+        stored_section = stored.get(section, {})
+        expected_section = expected[section]
+        # An empty key (order without an orderDate) is not a valid $inc path
+        for key in filter(None, set(stored_section) | set(expected_section)):
+            for field in ("count", "total_amount"):
+                delta = expected_section.get(key, {}).get(field, 0) - stored_section.get(key, {}).get(field, 0)
+                if delta:
+                    inc[f"{section}.{key}.{field}"] = delta
+    return inc
+
+
+async def _take_lease(stats_collection):
+    now = time.time()
+    try:
+        await stats_collection.insert_one({"_id": REBUILD_LEASE_ID, "expires": now + REBUILD_LEASE_SECONDS})
+        return True
+    except DuplicateKeyError:
+        taken = await stats_collection.find_one_and_update(
+            {"_id": REBUILD_LEASE_ID, "expires": {"$lt": now}},
+            {"$set": {"expires": now + REBUILD_LEASE_SECONDS}},
+        )
+        return taken is not None
+
+
+async def rebuild_counters(order_collection, stats_collection, write=True):
+    """Recompute the counters, optionally correct them, and return any drift found.
+
+    Returns None without doing anything if another process holds the rebuild lease.
+    """
+    if write and not await _take_lease(stats_collection):
+        return None
+    try:
+        expected = await compute_counters(order_collection)
+        stored = await stats_collection.find_one({"_id": COUNTERS_ID}) or {}
+        drift = find_drift(stored, expected)
+        if write:
+            update = {"$set": {"built": True}}
+            inc = counter_deltas(stored, expected)
+            if inc:
+                update["$inc"] = inc
+            await stats_collection.update_one({"_id": COUNTERS_ID}, update, upsert=True)
+    finally:
+        if write:
+            await stats_collection.delete_one({"_id": REBUILD_LEASE_ID})
+    return drift
+
+
+async def ensure_counters(order_collection, stats_collection):
+    """Build the counters once, on the first start against an existing orders collection."""
+    # Live $inc upserts create the document too, so only the built flag says a rebuild has run
+    if await stats_collection.find_one({"_id": COUNTERS_ID, "built": True}, {"_id": 1}) is not None:
+        return
+    if await rebuild_counters(order_collection, stats_collection) is None:
+        print("ℹ️ Another worker is building the order analytics counters.")
+        return
+    print("✅ Order analytics counters built.")
+
+
+async def _main(args):
+    # Imported here so the CLI reuses the server's connection settings
+    from Server import STORE, storage, order_collection, stats_collection
+
+    if STORE != "mongo":
+        print("❌ Analytics counters are only kept in MongoDB; SQLite aggregates the orders on each read.")
+        return 1
+    try:
+        drift = await rebuild_counters(order_collection, stats_collection, write=args.rebuild)
+    finally:
+        await storage.close()
+    if drift is None:
+        print("❌ Another process is rebuilding the counters; try again once it finishes.")
+        return 1
+    for line in drift:
+        print(f"  drift {line}")
+    if not drift:
+        print("✅ Counters match the orders collection.")
+        return 0
+    if args.rebuild:
+        print(f"✅ Counters rebuilt ({len(drift)} drifted value(s) corrected).")
+        return 0
+    print(f"❌ {len(drift)} drifted value(s). Run with --rebuild to correct them.")
+    return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or rebuild the order analytics counters")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--check", action="store_true", help="report drift without writing")
+    mode.add_argument("--rebuild", action="store_true", help="recompute and correct the counters")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,231 @@
+"""Regenerates the food entries in the frontend's assets.js.
+
+assets.js is mostly hand written (icons, ``menu_list`` and the bundled demo
+dishes).  The items added through ``/add_food_item`` live between two pairs
+of marker comments, one for their image imports and one inside
+``food_list``.  Everything between the markers is rebuilt from
+the food repository on each write; everything outside is left untouched.
+
+Writes are coalesced: ``schedule()`` only marks the file dirty, and a single
+background task rebuilds it ``DEBOUNCE_SECONDS`` later, picking up every
+change made in the meantime.  A burst of adds and deletes therefore costs one
+query and one write.  The new file is written to a temporary file in the
+same directory and renamed over the old one, so the Vite dev server never
+reads a half-written module.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from json.encoder import encode_basestring
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import fcntl
+except ImportError:  # Windows: rely on the in-process lock only
+    fcntl = None
+
+IMPORTS_START = "// <generated-food-imports>"
+IMPORTS_END = "// </generated-food-imports>"
+ITEMS_START = "// <generated-food-items>"
+ITEMS_END = "// </generated-food-items>"
+
+FOOD_LIST_OPENING = "export const food_list = ["
+
+DEBOUNCE_SECONDS = 0.25
+
+NON_IDENTIFIER = re.compile(r"\W")
+
+INITIAL_CONTENT = f'''{IMPORTS_START}
+{IMPORTS_END}
+
+export const food_list = [
+    {ITEMS_START}
+    {ITEMS_END}
+];
+
+export const menu_list = [
+    {{
+        menu_name: "Salad",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Rolls",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Deserts",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Sandwich",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Cake",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Pure Veg",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Pasta",
+        menu_image: ""
+    }},
+    {{
+        menu_name: "Noodles",
+        menu_image: ""
+    }}
+];
+'''
+
+
+def import_name(item_id):
+    """JS identifier for an item's image import.
+
+    IDs that sanitize alike (``a-b`` and ``a_b``) differ in the hash of the
+    raw ID, so every distinct ID gets its own identifier.
+    """
+    item_id = str(item_id)
+    suffix = hashlib.blake2b(item_id.encode(), digest_size=4).hexdigest()
+    return f"food_{NON_IDENTIFIER.sub('_', item_id)}_{suffix}"
+
+
+def render_imports(items):
+    # A repeated ID shares one import; declaring it twice is a syntax error
+    imports = {}
+    for item in items:
+        imports.setdefault(import_name(item["id"]), item["image_filename"])
+    return "".join(
+        f'import {name} from {encode_basestring("./" + filename)};\n' for name, filename in imports.items()
+    )
+
+
+def render_items(items):
+    return "".join(
+        f'''    {{
+        _id: {encode_basestring(str(item["id"]))},
+        name: {encode_basestring(item["name"])},
+        image: {import_name(item["id"])},
+        price: {item["price"]},
+        description: {encode_basestring(item["description"])},
+        category: {encode_basestring(item["category"])}
+    }},
+'''
+        for item in items
+    )
+
+
+def _replace_between(content, start_marker, end_marker, body):
+    start = content.index(start_marker) + len(start_marker)
+    end = content.index(end_marker, start)
+    # Keep the end marker's indentation on its own line
+    indent = content[content.rfind("\n", 0, end) + 1:end]
+    return content[:start] + "\n" + body + indent + content[end:]
+
+
+def add_markers(content):
+    """Insert the marker comments into an assets.js that predates them."""
+    if IMPORTS_START not in content:
+        content = f"{IMPORTS_START}\n{IMPORTS_END}\n" + content
+    if ITEMS_START not in content:
+        position = content.find(FOOD_LIST_OPENING)
+        if position == -1:
+            raise ValueError("Could not find food_list export in assets.js")
+        position += len(FOOD_LIST_OPENING)
+        content = content[:position] + f"\n    {ITEMS_START}\n    {ITEMS_END}" + content[position:]
+    return content
+
+
+def render_assets_js(content, items):
+    """Return ``content`` with both generated sections rebuilt from ``items``."""
+    content = add_markers(content)
+    content = _replace_between(content, IMPORTS_START, IMPORTS_END, render_imports(items))
+    return _replace_between(content, ITEMS_START, ITEMS_END, render_items(items))
+
+
+def write_atomically(path, content):
+    """Replace ``path`` with ``content`` via a same-directory temp file and rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".assets-", suffix=".js.tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def regenerate_file(path, items):
+    """Rebuild the generated sections of ``path``; returns True if it changed.
+
+    Holds an exclusive lock on ``<path>.lock`` so several server processes
+    never interleave their read-modify-write of the same file.
+    """
+    lock_file = open(path + ".lock", "a")
+    try:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                current = f.read()
+        else:
+            current = INITIAL_CONTENT
+        updated = render_assets_js(current, items)
+        if updated == current and os.path.exists(path):
+            return False
+        write_atomically(path, updated)
+        return True
+    finally:
+        lock_file.close()
+
+
+class AssetsJsWriter:
+    """Debounced, serialized regeneration of assets.js from the food items."""
+
+    def __init__(self, path, food_repo, debounce=DEBOUNCE_SECONDS):
+        self.path = path
+        self.food_repo = food_repo
+        self.debounce = debounce
+        self.lock = asyncio.Lock()
+        self.dirty = False
+        self.task = None
+        self.writes = 0
+
+    def schedule(self):
+        """Mark assets.js stale; the rebuild happens shortly afterwards in the background."""
+        self.dirty = True
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self.dirty:
+            await asyncio.sleep(self.debounce)
+            try:
+                await self.regenerate()
+            except Exception as e:
+                print(f"Error updating assets.js: {e}")
+
+    async def regenerate(self):
+        async with self.lock:
+            self.dirty = False
+            # Newest first; items without created_at go last
+            items = sorted(
+                (item for item in await self.food_repo.list() if item.get("image_filename")),
+                key=lambda item: str(item.get("created_at") or ""), reverse=True,
+            )
+            if await run_in_threadpool(regenerate_file, self.path, items):
+                self.writes += 1
+
+    async def flush(self):
+        """Wait for any scheduled rebuild to land (used on shutdown)."""
+        if self.task is not None:
+            await self.task
@@ -0,0 +1,184 @@
+"""Password hashing and signed, stateless session tokens.
+
+Passwords are stored as salted scrypt hashes
+(``scrypt$<n>$<r>$<p>$<salt>$<hash>``).  scrypt is deliberately slow, so
+hashing and verifying run in a bounded thread pool
+(``FOODPREP_AUTH_WORKERS``, default one per core).  OpenSSL releases the
+GIL while it works, so the pool scales with cores and the event loop stays
+free.  Users still holding a plaintext ``password`` are upgraded on their
+next successful login.
+
+A login returns a session token ``<payload>.<signature>``: base64url JSON
+(email, userid, role, issue and expiry times) signed with HMAC-SHA256 under
+``FOODPREP_SESSION_SECRET``.  Verifying a token needs no database lookup.
+Every worker must share the secret.  When it is not set, the first worker
+to start generates one into ``FOODPREP_SESSION_SECRET_FILE`` (default
+``./session_secret``, mode 0600) and every worker reads it from there.
+If that file can be neither read nor created, the server refuses to start.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+AUTH_WORKERS = int(os.getenv("FOODPREP_AUTH_WORKERS", "0")) or os.cpu_count() or 2
+SESSION_TTL = int(os.getenv("FOODPREP_SESSION_TTL", str(12 * 3600)))
+SESSION_SECRET_FILE = os.getenv("FOODPREP_SESSION_SECRET_FILE", "./session_secret")
+
+
+def _create_secret(path):
+    # Written aside and linked into place, so no worker ever reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+            f.flush()
+            os.fsync(f.fileno())
+        os.link(tmp_path, path)
+        print(f"🔑 Generated a session secret in {path}; every worker signs sessions with it.")
+    except FileExistsError:
+        # Another worker got there first
+        pass
+    finally:
+        os.remove(tmp_path)
+
+
+def load_session_secret(path=SESSION_SECRET_FILE):
+    """The secret stored in ``path``, generated first if no worker has yet."""
+    try:
+        if not os.path.exists(path):
+            _create_secret(path)
+        with open(path) as f:
+            secret = f.read().strip()
+    except OSError as e:
+        raise RuntimeError(
+            f"FOODPREP_SESSION_SECRET is not set and {path} cannot be used ({e}); "
+            "set one of them so every worker signs sessions with the same secret"
+        ) from e
+    if not secret:
+        raise RuntimeError(f"{path} is empty; delete it or set FOODPREP_SESSION_SECRET")
+    return secret.encode()
+
+
+SESSION_SECRET = os.getenv("FOODPREP_SESSION_SECRET", "").encode() or load_session_secret()
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+# ==============================
+# Password hashes
+# ==============================
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES)
+    return f"scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def verify_password(password, stored):
+    try:
+        scheme, n, r, p, salt, expected = stored.split("$")
+        if scheme != "scrypt":
+            return False
+        expected = _b64decode(expected)
+        digest = hashlib.scrypt(
+            password.encode(), salt=_b64decode(salt), n=int(n), r=int(r), p=int(p), dklen=len(expected)
+        )
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+# Verified against when the email is unknown, so both cases take as long
+_DUMMY_HASH = hash_password(secrets.token_urlsafe(16))
+
+
+class PasswordHasher:
+    """Runs scrypt in a bounded pool so the event loop never does it."""
+
+    def __init__(self, workers=AUTH_WORKERS):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+
+    async def hash(self, password):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, hash_password, password)
+
+    async def verify(self, password, stored):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, verify_password, password, stored)
+
+    async def check_user(self, user, password):
+        """``(ok, new_hash)``; ``new_hash`` is set when a plaintext user should be upgraded."""
+        if user is None:
+            await self.verify(password, _DUMMY_HASH)
+            return False, None
+        if user.get("password_hash"):
+            return await self.verify(password, user["password_hash"]), None
+        if user.get("password") is not None and hmac.compare_digest(
+            str(user["password"]).encode(), password.encode()
+        ):
+            return True, await self.hash(password)
+        return False, None
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ==============================
+# Session tokens
+# ==============================
+
+def _sign(payload):
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user, ttl=SESSION_TTL, now=None):
+    """Signed token for ``user``; returns ``(token, expires_at)`` (epoch seconds)."""
+    issued_at = int(now if now is not None else time.time())
+    claims = {
+        "sub": user["email"],
+        "uid": user["userid"],
+        "role": user.get("role", "user"),
+        "iat": issued_at,
+        "exp": issued_at + ttl,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}", claims["exp"]
+
+
+def verify_token(token, now=None):
+    """The token's claims; raises :class:`InvalidToken` if forged, malformed or expired."""
+    try:
+        payload, signature = token.split(".")
+    except (AttributeError, ValueError):
+        raise InvalidToken("Malformed session token")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidToken("Invalid session token")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise InvalidToken("Malformed session token")
+    if claims.get("exp", 0) < (now if now is not None else time.time()):
+        raise InvalidToken("Session token expired")
+    return claims
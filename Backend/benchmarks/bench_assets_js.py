@@ -0,0 +1,101 @@
+"""assets.js maintenance cost at 1k and 10k menu items.
+
+Compares the old per-item regex splice (kept here only as a baseline) with
+assets_js.regenerate_file, which rebuilds the generated sections in one
+pass.  Everything runs against a scratch directory; the real assets.js is
+never touched.
+
+    python benchmarks/bench_assets_js.py --sizes 1000 10000
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assets_js import INITIAL_CONTENT, regenerate_file  # noqa: E402
+
+
+def make_items(count):
+    return [
+        {
+            "id": str(i),
+            "name": f"Dish {i}",
+            "price": 100 + i % 50,
+            "description": "Food provides essential nutrients for overall health and well-being",
+            "category": "Rolls",
+            "image_filename": f"food_{i}.png",
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_splice(path, item):
+    """The pre-generator update_assets_js: read, regex, splice, rewrite."""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    import_var_name = f"food_{item['id']}"
+    if import_var_name not in content:
+        match = re.search(r'(import.*?from.*?;[\n\r]*)*', content)
+        insert_pos = match.end() if match else 0
+        content = content[:insert_pos] + f'import {import_var_name} from "./{item["image_filename"]}";\n' + content[insert_pos:]
+    new_item = f'''    {{
+        _id: "{item['id']}",
+        name: "{item['name']}",
+        image: {import_var_name},
+        price: {item['price']},
+        description: "{item['description']}",
+        category: "{item['category']}"
+    }},'''
+    food_list_start = content.find("export const food_list = [") + len("export const food_list = [")
+    content = content[:food_list_start] + "\n" + new_item + content[food_list_start:]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def bench(size, legacy_bulk):
+    items = make_items(size)
+    extra = make_items(size + 2)[-2:]
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "assets.js")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(INITIAL_CONTENT)
+        full = timed(lambda: regenerate_file(path, items))
+        file_kb = os.path.getsize(path) / 1024
+        one_more = timed(lambda: regenerate_file(path, items + extra[:1]))
+
+        legacy_all = None
+        if legacy_bulk:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(INITIAL_CONTENT)
+            legacy_all = timed(lambda: [legacy_splice(path, item) for item in items])
+        else:
+            # Build the N-item file once, then time a single extra splice
+            regenerate_file(path, items)
+        legacy_one = timed(lambda: legacy_splice(path, extra[1]))
+
+    print(f"{size:>6} items  ({file_kb:,.0f} KB)")
+    print(f"    bulk load    legacy {'%9.3f s' % legacy_all if legacy_all is not None else '   (skipped)'}"
+          f"   generator {full:9.3f} s (one coalesced write)")
+    print(f"    single add   legacy {legacy_one * 1000:9.2f} ms  generator {one_more * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--skip-legacy-bulk", action="store_true",
+                        help="skip the O(n^2) item-by-item legacy load")
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size, not args.skip_legacy_bulk)
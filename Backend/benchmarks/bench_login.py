@@ -0,0 +1,85 @@
+"""Logins per second through the password-hashing pool, per worker count.
+
+Each login verifies an scrypt hash in ``auth.PasswordHasher`` and then
+issues a session token, the same steps as ``/login`` except the user
+lookup.  The same number of concurrent logins runs with the pool sized
+1, 2, 4, ... up to ``--max-workers``; "per core" divides by the cores
+those workers can actually use.  A column shows how often the event
+loop got to run while they were in flight (lag probe), to check that
+hashing stays off the loop.
+
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --logins 400 --max-workers 16
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import PasswordHasher, hash_password, issue_token, verify_token  # noqa: E402
+
+PASSWORD = "password123"
+
+
+async def loop_lag(stop, lags, interval=0.005):
+    """Records how late each short sleep wakes up while logins run."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(workers, users, logins, concurrency):
+    hasher = PasswordHasher(workers)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(i):
+        user = users[i % len(users)]
+        async with semaphore:
+            ok, _ = await hasher.check_user(user, PASSWORD)
+        assert ok
+        verify_token(issue_token(user)[0])
+
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    hasher.shutdown()
+    return logins / elapsed, max(lags, default=0.0), statistics.median(lags) if lags else 0.0
+
+
+async def main(args):
+    users = [
+        {"userid": f"user{n}", "email": f"user{n}@example.com", "role": "user",
+         "password_hash": hash_password(PASSWORD)}
+        for n in range(16)
+    ]
+    cores = os.cpu_count() or 1
+    print(f"{args.logins} logins, {args.concurrency} in flight, {cores} cores")
+    print(f"{'workers':>8} {'logins/s':>10} {'per core':>11} {'loop lag p50':>13} {'max':>9}")
+    workers = 1
+    baseline = None
+    while workers <= args.max_workers:
+        rate, lag_max, lag_median = await run(workers, users, args.logins, args.concurrency)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.1f} {rate / min(workers, cores):>11.1f} "
+              f"{lag_median * 1000:>10.2f} ms {lag_max * 1000:>6.2f} ms"
+              f"   ({rate / baseline:.2f}x)")
+        workers *= 2
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64, help="logins in flight at once")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
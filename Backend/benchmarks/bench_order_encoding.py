@@ -0,0 +1,120 @@
+"""Encode time and bytes on the wire for the order list endpoints.
+
+Builds synthetic orders shaped like real Mongo documents (ObjectId,
+items, address, a growing statusHistory) and, for each endpoint profile,
+compares:
+
+    default   serialize_order + jsonable_encoder + json.dumps (FastAPI's path)
+    fast      responses.dumps on the raw documents (orjson when installed)
+
+and the size of the body raw, gzip-compressed and brotli-compressed.
+
+    python benchmarks/bench_order_encoding.py
+"""
+
+import argparse
+import copy
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import responses  # noqa: E402
+from Server import serialize_order  # noqa: E402
+
+# (endpoint, orders per response)
+PROFILES = [
+    ("/get_user_orders", 20),
+    ("/orders_by_status?status=preparing", 200),
+    ("/orders_by_status?status=delivered", 5000),
+]
+STATUSES = ["confirmed", "preparing", "out_for_delivery", "delivered"]
+
+
+def make_order(i, history):
+    placed = datetime(2025, 7, 1) + timedelta(minutes=i)
+    return {
+        "_id": ObjectId(),
+        "orderId": f"ORD-{i:08d}",
+        "userId": f"user{i % 500}",
+        "userName": f"Customer {i % 500}",
+        "userEmail": f"user{i % 500}@example.com",
+        "items": [
+            {"id": str(n), "name": f"Dish {n}", "price": 120.0 + n, "quantity": 1 + n % 3,
+             "category": "Rolls", "image": f"food_{n}.png"}
+            for n in random.sample(range(32), 3)
+        ],
+        "address": {"street": f"{i} Main Road", "city": "Pune", "state": "MH",
+                    "zipCode": "411001", "country": "India"},
+        "subtotal": 480.0,
+        "discount": 0.0,
+        "total": 480.0,
+        "appliedCoupon": None,
+        "paymentMethod": "cod",
+        "orderDate": placed.isoformat(),
+        "status": STATUSES[min(history, len(STATUSES)) - 1],
+        "statusHistory": [
+            {"status": STATUSES[min(n, len(STATUSES) - 1)],
+             "timestamp": (placed + timedelta(minutes=10 * n)).isoformat(),
+             "description": "Status updated"}
+            for n in range(history)
+        ],
+        "lastUpdated": placed + timedelta(minutes=10 * history),
+    }
+
+
+def default_path(orders):
+    payload = jsonable_encoder([serialize_order(order) for order in orders])
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_path(orders):
+    return responses.dumps(orders)
+
+
+def best_of(fn, orders, repeat):
+    timings = []
+    for _ in range(repeat):
+        # serialize_order mutates its input, so every run gets fresh documents
+        fresh = copy.deepcopy(orders)
+        started = time.perf_counter()
+        body = fn(fresh)
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def main(args):
+    random.seed(7)
+    print(f"encoder: {'orjson' if responses.orjson else 'json (orjson not installed)'}; "
+          f"brotli: {'yes' if responses.brotli else 'no'}; statusHistory entries: {args.history}")
+    for endpoint, count in PROFILES:
+        orders = [make_order(i, args.history) for i in range(count)]
+        default_time, default_body = best_of(default_path, orders, args.repeat)
+        fast_time, fast_body = best_of(fast_path, orders, args.repeat)
+        gzipped = len(gzip.compress(fast_body, compresslevel=responses.GZIP_LEVEL))
+        brotli_size = (
+            f"{len(responses.brotli.compress(fast_body, quality=responses.BROTLI_QUALITY)) / 1024:8.1f} KB"
+            if responses.brotli else "       n/a"
+        )
+        print(f"\n{endpoint}  ({count} orders)")
+        print(f"    encode   default {default_time * 1000:8.2f} ms   fast {fast_time * 1000:8.2f} ms"
+              f"   ({default_time / fast_time:4.1f}x)")
+        print(f"    bytes    raw {len(fast_body) / 1024:8.1f} KB   gzip {gzipped / 1024:8.1f} KB"
+              f"   br {brotli_size}")
+        if len(default_body) != len(fast_body):
+            print(f"    note: default body is {len(default_body) - len(fast_body):+d} bytes vs fast")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=4, help="statusHistory entries per order")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
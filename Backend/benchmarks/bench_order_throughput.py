@@ -0,0 +1,97 @@
+"""Concurrent throughput for /place_order and /track_order/{order_id}.
+
+Start the server in the mode you want to measure, then point this at it:
+
+    FOODPREP_DB_DRIVER=sync  uvicorn Server:app --port 8000
+    python benchmarks/bench_order_throughput.py --url http://localhost:8000
+
+    FOODPREP_DB_DRIVER=async uvicorn Server:app --port 8000
+    python benchmarks/bench_order_throughput.py --url http://localhost:8000
+
+Orders are placed for the default ``test@example.com`` user created by
+``initialize_db`` and are tagged with a ``BENCH-`` prefix.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+
+def make_order(order_id):
+    return {
+        "orderId": order_id,
+        "userId": "testuser",
+        "userName": "Test User",
+        "userEmail": "test@example.com",
+        "items": [{"id": "1", "name": "Greek salad", "price": 12.0, "quantity": 2}],
+        "address": {
+            "street": "1 Bench St",
+            "city": "Pune",
+            "state": "MH",
+            "zipCode": "411001",
+            "country": "India",
+        },
+        "subtotal": 24.0,
+        "discount": 0.0,
+        "total": 24.0,
+        "appliedCoupon": None,
+        "paymentMethod": "cod",
+        "orderDate": datetime.now().isoformat(),
+        "status": "confirmed",
+    }
+
+
+async def run(client, label, requests, concurrency, send):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            response = await send(client, i)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<28} {requests / elapsed:9.1f} req/s   "
+        f"p50 {statistics.median(latencies) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+async def main(args):
+    prefix = f"BENCH-{uuid.uuid4().hex[:8]}"
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        await run(
+            client, "POST /place_order", args.requests, args.concurrency,
+            lambda c, i: c.post("/place_order", json=make_order(f"{prefix}-{i}")),
+        )
+        await run(
+            client, "GET /track_order/{id}", args.requests, args.concurrency,
+            lambda c, i: c.get(f"/track_order/{prefix}-{i}"),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
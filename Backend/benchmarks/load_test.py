@@ -0,0 +1,368 @@
+"""Mixed-traffic load test modelled on what the frontend actually requests.
+
+Virtual users run these scenarios side by side for ``--duration`` seconds:
+
+    manager    ManagerDashboard refresh: /orders_by_status for every status,
+               then /order_analytics
+    track      TrackOrder: /get_user_orders, then polling /track_order/{id}
+    checkout   PlaceOrder bursts: several /place_order calls back to back
+    menu       Menu browsing: /get_food_items, revalidated with If-None-Match
+
+For each route it reports throughput and p50/p95/p99 latency.  Results can
+be saved as JSON (``--output``) and compared with an earlier run
+(``--compare``).
+
+Two ways to run it:
+
+    # In-process against an in-memory MongoDB stand-in (needs mongomock);
+    # seeded automatically, nothing outside the process is touched
+    python benchmarks/load_test.py --memory --duration 20 --output before.json
+
+    # Against a running server; --seed writes LOAD- users/orders/food items
+    # through the same FOODPREP_MONGO_URI / FOODPREP_DB_NAME the server uses
+    python benchmarks/load_test.py --url http://localhost:8000 --seed --compare before.json
+
+The in-memory stand-in runs the sync driver path, so use it to compare
+application-side changes.  Use a real MongoDB for database-bound numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+STATUSES = ["confirmed", "preparing", "out_for_delivery", "delivered", "cancelled"]
+SCENARIOS = ["manager", "track", "checkout", "menu"]
+DEFAULT_MIX = "manager=2,track=20,checkout=8,menu=20"
+PERCENTILES = (50, 95, 99)
+PREFIX = "LOAD"
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, count = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}'; use {', '.join(SCENARIOS)}")
+        mix[name] = int(count)
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def user_email(n):
+    return f"load{n}@example.com"
+
+
+def make_order(order_id, n, placed=None, status="confirmed"):
+    return {
+        "orderId": order_id,
+        "userId": f"load{n}",
+        "userName": f"Load User {n}",
+        "userEmail": user_email(n),
+        "items": [
+            {"id": str(i), "name": f"Dish {i}", "price": 120.0 + i, "quantity": 1 + i % 3, "category": "Rolls"}
+            for i in random.sample(range(32), 3)
+        ],
+        "address": {"street": f"{n} Main Road", "city": "Pune", "state": "MH",
+                    "zipCode": "411001", "country": "India"},
+        "subtotal": 480.0,
+        "discount": 0.0,
+        "total": 480.0,
+        "appliedCoupon": None,
+        "paymentMethod": "cod",
+        "orderDate": (placed or datetime.now()).isoformat(),
+        "status": status,
+    }
+
+
+# ==============================
+# Seeding
+# ==============================
+
+async def seed(server, users, orders, food_items):
+    """Insert LOAD- users, orders and food items directly through the repositories."""
+    existing = await server.user_repo.known_emails({user_email(n) for n in range(users)})
+    await server.user_repo.add_many([
+        {"userid": f"load{n}", "email": user_email(n), "password": "load", "role": "user"}
+        for n in range(users) if user_email(n) not in existing
+    ])
+
+    start = datetime.now() - timedelta(days=30)
+    batch, placed = [], []
+    for i in range(orders):
+        n = i % users
+        document = server.build_order_document(server.PlaceOrderRequest(**make_order(
+            f"{PREFIX}-{i:08d}", n,
+            placed=start + timedelta(seconds=i * 30 * 86400 / max(orders, 1)),
+            status=random.choices(STATUSES, weights=[2, 2, 1, 10, 1])[0],
+        )))
+        batch.append(document)
+        if len(batch) == 1000 or i == orders - 1:
+            errors = await server.order_repo.add_many(batch)
+            placed.extend(
+                (doc["status"], doc["total"], doc["orderDate"])
+                for index, doc in enumerate(batch) if index not in errors
+            )
+            batch = []
+    await server.count_orders_placed(placed)
+
+    known_food = {item["id"] for item in await server.food_repo.list()}
+    for i in range(food_items):
+        if f"{PREFIX}-{i}" not in known_food:
+            await server.food_repo.add({
+                "id": f"{PREFIX}-{i}", "name": f"Dish {i}", "price": 100.0 + i % 50,
+                "description": "Seeded for load testing", "category": "Rolls",
+                "image_filename": f"food_load{i % 20}.png",
+                "created_at": datetime.now().isoformat(),
+            })
+    await server.menu_snapshot.invalidate()
+    print(f"🌱 Seeded {users} users, {len(placed)} new orders, {food_items} food items.")
+
+
+# ==============================
+# Scenarios
+# ==============================
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    async def request(self, client, route, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        self.bytes[route] += len(response.content)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+
+async def manager(client, recorder, args, rng, state):
+    for status in STATUSES:
+        await recorder.request(client, "GET /orders_by_status", "GET", "/orders_by_status",
+                               params={"status": status})
+    await recorder.request(client, "GET /order_analytics", "GET", "/order_analytics")
+
+
+async def track(client, recorder, args, rng, state):
+    email = user_email(rng.randrange(args.users))
+    response = await recorder.request(client, "GET /get_user_orders", "GET", "/get_user_orders",
+                                      params={"userEmail": email})
+    orders = response.json() if response is not None and response.status_code == 200 else []
+    order_id = orders[0]["orderId"] if orders else f"{PREFIX}-{rng.randrange(max(args.orders, 1)):08d}"
+    for _ in range(args.track_polls):
+        await recorder.request(client, "GET /track_order/{id}", "GET", f"/track_order/{order_id}")
+        await asyncio.sleep(args.think)
+
+
+async def checkout(client, recorder, args, rng, state):
+    for _ in range(args.burst):
+        n = rng.randrange(args.users)
+        order = make_order(f"{PREFIX}-{uuid.uuid4().hex[:12]}", n)
+        await recorder.request(client, "POST /place_order", "POST", "/place_order", json=order)
+
+
+async def menu(client, recorder, args, rng, state):
+    # Like a browser cache: revalidate with the ETag from this user's last load
+    headers = {"Accept-Encoding": "gzip"}
+    if state.get("etag") and rng.random() < args.revalidate:
+        headers["If-None-Match"] = state["etag"]
+    response = await recorder.request(client, "GET /get_food_items", "GET", "/get_food_items", headers=headers)
+    if response is not None and response.headers.get("etag"):
+        state["etag"] = response.headers["etag"]
+
+
+SCENARIO_FUNCTIONS = {"manager": manager, "track": track, "checkout": checkout, "menu": menu}
+
+
+async def virtual_user(name, client, recorder, args, deadline, seed_value):
+    scenario = SCENARIO_FUNCTIONS[name]
+    rng = random.Random(seed_value)
+    state = {}
+    while time.perf_counter() < deadline:
+        await scenario(client, recorder, args, rng, state)
+        await asyncio.sleep(args.think)
+
+
+async def drive(client, args):
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+    tasks = [
+        virtual_user(name, client, recorder, args, deadline, f"{name}-{i}-{args.seed_value}")
+        for name, count in args.mix.items()
+        for i in range(count)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return recorder, time.perf_counter() - started
+
+
+# ==============================
+# Reporting
+# ==============================
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = sorted(recorder.latencies[route])
+        routes[route] = {
+            "requests": len(values),
+            "errors": recorder.errors[route],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "avg_bytes": round(recorder.bytes[route] / len(values)) if values else 0,
+            **{f"p{p}_ms": round(percentile(values, p) * 1000, 3) if values else None for p in PERCENTILES},
+        }
+    return routes
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(routes, baseline=None):
+    print(f"\n{'route':<26} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, stats in routes.items():
+        line = (f"{route:<26} {stats['throughput_rps']:9.1f} {stats['p50_ms'] or 0:9.2f} "
+                f"{stats['p95_ms'] or 0:9.2f} {stats['p99_ms'] or 0:9.2f} {stats['errors']:7d}")
+        before = (baseline or {}).get(route)
+        if before and before.get("p95_ms") and stats["p95_ms"]:
+            line += (f"   p95 {(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+6.1f}%"
+                     f"  req/s {(stats['throughput_rps'] / before['throughput_rps'] - 1) * 100:+6.1f}%")
+        print(line)
+
+
+# ==============================
+# Entry point
+# ==============================
+
+def import_server(memory):
+    if memory:
+        os.environ["FOODPREP_DB_DRIVER"] = "sync"
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("❌ --memory needs the mongomock package (pip install mongomock)")
+        import storage
+        storage.MongoClient = mongomock.MongoClient
+    # Server resolves its asset paths relative to the Backend directory
+    os.chdir(BACKEND_DIR)
+    import Server
+    return Server
+
+
+async def wait_until_ready(client, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    sys.exit("❌ Server did not become ready")
+
+
+async def main(args):
+    random.seed(args.seed_value)
+    limits = httpx.Limits(max_connections=sum(args.mix.values()) + 10)
+
+    if args.memory:
+        server = import_server(memory=True)
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+                await wait_until_ready(client)
+                await seed(server, args.users, args.orders, args.food_items)
+                recorder, elapsed = await drive(client, args)
+    else:
+        if args.seed:
+            server = import_server(memory=False)
+            try:
+                await seed(server, args.users, args.orders, args.food_items)
+            finally:
+                await server.close_store()
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            await wait_until_ready(client)
+            recorder, elapsed = await drive(client, args)
+
+    routes = summarize(recorder, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+    print_report(routes, baseline)
+
+    if args.output:
+        result = {
+            "commit": git_commit(),
+            "recorded_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "target": "memory" if args.memory else args.url,
+            "settings": {key: value for key, value in os.environ.items() if key.startswith("FOODPREP_")},
+            "params": {
+                "duration": args.duration, "mix": args.mix, "users": args.users, "orders": args.orders,
+                "food_items": args.food_items, "think": args.think, "burst": args.burst,
+                "track_polls": args.track_polls, "revalidate": args.revalidate,
+            },
+            "elapsed_seconds": round(elapsed, 3),
+            "routes": routes,
+        }
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+    return 1 if any(stats["errors"] for stats in routes.values()) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8000", help="server to load (default %(default)s)")
+    target.add_argument("--memory", action="store_true", help="run the app in-process on an in-memory MongoDB")
+    parser.add_argument("--seed", action="store_true", help="seed LOAD- data before a --url run")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help="virtual users per scenario (default %(default)s)")
+    parser.add_argument("--users", type=int, default=200, help="seeded customers")
+    parser.add_argument("--orders", type=int, default=5000, help="seeded orders")
+    parser.add_argument("--food-items", type=int, default=200, help="seeded food items")
+    parser.add_argument("--think", type=float, default=0.0, help="pause between a virtual user's requests")
+    parser.add_argument("--burst", type=int, default=3, help="orders per checkout burst")
+    parser.add_argument("--track-polls", type=int, default=5, help="/track_order polls per TrackOrder visit")
+    parser.add_argument("--revalidate", type=float, default=0.8,
+                        help="share of menu loads sent with the last ETag")
+    parser.add_argument("--random-seed", dest="seed_value", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to diff against")
+    sys.exit(asyncio.run(main(parser.parse_args())))
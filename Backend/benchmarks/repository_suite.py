@@ -0,0 +1,353 @@
+"""Conformance checks and timings shared by every repository implementation.
+
+Each backend gets a fresh, empty database.  The same checks run against
+each one, covering unique keys, newest-first ordering and keyset paging,
+guarded single and bulk status transitions, capped recent history, order
+event paging, partial batch inserts, field selection, shared food images
+and cache versions.  Then the same workload is
+timed on each.
+
+    python benchmarks/repository_suite.py                       # SQLite only
+    python benchmarks/repository_suite.py --mongo-uri mongodb://localhost:27017/
+
+The Mongo run uses (and drops) a throwaway ``foodprep_repository_suite``
+database, with the indexes from ``indexes.py``.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories import (  # noqa: E402
+    DUPLICATE, RECENT_HISTORY, DuplicateError,
+    MongoUserRepository, MongoOrderRepository, MongoOrderEventRepository, MongoFoodRepository,
+    MongoVersionRepository,
+)
+from sqlite_repositories import (  # noqa: E402
+    SqliteStore, SqliteUserRepository, SqliteOrderRepository, SqliteOrderEventRepository,
+    SqliteFoodRepository, SqliteVersionRepository,
+)
+
+SUITE_DB = "foodprep_repository_suite"
+STATUSES = ["confirmed", "preparing", "out_for_delivery", "delivered"]
+
+
+def make_order(i, email="user0@example.com", status="confirmed", placed=None):
+    placed = placed or datetime(2025, 7, 1) + timedelta(minutes=i)
+    return {
+        "orderId": f"ORD-{i:08d}",
+        "userId": "user",
+        "userName": "Customer",
+        "userEmail": email,
+        "items": [{"id": "1", "name": "Dish", "price": 120.0, "quantity": 2}],
+        "address": {"street": "1 Main Road", "city": "Pune", "state": "MH",
+                    "zipCode": "411001", "country": "India"},
+        "subtotal": 240.0,
+        "discount": 0.0,
+        "total": 240.0,
+        "appliedCoupon": None,
+        "paymentMethod": "cod",
+        "orderDate": placed.isoformat(),
+        "status": status,
+        "statusHistory": [{"status": status, "timestamp": placed.isoformat(),
+                           "description": "Order placed and confirmed"}],
+        "lastUpdated": placed.isoformat(),
+    }
+
+
+def strip_id(document):
+    return {key: value for key, value in document.items() if key != "_id"} if document else document
+
+
+# ==============================
+# Conformance
+# ==============================
+
+async def check_users(users, orders, foods, events, versions):
+    assert await users.count() == 0
+    await users.add({"userid": "alice", "email": "alice@example.com", "password": "x", "role": "user"})
+    await users.add_many([
+        {"userid": "bob", "email": "bob@example.com", "password": "y", "role": "owner"},
+        {"userid": "carol", "email": "carol@example.com", "password": "z", "role": "user"},
+    ])
+    assert await users.count() == 3
+    assert (await users.get_by_email("bob@example.com"))["userid"] == "bob"
+    assert (await users.get_by_userid("carol"))["email"] == "carol@example.com"
+    assert await users.get_by_email("nobody@example.com") is None
+    assert await users.exists("carol@example.com") is True
+    assert await users.exists("nobody@example.com") is False
+    assert await users.known_emails({"alice@example.com", "nobody@example.com"}) == {"alice@example.com"}
+    await users.set_password_hash("alice@example.com", "scrypt$hash")
+    alice = await users.get_by_email("alice@example.com")
+    assert alice["password_hash"] == "scrypt$hash" and "password" not in alice, alice
+    for duplicate in ({"userid": "alice2", "email": "alice@example.com"},
+                      {"userid": "alice", "email": "alice2@example.com"}):
+        try:
+            await users.add({**duplicate, "password": "x", "role": "user"})
+        except DuplicateError:
+            pass
+        else:
+            raise AssertionError(f"duplicate user accepted: {duplicate}")
+
+
+async def check_orders(users, orders, foods, events, versions):
+    await orders.add(make_order(1))
+    try:
+        await orders.add(make_order(1))
+    except DuplicateError:
+        pass
+    else:
+        raise AssertionError("duplicate orderId accepted")
+
+    errors = await orders.add_many([make_order(2), make_order(1), make_order(3, status="preparing")])
+    assert set(errors) == {1} and errors[1][0] == DUPLICATE, errors
+    assert await orders.add_many([]) == {}
+
+    stored = strip_id(await orders.get("ORD-00000002"))
+    assert stored == make_order(2), stored
+    assert await orders.get("missing") is None
+    assert set(strip_id(await orders.get("ORD-00000001", ["status", "orderId"]))) == {"status", "orderId"}
+    assert {o["orderId"] for o in await orders.get_many(["ORD-00000001", "ORD-00000003", "x"])} == \
+        {"ORD-00000001", "ORD-00000003"}
+
+
+async def check_order_lists(users, orders, foods, events, versions):
+    same_time = datetime(2025, 8, 1)
+    await orders.add_many([
+        make_order(10, email="a@example.com"),
+        make_order(11, email="a@example.com", status="preparing"),
+        make_order(12, email="b@example.com"),
+        # Equal orderDate: orderId breaks the tie, descending
+        make_order(13, email="a@example.com", placed=same_time),
+        make_order(14, email="a@example.com", placed=same_time),
+    ])
+    listed = [o["orderId"] for o in await orders.list(user_email="a@example.com")]
+    assert listed == ["ORD-00000014", "ORD-00000013", "ORD-00000011", "ORD-00000010"], listed
+    assert [o["orderId"] for o in await orders.list(user_email="a@example.com", limit=2)] == listed[:2]
+    assert [o["orderId"] for o in await orders.list(status="preparing")] == ["ORD-00000011"]
+    after = make_order(10)["orderDate"]
+    assert [o["orderId"] for o in await orders.list(user_email="a@example.com", placed_after=after)] == listed[:3]
+    # Keyset paging continues strictly after the last order seen, ties included
+    assert [o["orderId"] for o in await orders.list(user_email="a@example.com", before=(
+        make_order(14, placed=same_time)["orderDate"], "ORD-00000014"))] == listed[1:]
+    batches = [[o["orderId"] for o in batch]
+               async for batch in orders.iter_batches(2, user_email="a@example.com", limit=3)]
+    assert batches == [listed[:2], listed[2:3]], batches
+    batches = [[o["orderId"] for o in batch] async for batch in orders.iter_batches(3, user_email="a@example.com")]
+    assert batches == [listed[:3], listed[3:]], batches
+    assert (await orders.latest_for_user("a@example.com"))["orderId"] == "ORD-00000014"
+    assert await orders.latest_for_user("nobody@example.com") is None
+
+
+async def check_transitions(users, orders, foods, events, versions):
+    await orders.add(make_order(20))
+    entry = {"status": "preparing", "timestamp": "2025-07-01T10:00:00", "description": "Preparing"}
+    before = await orders.transition("ORD-00000020", ["confirmed"], {"status": "preparing"}, entry)
+    assert before["status"] == "confirmed"
+    after = await orders.get("ORD-00000020")
+    assert after["status"] == "preparing" and after["statusHistory"][-1] == entry
+    # Guard no longer matches: nothing changes
+    assert await orders.transition("ORD-00000020", ["confirmed"], {"status": "cancelled"}, entry) is None
+    assert await orders.transition("missing", ["confirmed"], {"status": "preparing"}, entry) is None
+    assert len((await orders.get("ORD-00000020"))["statusHistory"]) == 2
+    assert [o["orderId"] for o in await orders.list(status="preparing")][0] == "ORD-00000020"
+    # Only the newest RECENT_HISTORY entries stay on the order
+    for n in range(RECENT_HISTORY + 2):
+        step = {"status": "preparing", "timestamp": f"2025-07-01T11:{n:02d}:00", "description": "Preparing"}
+        assert await orders.transition("ORD-00000020", ["preparing"], {"status": "preparing"}, step)
+    history = (await orders.get("ORD-00000020"))["statusHistory"]
+    assert len(history) == RECENT_HISTORY and history[-1]["timestamp"] == f"2025-07-01T11:{RECENT_HISTORY + 1:02d}:00"
+
+    # Bulk: only orders still in the status they were read in move
+    await orders.add_many([make_order(21), make_order(22), make_order(23)])
+    read = await orders.get_many(["ORD-00000021", "ORD-00000022", "ORD-00000023"])
+    await orders.transition("ORD-00000022", ["confirmed"], {"status": "cancelled"}, entry)
+    bulk = {"status": "preparing", "timestamp": "2025-07-01T12:00:00", "description": "Preparing"}
+    moved = await orders.transition_many(read, {"status": "preparing", "lastUpdated": bulk["timestamp"]}, bulk)
+    assert sorted(o["orderId"] for o in moved) == ["ORD-00000021", "ORD-00000023"], moved
+    assert all(o["status"] == "confirmed" for o in moved)
+    assert (await orders.get("ORD-00000022"))["status"] == "cancelled"
+    assert (await orders.get("ORD-00000023"))["statusHistory"][-1] == bulk
+    assert await orders.transition_many([], {"status": "preparing"}, bulk) == []
+
+
+async def check_events(users, orders, foods, events, versions):
+    def event(order_id, minute, status="preparing"):
+        return {"orderId": order_id, "status": status, "timestamp": f"2025-07-01T10:{minute:02d}:00",
+                "description": "Status updated"}
+    await events.add_many([event("A", 3), event("A", 1, "confirmed"), event("B", 2), event("A", 3, "delivered")])
+    # Replays are skipped, not duplicated
+    await events.add_many([event("A", 1, "confirmed"), event("A", 5)])
+    await events.add_many([])
+    listed = [(e["timestamp"][-5:], e["status"]) for e in await events.list("A")]
+    assert listed == [("01:00", "confirmed"), ("03:00", "delivered"), ("03:00", "preparing"), ("05:00", "preparing")], listed
+    assert all("_id" not in e for e in await events.list("A"))
+    page = await events.list("A", after=("2025-07-01T10:03:00", "delivered"), limit=1)
+    assert [(e["timestamp"][-5:], e["status"]) for e in page] == [("03:00", "preparing")], page
+    assert await events.list("missing") == []
+
+
+async def check_food(users, orders, foods, events, versions):
+    assert await foods.list() == []
+    for i in range(3):
+        await foods.add({"id": f"f{i}", "name": f"Dish {i}", "price": 10.0 + i,
+                         "image_filename": "food_shared.png"})
+    assert [item["id"] for item in await foods.list()] == ["f0", "f1", "f2"]
+    assert all("_id" not in item for item in await foods.list())
+    assert (await foods.get("f1"))["name"] == "Dish 1"
+    assert await foods.delete("f1") is True
+    assert await foods.delete("f1") is False
+    assert await foods.get("f1") is None
+
+    await foods.add({"id": "f3", "name": "Dish 3", "price": 13.0, "image_filename": "food_other.png"})
+    assert await foods.image_in_use("food_shared.png") is True
+    assert await foods.image_in_use("food_missing.png") is False
+    assert await foods.images_without_variants() == {"food_shared.png", "food_other.png"}
+    assert await foods.image_variants("food_shared.png") is None
+    variants = {"thumb": {"webp": "food_shared-thumb.webp"}}
+    await foods.set_image_variants("food_shared.png", variants)
+    assert await foods.image_variants("food_shared.png") == variants
+    assert all(item.get("image_variants") == variants for item in await foods.list()
+               if item["image_filename"] == "food_shared.png")
+    assert await foods.images_without_variants() == {"food_other.png"}
+
+
+async def check_versions(users, orders, foods, events, versions):
+    assert await versions.get("menu") == 0
+    await versions.bump("menu")
+    await versions.bump("menu")
+    assert await versions.get("menu") == 2
+    assert await versions.get("other") == 0
+
+
+CHECKS = [check_users, check_orders, check_order_lists, check_transitions, check_events, check_food, check_versions]
+
+
+# ==============================
+# Timings
+# ==============================
+
+async def timed(label, results, fn, repeat):
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        await fn(i)
+        timings.append(time.perf_counter() - started)
+    results[label] = (statistics.median(timings), repeat)
+
+
+async def run_benchmark(orders, size, batch):
+    results = {}
+    emails = [f"bench{n}@example.com" for n in range(50)]
+    await timed("add (one order)", results,
+                lambda i: orders.add(make_order(100_000 + i, email=random.choice(emails))), size)
+    batches = [
+        [make_order(200_000 + b * batch + n, email=random.choice(emails)) for n in range(batch)]
+        for b in range(max(1, size // batch))
+    ]
+    await timed(f"add_many ({batch} orders)", results, lambda i: orders.add_many(batches[i]), len(batches))
+    await timed("get", results, lambda i: orders.get(f"ORD-{100_000 + i % size:08d}"), size)
+    await timed("latest_for_user", results, lambda i: orders.latest_for_user(random.choice(emails)), size)
+    await timed("list user (20)", results,
+                lambda i: orders.list(user_email=random.choice(emails), limit=20), size // 10 or 1)
+    await timed("list status (200)", results, lambda i: orders.list(status="confirmed", limit=200), size // 10 or 1)
+    entry = {"status": "preparing", "timestamp": "2025-07-01T10:00:00", "description": "Preparing"}
+    await timed("transition", results,
+                lambda i: orders.transition(f"ORD-{100_000 + i:08d}", ["confirmed"], {"status": "preparing"}, entry),
+                size)
+    return results
+
+
+# ==============================
+# Backends
+# ==============================
+
+async def sqlite_backend(directory):
+    store = SqliteStore(os.path.join(directory, "suite.sqlite3"))
+    repositories = (SqliteUserRepository(store), SqliteOrderRepository(store), SqliteFoodRepository(store),
+                    SqliteOrderEventRepository(store), SqliteVersionRepository(store))
+
+    async def close():
+        store.close()
+    return repositories, close
+
+
+async def mongo_backend(uri, driver):
+    from storage import Storage
+    from indexes import ensure_indexes
+
+    storage = Storage(uri, SUITE_DB, driver=driver, serverSelectionTimeoutMS=5000)
+    await storage.command({"dropDatabase": 1})
+    await ensure_indexes(storage)
+    repositories = (
+        MongoUserRepository(storage.collection("user_data")),
+        MongoOrderRepository(storage.collection("orders")),
+        MongoFoodRepository(storage.collection("food_items")),
+        MongoOrderEventRepository(storage.collection("order_events")),
+        MongoVersionRepository(storage.collection("cache_versions")),
+    )
+
+    async def close():
+        await storage.command({"dropDatabase": 1})
+        await storage.close()
+    return repositories, close
+
+
+async def run_backend(name, open_backend, args):
+    failures = 0
+    print(f"\n{name}")
+    for check in CHECKS:
+        repositories, close = await open_backend()
+        try:
+            await check(*repositories)
+            print(f"    ✅ {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"    ❌ {check.__name__}: {e}")
+        finally:
+            await close()
+
+    (users, orders, foods, events, versions), close = await open_backend()
+    try:
+        results = await run_benchmark(orders, args.size, args.batch)
+    finally:
+        await close()
+    for label, (median, count) in results.items():
+        print(f"    {label:<24} {median * 1_000_000:10.1f} µs median  ({count} runs)")
+    return failures
+
+
+async def main(args):
+    random.seed(7)
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        counter = iter(range(1_000_000))
+
+        async def open_sqlite():
+            path = os.path.join(directory, f"run{next(counter)}")
+            os.makedirs(path)
+            return await sqlite_backend(path)
+        failures += await run_backend("sqlite (WAL)", open_sqlite, args)
+
+    if args.mongo_uri:
+        failures += await run_backend(
+            f"mongo ({args.driver})", lambda: mongo_backend(args.mongo_uri, args.driver), args
+        )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-uri", help="also run against this MongoDB server")
+    parser.add_argument("--driver", default="async", choices=["async", "sync"])
+    parser.add_argument("--size", type=int, default=1000, help="orders per timed operation")
+    parser.add_argument("--batch", type=int, default=100, help="orders per add_many call")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,159 @@
+"""In-process pub/sub hub for order events, streamed to clients over SSE.
+
+``place_order`` and ``update_order_status`` publish into :data:`hub`;
+``/order_events`` subscribes with optional status and order ID filters.
+
+Every event carries a resume token ``<epoch>-<seq>`` which is sent as the SSE
+``id`` field.  Browsers send it back as ``Last-Event-ID`` when an
+``EventSource`` reconnects, and the hub replays whatever the client missed
+from its ring buffer.  If the token is from another process (different
+epoch) or has already fallen out of the buffer, the client gets a single
+``resync`` event and should refetch its view over the normal REST routes.
+
+Each subscriber has a bounded queue.  A client that stops reading until its
+queue fills is disconnected rather than allowed to hold memory; its
+reconnect resumes from the last event it actually received.
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from collections import deque
+
+ORDER_CREATED = "order_created"
+STATUS_CHANGED = "status_changed"
+
+# Recent events kept for resuming clients
+REPLAY_BUFFER_SIZE = 1000
+# Events queued per subscriber before it is treated as too slow
+SUBSCRIBER_QUEUE_SIZE = 100
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscription:
+    def __init__(self, statuses=None, order_ids=None):
+        self.statuses = set(statuses or ())
+        self.order_ids = set(order_ids or ())
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event):
+        if self.order_ids and event["orderId"] not in self.order_ids:
+            return False
+        if self.statuses and not self.statuses & {event["status"], event.get("previousStatus")}:
+            return False
+        return True
+
+
+class OrderEventHub:
+    """Fan-out of order events to filtered, bounded subscriber queues."""
+
+    def __init__(self, buffer_size=REPLAY_BUFFER_SIZE):
+        self.pid = None
+        self._epoch = None
+        self.seq = 0
+        self.buffer = deque(maxlen=buffer_size)
+        self.subscribers = set()
+
+    def _bind_process(self):
+        """Start a fresh epoch on first use in each process, so forked workers never share one."""
+        if self.pid != os.getpid():
+            self._epoch = uuid.uuid4().hex[:8]
+            self.pid = os.getpid()
+            self.seq = 0
+            self.buffer.clear()
+            self.subscribers = set()
+
+    @property
+    def epoch(self):
+        self._bind_process()
+        return self._epoch
+
+    def token(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def publish(self, event_type, order, previous_status=None):
+        """Record an event for ``order`` and push it to every matching subscriber."""
+        self._bind_process()
+        self.seq += 1
+        event = {
+            "id": self.token(self.seq),
+            "seq": self.seq,
+            "type": event_type,
+            "orderId": order["orderId"],
+            "status": order.get("status"),
+            "previousStatus": previous_status,
+            "order": order,
+        }
+        self.buffer.append(event)
+        for subscription in list(self.subscribers):
+            if subscription.overflowed or not subscription.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+        return event
+
+    def missed_events(self, resume_token):
+        """Return events after ``resume_token``, or None if they can't be replayed."""
+        try:
+            epoch, seq = resume_token.rsplit("-", 1)
+            seq = int(seq)
+        except (AttributeError, ValueError):
+            return None
+        if epoch != self.epoch:
+            return None
+        if seq < self.seq and (not self.buffer or self.buffer[0]["seq"] > seq + 1):
+            return None
+        return [event for event in self.buffer if event["seq"] > seq]
+
+    def subscribe(self, statuses=None, order_ids=None):
+        self._bind_process()
+        subscription = Subscription(statuses, order_ids)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_events(hub, statuses=None, order_ids=None, resume_token=None):
+    """Async generator of SSE frames for one client connection."""
+    subscription = hub.subscribe(statuses, order_ids)
+    try:
+        if resume_token:
+            missed = hub.missed_events(resume_token)
+            if missed is None:
+                yield format_sse("resync", {"reason": "resume token expired"})
+            else:
+                for event in missed:
+                    if subscription.matches(event):
+                        yield format_sse(event["type"], event, event["id"])
+        else:
+            # Give a fresh client a token to resume from even if nothing happens
+            yield format_sse("ready", {}, hub.token(hub.seq))
+
+        while not subscription.overflowed:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event["type"], event, event["id"])
+    finally:
+        hub.unsubscribe(subscription)
+
+
+hub = OrderEventHub()
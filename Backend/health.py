@@ -0,0 +1,103 @@
+"""Liveness and cached readiness for the orchestrator's probes.
+
+Startup never waits on MongoDB.  The lifespan starts :class:`Readiness`,
+which runs two background tasks:
+
+* a warm-up that retries until the database answers, then runs the
+  one-off setup (indexes, default users, analytics counters) and preloads
+  the menu snapshot;
+* a pinger that checks the database every ``PING_INTERVAL`` seconds and
+  caches the result.
+
+Probes only read that cached state, so they cost no database round trip
+and cannot hang a worker.  The process is *ready* once warm-up has finished
+and the latest ping succeeded.
+"""
+
+import asyncio
+import os
+import time
+
+PING_INTERVAL = float(os.getenv("FOODPREP_HEALTH_PING_INTERVAL", "5"))
+PING_TIMEOUT = float(os.getenv("FOODPREP_HEALTH_PING_TIMEOUT", "2"))
+# Warm-up retry delay grows from the first value up to the second
+WARMUP_RETRY_DELAYS = (0.5, 10.0)
+
+
+class Readiness:
+    """Background pinger plus warm-up, with their outcome cached for probes."""
+
+    def __init__(self, storage, warm_up, interval=PING_INTERVAL, timeout=PING_TIMEOUT):
+        self.storage = storage
+        self.warm_up = warm_up
+        self.interval = interval
+        self.timeout = timeout
+        self.database_ok = False
+        self.warmed = False
+        self.last_error = None
+        self.checked_at = None
+        self.warmed_at = None
+        self.started_at = time.time()
+        self.tasks = []
+
+    @property
+    def ready(self):
+        return self.warmed and self.database_ok
+
+    async def ping(self):
+        """Ping once and record the outcome; never raises."""
+        try:
+            await asyncio.wait_for(self.storage.ping(), self.timeout)
+            self.database_ok = True
+            self.last_error = None
+        except Exception as e:
+            self.database_ok = False
+            self.last_error = f"{type(e).__name__}: {e}"[:200]
+        self.checked_at = time.time()
+        return self.database_ok
+
+    async def _ping_loop(self):
+        while True:
+            await self.ping()
+            await asyncio.sleep(self.interval)
+
+    async def _warm_up_loop(self):
+        delay, max_delay = WARMUP_RETRY_DELAYS
+        while True:
+            if await self.ping():
+                try:
+                    await self.warm_up()
+                    self.warmed = True
+                    self.warmed_at = time.time()
+                    print(f"✅ Warm-up finished in {self.warmed_at - self.started_at:.2f}s; ready.")
+                    return
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {e}"[:200]
+                    print(f"⚠️ Warm-up failed, retrying in {delay:.1f}s: {e}")
+            else:
+                print(f"⏳ Waiting for MongoDB ({self.last_error}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.tasks = [
+            loop.create_task(self._warm_up_loop()),
+            loop.create_task(self._ping_loop()),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "warmed": self.warmed,
+            "database": "connected" if self.database_ok else "disconnected",
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+        }
@@ -0,0 +1,203 @@
+"""Pre-sized WebP/JPEG variants of menu images, built in a process pool.
+
+For every stored image ``food_<hash>.<ext>`` the workers write
+``variants/food_<hash>-<variant>.webp`` and ``.jpg`` for each width in
+``VARIANTS``.  Because originals are content addressed, so are the
+variants: a photo shared by several dishes is resized once.
+
+Resizing is CPU bound, so it never runs on the request path or even in the
+server process.  ``add_food_item`` calls :meth:`VariantQueue.submit` and
+returns; when the pool finishes, every food item using that image gets an
+``image_variants`` field and ``get_food_items`` starts returning URLs for
+it.  Pillow is optional: without it uploads still work and items are simply
+served without variants.
+
+Pool processes are started by a fork server (spawn where that is not
+available), never forked from a running server process: a fork would copy
+its event loop, database clients, locks and open sockets into the workers.
+
+Existing catalogs can be processed with:
+
+    python image_variants.py --backfill
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Output width in pixels for each variant; images are never upscaled
+VARIANTS = {
+    "thumbnail": 160,
+    "card": 480,
+    "full": 1280,
+}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+VARIANTS_SUBDIR = "variants"
+VARIANTS_URL = "/images/variants"
+POOL_WORKERS = int(os.getenv("FOODPREP_IMAGE_WORKERS", "2"))
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def variant_filename(image_filename, variant, fmt):
+    stem = os.path.splitext(image_filename)[0]
+    return f"{stem}-{variant}{EXTENSIONS[fmt]}"
+
+
+def build_variants(source_path, output_dir, image_filename):
+    """Resize one original into every variant. Runs inside a pool process."""
+    os.makedirs(output_dir, exist_ok=True)
+    produced = {}
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+        for variant, width in VARIANTS.items():
+            target_width = min(width, original.width)
+            target_height = max(1, round(original.height * target_width / original.width))
+            resized = original.resize((target_width, target_height), Image.LANCZOS)
+            produced[variant] = {"width": target_width, "height": target_height}
+            for fmt, (pil_format, options) in FORMATS.items():
+                image = resized
+                if pil_format == "JPEG" and image.mode == "RGBA":
+                    # JPEG has no alpha channel; flatten onto white
+                    background = Image.new("RGB", image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+                filename = variant_filename(image_filename, variant, fmt)
+                tmp_path = os.path.join(output_dir, f".{filename}.tmp")
+                image.save(tmp_path, pil_format, **options)
+                os.replace(tmp_path, os.path.join(output_dir, filename))
+                produced[variant][fmt] = filename
+    return produced
+
+
+def variant_urls(image_variants):
+    """Turn a stored ``image_variants`` field into URLs for the API response."""
+    return {
+        variant: {
+            **{fmt: f"{VARIANTS_URL}/{info[fmt]}" for fmt in FORMATS if fmt in info},
+            "width": info["width"],
+            "height": info["height"],
+        }
+        for variant, info in image_variants.items()
+    }
+
+
+def remove_variants(images_dir, image_filename):
+    """Delete every variant of an original (called once nothing references it)."""
+    output_dir = os.path.join(images_dir, VARIANTS_SUBDIR)
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            path = os.path.join(output_dir, variant_filename(image_filename, variant, fmt))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class VariantQueue:
+    """Hands originals to a process pool and records the results on the food items."""
+
+    def __init__(self, images_dir, food_repo, workers=POOL_WORKERS, on_change=None):
+        self.images_dir = images_dir
+        self.output_dir = os.path.join(images_dir, VARIANTS_SUBDIR)
+        self.food_repo = food_repo
+        self.workers = workers
+        # Awaited after items gain variants, e.g. to refresh cached menus
+        self.on_change = on_change
+        self.pool = None
+        self.pending = {}
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def submit(self, image_filename):
+        """Queue variant generation for an image; returns immediately."""
+        if not self.enabled or image_filename in self.pending:
+            return
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(POOL_START_METHOD)
+            )
+        task = asyncio.get_running_loop().create_task(self._process(image_filename))
+        self.pending[image_filename] = task
+        task.add_done_callback(lambda _: self.pending.pop(image_filename, None))
+
+    async def _process(self, image_filename):
+        source_path = os.path.join(self.images_dir, image_filename)
+        try:
+            # A shared image may already have been processed for another item
+            existing = await self.food_repo.image_variants(image_filename)
+            if existing:
+                await self.food_repo.set_image_variants(image_filename, existing)
+                if self.on_change:
+                    await self.on_change()
+                return
+            produced = await asyncio.get_running_loop().run_in_executor(
+                self.pool, build_variants, source_path, self.output_dir, image_filename
+            )
+            await self.food_repo.set_image_variants(image_filename, produced)
+            if self.on_change:
+                await self.on_change()
+        except Exception as e:
+            print(f"Warning: Failed to build image variants for {image_filename}: {e}")
+
+    async def drain(self):
+        """Wait for queued work (backfill and shutdown)."""
+        while self.pending:
+            await asyncio.gather(*list(self.pending.values()), return_exceptions=True)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+async def backfill(queue, food_repo):
+    """Queue every image that has no variants yet and wait for all of them."""
+    filenames = await food_repo.images_without_variants()
+    for filename in sorted(filenames):
+        queue.submit(filename)
+    await queue.drain()
+    return len(filenames)
+
+
+async def _main(args):
+    # Imported here so the CLI reuses the server's connection settings
+    from Server import food_repo, close_store, IMAGES_DIR
+
+    if Image is None:
+        print("❌ Pillow is not installed; cannot build image variants.")
+        return 1
+    queue = VariantQueue(IMAGES_DIR, food_repo, workers=args.workers)
+    try:
+        count = await backfill(queue, food_repo)
+    finally:
+        queue.shutdown()
+        await close_store()
+    print(f"✅ Built variants for {count} image(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build image variants for the existing catalog")
+    parser.add_argument("--backfill", action="store_true",
+                        help="process every food item that has no variants yet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or POOL_WORKERS)
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do; pass --backfill")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(asyncio.run(_main(args)))
@@ -0,0 +1,206 @@
+"""Content-addressed storage for uploaded menu images.
+
+Uploads are copied to disk in a worker thread, 64 KiB at a time, while being
+hashed.  The copy stops as soon as the image passes ``MAX_IMAGE_BYTES``.
+The stored name is derived from the SHA-256 of the bytes, so uploading the
+same photo for several dishes keeps a single file.  The extension comes from
+the file's magic bytes, never from the client's filename.
+
+A file's reference count is the number of food items whose
+``image_filename`` points at it; ``release_image`` deletes the file (and its
+resized variants) only once that count reaches zero.  Counting and deleting
+run under the filename's lock, and so do putting an upload in place and
+saving the item that references it (the ``store_upload`` block).  A delete
+therefore cannot remove a file that a concurrent upload of the same bytes
+has just reused.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the locks only cover this process
+    fcntl = None
+
+from starlette.concurrency import run_in_threadpool
+
+from image_variants import remove_variants
+
+CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = int(os.getenv("FOODPREP_MAX_IMAGE_BYTES", 5 * 1024 * 1024))
+LOCK_FILE = ".images.lock"
+# Bytes of LOCK_FILE that filenames hash onto for locking across workers
+LOCK_SLOTS = 4096
+LOCK_POLL = 0.01
+
+# Leading bytes of each accepted format and the extension it is stored under
+SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+]
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class UnsupportedImage(Exception):
+    pass
+
+
+def sniff_extension(head):
+    """Return the stored extension for an image's first bytes, or None."""
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def image_filename(digest, extension):
+    return f"food_{digest[:24]}{extension}"
+
+
+class ImageLocks:
+    """Per-filename locks shared by the tasks and worker processes of one host.
+
+    A filename hashes onto one byte of ``LOCK_FILE``; names sharing a byte
+    only wait for each other.  Across processes that byte carries a POSIX
+    record lock.  Record locks belong to the process, so tasks within it
+    queue on an ``asyncio.Lock`` per byte first.  A task that already
+    holds the lock may take it again.
+    """
+
+    def __init__(self):
+        self.slots = {}  # (images_dir, slot) -> [asyncio.Lock, holding task, users]
+        # Kept open: closing any fd of the file drops this process's record locks
+        self.fds = {}
+
+    def _fd(self, images_dir):
+        if images_dir not in self.fds:
+            os.makedirs(images_dir, exist_ok=True)
+            self.fds[images_dir] = os.open(os.path.join(images_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        return self.fds[images_dir]
+
+    async def _lock_slot(self, images_dir, slot):
+        # Polled rather than blocking a thread, so a cancelled request never leaves it held
+        fd = self._fd(images_dir)
+        while True:
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                return
+            except OSError:
+                await asyncio.sleep(LOCK_POLL)
+
+    @asynccontextmanager
+    async def hold(self, images_dir, filename):
+        slot = int.from_bytes(hashlib.sha256(filename.encode()).digest()[:4], "little") % LOCK_SLOTS
+        key = (images_dir, slot)
+        entry = self.slots.setdefault(key, [asyncio.Lock(), None, 0])
+        task = asyncio.current_task()
+        if entry[1] is task:
+            yield
+            return
+        entry[2] += 1
+        try:
+            async with entry[0]:
+                if fcntl is not None:
+                    await self._lock_slot(images_dir, slot)
+                entry[1] = task
+                try:
+                    yield
+                finally:
+                    entry[1] = None
+                    if fcntl is not None:
+                        fcntl.lockf(self.fds[images_dir], fcntl.LOCK_UN, 1, slot)
+        finally:
+            entry[2] -= 1
+            if not entry[2]:
+                del self.slots[key]
+
+
+image_locks = ImageLocks()
+
+
+def _receive(source, images_dir, max_bytes):
+    """Copy and hash an upload into a temporary file; returns ``(tmp_path, filename)``."""
+    os.makedirs(images_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    fd, tmp_path = tempfile.mkstemp(dir=images_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    extension = sniff_extension(chunk)
+                    if extension is None:
+                        raise UnsupportedImage("File content is not a JPEG, PNG or WEBP image")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageTooLarge(f"Image exceeds the {max_bytes // 1024} KB upload limit")
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise UnsupportedImage("Image file is empty")
+
+        return tmp_path, image_filename(digest.hexdigest(), extension)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+def _discard(tmp_path):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _place(images_dir, tmp_path, filename):
+    final_path = os.path.join(images_dir, filename)
+    if os.path.exists(final_path):
+        # Same bytes already stored for another item
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, final_path)
+
+
+@asynccontextmanager
+async def store_upload(upload, images_dir, max_bytes=MAX_IMAGE_BYTES):
+    """Stream an UploadFile into ``images_dir`` off the event loop; yields its stored name.
+
+    The name stays locked until the block exits, so save the item that
+    references the file inside the block.
+    """
+    tmp_path, filename = await run_in_threadpool(_receive, upload.file, images_dir, max_bytes)
+    try:
+        async with image_locks.hold(images_dir, filename):
+            await run_in_threadpool(_place, images_dir, tmp_path, filename)
+            yield filename
+    finally:
+        await run_in_threadpool(_discard, tmp_path)
+
+
+def _remove(images_dir, filename):
+    path = os.path.join(images_dir, filename)
+    if os.path.exists(path):
+        os.remove(path)
+    remove_variants(images_dir, filename)
+
+
+async def release_image(food_repo, images_dir, filename):
+    """Delete ``filename`` if no food item references it any more; returns True if removed."""
+    if not filename:
+        return False
+    async with image_locks.hold(images_dir, filename):
+        if await food_repo.image_in_use(filename):
+            return False
+        await run_in_threadpool(_remove, images_dir, filename)
+    return True
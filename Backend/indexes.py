@@ -0,0 +1,154 @@
+"""Index bootstrap and query-plan verification for the FoodPrep collections.
+
+``ensure_indexes`` runs from ``startup_db`` and is idempotent: Mongo treats a
+``createIndexes`` call for an index that already exists as a no-op.
+
+``QUERY_SHAPES`` mirrors every filter/sort the routes in Server.py issue.
+Run the check against a live database to confirm none of them falls back to
+a collection scan:
+
+    python indexes.py --check
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+INDEXES = {
+    "orders": [
+        IndexModel([("orderId", ASCENDING)], name="orderId_unique", unique=True),
+        IndexModel(
+            [("userEmail", ASCENDING), ("orderDate", DESCENDING), ("orderId", DESCENDING)],
+            name="userEmail_orderDate_orderId",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("orderDate", DESCENDING), ("orderId", DESCENDING)],
+            name="status_orderDate_orderId",
+        ),
+        IndexModel([("orderDate", DESCENDING)], name="orderDate"),
+    ],
+    "order_events": [
+        IndexModel(
+            [("orderId", ASCENDING), ("timestamp", ASCENDING), ("status", ASCENDING)],
+            name="orderId_timestamp_status_unique", unique=True,
+        ),
+    ],
+    "user_data": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("userid", ASCENDING)], name="userid_unique", unique=True),
+    ],
+    "food_items": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("image_filename", ASCENDING)], name="image_filename"),
+    ],
+}
+
+# (label, collection, command, filter, sort) for each query a route issues.
+# Values are placeholders; only the shape matters to the planner.
+QUERY_SHAPES = [
+    ("login_user", "user_data", "find", {"email": "a@b.c"}, None),
+    ("register_user userid", "user_data", "find", {"userid": "x"}, None),
+    ("register_user email", "user_data", "find", {"email": "a@b.c"}, None),
+    ("place_order cache miss", "user_data", "find", {"email": "a@b.c"}, None),
+    ("place_orders_batch user lookup", "user_data", "find", {"email": {"$in": ["a@b.c", "d@e.f"]}}, None),
+    ("delete_food_item", "food_items", "find", {"id": "x"}, None),
+    ("delete_food_item image refs", "food_items", "count", {"image_filename": "food_x.png"}, None),
+    ("track_order", "orders", "find", {"orderId": "x"}, None),
+    ("update_order_status", "orders", "find", {"orderId": "x", "status": {"$in": ["confirmed"]}}, None),
+    ("bulk_update_order_status", "orders", "find", {"orderId": {"$in": ["x", "y"]}}, None),
+    ("get_order_status", "orders", "find", {"orderId": "x"}, None),
+    ("get_orders_by_status", "orders", "find", {"status": "confirmed"}, {"orderDate": -1, "orderId": -1}),
+    ("get_orders_by_status page", "orders", "find",
+     {"$and": [{"status": "confirmed"}, {"$or": [
+         {"orderDate": {"$lt": "2025-01-01T00:00:00"}},
+         {"orderDate": "2025-01-01T00:00:00", "orderId": {"$lt": "x"}},
+     ]}]}, {"orderDate": -1, "orderId": -1}),
+    ("get_user_orders", "orders", "find", {"userEmail": "a@b.c"}, {"orderDate": -1, "orderId": -1}),
+    ("get_user_orders after", "orders", "find",
+     {"userEmail": "a@b.c", "orderDate": {"$gt": "2025-01-01T00:00:00"}}, {"orderDate": -1, "orderId": -1}),
+    ("get_latest_order", "orders", "find", {"userEmail": "a@b.c"}, {"orderDate": -1, "orderId": -1}),
+    ("get_order_timeline", "order_events", "find", {"orderId": "x"}, {"timestamp": 1, "status": 1}),
+    ("get_order_timeline page", "order_events", "find",
+     {"orderId": "x", "$or": [
+         {"timestamp": {"$gt": "2025-01-01T00:00:00"}},
+         {"timestamp": "2025-01-01T00:00:00", "status": {"$gt": "confirmed"}},
+     ]}, {"timestamp": 1, "status": 1}),
+]
+
+
+async def ensure_indexes(storage):
+    """Create every index in ``INDEXES``; a failure on one does not stop the rest."""
+    for collection_name, models in INDEXES.items():
+        collection = storage.collection(collection_name)
+        for model in models:
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                # Typically a unique index over data that already has duplicates
+                print(f"⚠️ Could not create index {collection_name}.{model.document['name']}: {e}")
+    print("✅ Indexes ensured.")
+
+
+def plan_stages(plan):
+    """Yield every stage name in a (possibly nested) winning plan."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def explain_query_shapes(storage):
+    """Explain every entry in ``QUERY_SHAPES`` and return the ones that COLLSCAN."""
+    failures = []
+    for label, collection_name, command, filter, sort in QUERY_SHAPES:
+        if command == "find":
+            explained = {"find": collection_name, "filter": filter}
+            if sort:
+                explained["sort"] = sort
+        else:
+            explained = {"count": collection_name, "query": filter}
+        result = await storage.command({"explain": explained, "verbosity": "queryPlanner"})
+        stages = list(plan_stages(result["queryPlanner"]["winningPlan"]))
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{status:<9} {label:<28} {' <- '.join(stages)}")
+        if status != "ok":
+            failures.append(label)
+    return failures
+
+
+async def _main(args):
+    # Imported here so the CLI reuses the server's connection settings
+    from Server import STORE, storage
+
+    if STORE != "mongo":
+        print("❌ Indexes are managed here for MongoDB only; the SQLite schema creates its own.")
+        return 1
+    try:
+        if not args.no_create:
+            await ensure_indexes(storage)
+        if not args.check:
+            return 0
+        failures = await explain_query_shapes(storage)
+    finally:
+        await storage.close()
+    if failures:
+        print(f"❌ {len(failures)} query shape(s) still scan the collection: {', '.join(failures)}")
+        return 1
+    print("✅ Every query shape uses an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create FoodPrep indexes and verify query plans")
+    parser.add_argument("--check", action="store_true", help="explain every route query and fail on COLLSCAN")
+    parser.add_argument("--no-create", action="store_true", help="do not create missing indexes first")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(asyncio.run(_main(parser.parse_args())))
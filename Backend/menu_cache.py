@@ -0,0 +1,93 @@
+"""Versioned, pre-encoded snapshot of the /get_food_items response.
+
+The menu only changes when a food item is added or deleted (or gets its
+image variants), yet it is read on every page load.  :class:`MenuSnapshot`
+keeps the encoded JSON body, gzip-compressed (and brotli, if installed)
+copies, and a strong ETag derived from the body.  Requests are answered
+from those bytes, and ``If-None-Match`` gets a 304.
+
+Every write path calls :meth:`MenuSnapshot.invalidate`, which bumps a
+version counter in the version repository (the ``cache_versions``
+collection or table).  Other uvicorn workers notice the new version with a
+single key lookup, made at most once every ``VERSION_CHECK_INTERVAL``
+seconds, so their copy is never staler than that.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+
+from responses import accepts_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+VERSIONS_COLLECTION = "cache_versions"
+MENU_VERSION_ID = "menu"
+VERSION_CHECK_INTERVAL = 1.0
+
+
+class Snapshot:
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.gzip = gzip.compress(body, compresslevel=6)
+        self.brotli = brotli.compress(body) if brotli else None
+
+    def response(self, request):
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if self.etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        body = self.body
+        if self.brotli is not None and accepts_encoding(request, "br"):
+            body = self.brotli
+            headers["Content-Encoding"] = "br"
+        elif accepts_encoding(request, "gzip"):
+            body = self.gzip
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+class MenuSnapshot:
+    """Process-local copy of the encoded menu, refreshed when the version moves."""
+
+    def __init__(self, version_repo, load_items):
+        self.version_repo = version_repo
+        self.load_items = load_items
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+        self.builds = 0
+
+    async def current(self):
+        """Return an up-to-date :class:`Snapshot`, rebuilding it if needed."""
+        snapshot = self.snapshot
+        if snapshot is not None and time.monotonic() - self.checked_at < VERSION_CHECK_INTERVAL:
+            return snapshot
+        async with self.lock:
+            if self.snapshot is not snapshot and self.snapshot is not None:
+                # Another request refreshed it while we waited for the lock
+                return self.snapshot
+            version = await self.version_repo.get(MENU_VERSION_ID)
+            self.checked_at = time.monotonic()
+            if self.snapshot is None or self.snapshot.version != version:
+                items = await self.load_items()
+                body = json.dumps({"success": True, "items": items}, default=str).encode()
+                # Hashing and compressing a whole menu is too slow for the event loop
+                self.snapshot = await run_in_threadpool(Snapshot, version, body)
+                self.builds += 1
+            return self.snapshot
+
+    async def invalidate(self):
+        """Record a menu change for every worker and drop this worker's copy."""
+        await self.version_repo.bump(MENU_VERSION_ID)
+        self.snapshot = None
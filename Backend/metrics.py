@@ -0,0 +1,323 @@
+"""Request and MongoDB metrics in the Prometheus text format, served at /metrics.
+
+:class:`MetricsMiddleware` records, for each route template (e.g.
+``/track_order/{order_id}``):
+
+* request counts by method and status code;
+* latency, response size, and time spent in MongoDB commands and waiting
+  for a pooled connection, all as histograms;
+* in-flight requests, as a gauge.
+
+MongoDB is instrumented through PyMongo's event listeners.
+:class:`CommandMetrics` times every command per command name and
+collection.  :class:`CheckoutMetrics` times how long each operation waited
+for a pooled connection.  Both also add their time to the current request,
+so a slow ``/orders_by_status`` can be split into query time, pool
+contention, and what is left over (encoding and application code).
+
+Values are per process; scrape every worker, or sum them.
+"""
+
+import contextvars
+import threading
+import time
+
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Commands whose target collection is the value of the command's first field
+COLLECTION_COMMANDS = {
+    "find", "insert", "update", "delete", "aggregate", "count", "distinct",
+    "findAndModify", "findandmodify", "createIndexes", "listIndexes", "drop",
+}
+
+# [mongo seconds, pool wait seconds] for the request being handled, if any
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"
+            for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, labels, value):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self.lock:
+            items = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self.values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, [("le", _format_number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "foodprep_http_requests_total", "HTTP requests by route, method and status code",
+    ["route", "method", "status"]))
+REQUEST_SECONDS = registry.register(Histogram(
+    "foodprep_http_request_duration_seconds", "Time until the last response byte was sent",
+    ["route", "method"]))
+RESPONSE_BYTES = registry.register(Histogram(
+    "foodprep_http_response_size_bytes", "Response body size as sent (after compression)",
+    ["route", "method"], buckets=SIZE_BUCKETS))
+IN_FLIGHT = registry.register(Gauge(
+    "foodprep_http_requests_in_flight", "Requests currently being handled", ["route"]))
+REQUEST_MONGO_SECONDS = registry.register(Histogram(
+    "foodprep_http_request_mongo_seconds", "Time a request spent in MongoDB commands",
+    ["route", "method"]))
+REQUEST_POOL_WAIT_SECONDS = registry.register(Histogram(
+    "foodprep_http_request_pool_wait_seconds", "Time a request waited for pooled MongoDB connections",
+    ["route", "method"]))
+MONGO_COMMAND_SECONDS = registry.register(Histogram(
+    "foodprep_mongo_command_duration_seconds", "MongoDB command round trips",
+    ["command", "collection"]))
+MONGO_COMMAND_FAILURES = registry.register(Counter(
+    "foodprep_mongo_command_failures_total", "MongoDB commands that returned an error",
+    ["command", "collection"]))
+POOL_CHECKOUT_SECONDS = registry.register(Histogram(
+    "foodprep_mongo_pool_checkout_wait_seconds", "Time spent waiting to check out a pooled connection",
+    ["server"]))
+POOL_CHECKOUT_FAILURES = registry.register(Counter(
+    "foodprep_mongo_pool_checkout_failures_total", "Connection checkouts that failed or timed out",
+    ["server", "reason"]))
+
+
+def _add_request_time(index, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[index] += seconds
+
+
+# ==============================
+# MongoDB listeners
+# ==============================
+
+def command_collection(event):
+    command = event.command
+    if event.command_name == "getMore":
+        return command.get("collection", "")
+    if event.command_name in COLLECTION_COMMANDS:
+        value = command.get(event.command_name)
+        return value if isinstance(value, str) else ""
+    return ""
+
+
+class CommandMetrics(CommandListener):
+    """Times every command by name and collection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (request_id, connection_id) -> (command name, collection)
+        self.started_commands = {}
+
+    def _key(self, event):
+        return event.request_id, event.connection_id
+
+    def started(self, event):
+        with self.lock:
+            self.started_commands[self._key(event)] = (event.command_name, command_collection(event))
+
+    def _finish(self, event, failed):
+        with self.lock:
+            labels = self.started_commands.pop(self._key(event), (event.command_name, ""))
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_SECONDS.observe(labels, seconds)
+        if failed:
+            MONGO_COMMAND_FAILURES.inc(labels)
+        _add_request_time(0, seconds)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+class CheckoutMetrics(ConnectionPoolListener):
+    """Times connection checkouts; every other pool event is ignored."""
+
+    def _server(self, event):
+        return f"{event.address[0]}:{event.address[1]}"
+
+    def connection_checked_out(self, event):
+        # ``duration`` (seconds) is reported by PyMongo 4.7+
+        seconds = getattr(event, "duration", None) or 0.0
+        POOL_CHECKOUT_SECONDS.observe((self._server(event),), seconds)
+        _add_request_time(1, seconds)
+
+    def connection_check_out_failed(self, event):
+        POOL_CHECKOUT_FAILURES.inc((self._server(event), str(event.reason)))
+        _add_request_time(1, getattr(event, "duration", None) or 0.0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+# ==============================
+# HTTP middleware
+# ==============================
+
+def route_template(routes, scope):
+    """The path template a request will be routed to, or "unmatched"."""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are measured until their last chunk."""
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(self.router.routes, scope)
+        method = scope["method"]
+        status = {"code": 500}
+        size = {"bytes": 0}
+        timings = [0.0, 0.0]
+        token = _request_timings.set(timings)
+        IN_FLIGHT.inc((route,))
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                size["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_timings.reset(token)
+            IN_FLIGHT.dec((route,))
+            REQUESTS.inc((route, method, str(status["code"])))
+            REQUEST_SECONDS.observe((route, method), elapsed)
+            RESPONSE_BYTES.observe((route, method), size["bytes"])
+            REQUEST_MONGO_SECONDS.observe((route, method), timings[0])
+            REQUEST_POOL_WAIT_SECONDS.observe((route, method), timings[1])
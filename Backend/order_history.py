@@ -0,0 +1,147 @@
+"""Order status timelines in the append-only ``order_events`` collection.
+
+Each status change is one event document (``orderId``, ``status``,
+``timestamp``, ``description``), written next to the guarded update of the
+order.  The order document itself keeps only its current status and the
+last ``RECENT_HISTORY`` entries of ``statusHistory`` (``$slice``), so
+orders stop growing with every transition and list responses stay small.
+``/order_timeline/{order_id}`` pages through the full history, oldest
+first.
+
+Events are unique on ``(orderId, timestamp, status)``, so a retried write,
+a write-behind journal replay, or a rerun of the migration never
+duplicates one.  Orders whose history is known to be in ``order_events``
+carry ``historyInEvents: true``; new orders get it when placed.  Orders
+written before this change hold their whole history inline and lack the
+flag.  The first status change of such an order copies its inline history
+into ``order_events`` before the ``$slice`` can trim it, and sets the flag.
+The migration does the same for every order at once:
+
+    python order_history.py --check
+    python order_history.py --migrate
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+
+from repositories import RECENT_HISTORY
+
+EVENTS_COLLECTION = "order_events"
+# Set on orders whose whole status history is in order_events
+HISTORY_IN_EVENTS = "historyInEvents"
+DEFAULT_TIMELINE_PAGE = 100
+MIGRATION_BATCH = 500
+
+
+def history_events(order):
+    """The order's statusHistory entries as event documents."""
+    return [{"orderId": order["orderId"], **entry} for entry in order.get("statusHistory", [])]
+
+
+def legacy_history_events(orders):
+    """Events for the inline history of orders not yet flagged HISTORY_IN_EVENTS."""
+    return [event for order in orders if not order.get(HISTORY_IN_EVENTS) for event in history_events(order)]
+
+
+def encode_event_cursor(event):
+    raw = json.dumps([event["timestamp"], event["status"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_event_cursor(token):
+    """Return ``(timestamp, status)`` from a token; raises ValueError if malformed."""
+    try:
+        timestamp, status = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except Exception as e:
+        raise ValueError("Invalid timeline cursor") from e
+    return timestamp, status
+
+
+async def timeline_page(event_repo, order_id, limit, cursor=None):
+    """One page of events plus the token for the next page (None on the last)."""
+    after = decode_event_cursor(cursor) if cursor else None
+    events = await event_repo.list(order_id, after=after, limit=limit + 1)
+    if len(events) > limit:
+        events = events[:limit]
+        return events, encode_event_cursor(events[-1])
+    return events, None
+
+
+# ==============================
+# Migration
+# ==============================
+
+async def migrate(order_collection, event_repo, batch_size=MIGRATION_BATCH, write=True):
+    """Copy inline histories into events, flag and trim orders; returns (orders, events, trimmed).
+
+    Orders are read in ``_id`` order, a batch at a time.  A batch's orders
+    are flagged and trimmed only after its events are stored.  Rerunning
+    after an interruption is safe.
+    """
+    last_id = None
+    orders = events = trimmed = 0
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await order_collection.find(
+            query, {"orderId": 1, "statusHistory": 1, HISTORY_IN_EVENTS: 1}, sort=[("_id", 1)], limit=batch_size
+        )
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        orders += len(batch)
+        new_events = legacy_history_events(batch)
+        unflagged = [order["orderId"] for order in batch if not order.get(HISTORY_IN_EVENTS)]
+        long = [order["orderId"] for order in batch if len(order.get("statusHistory", [])) > RECENT_HISTORY]
+        events += len(new_events)
+        trimmed += len(long)
+        if not write:
+            continue
+        await event_repo.add_many(new_events)
+        if unflagged:
+            await order_collection.update_many({"orderId": {"$in": unflagged}}, {"$set": {HISTORY_IN_EVENTS: True}})
+        if long:
+            # Keeps the newest entries, including any pushed since this batch was read
+            await order_collection.update_many(
+                {"orderId": {"$in": long}},
+                {"$push": {"statusHistory": {"$each": [], "$slice": -RECENT_HISTORY}}},
+            )
+    return orders, events, trimmed
+
+
+async def _main(args):
+    # Imported here so the CLI reuses the server's connection settings
+    from Server import STORE, storage, order_collection, order_event_repo
+
+    if STORE != "mongo":
+        print("❌ The history migration runs against MongoDB only (FOODPREP_STORE=mongo).")
+        return 1
+    try:
+        orders, events, trimmed = await migrate(
+            order_collection, order_event_repo, args.batch, write=args.migrate
+        )
+    finally:
+        await storage.close()
+    if args.migrate:
+        print(f"✅ {events} history entries of {orders} orders copied to {EVENTS_COLLECTION}; "
+              f"{trimmed} orders trimmed to their last {RECENT_HISTORY} entries.")
+        return 0
+    if trimmed:
+        print(f"❌ {trimmed} of {orders} orders hold more than {RECENT_HISTORY} history entries. "
+              f"Run with --migrate to move them to {EVENTS_COLLECTION}.")
+        return 1
+    print(f"✅ No order holds more than {RECENT_HISTORY} history entries.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move order status histories into the order_events collection")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--check", action="store_true", help="count orders that still need trimming")
+    mode.add_argument("--migrate", action="store_true", help="copy histories to events and trim orders")
+    parser.add_argument("--batch", type=int, default=MIGRATION_BATCH, help="orders per batch")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(asyncio.run(_main(parser.parse_args())))
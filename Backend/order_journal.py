@@ -0,0 +1,412 @@
+"""Write-behind journal for /place_order (opt-in with ``FOODPREP_ORDER_WRITE_BEHIND=1``).
+
+An accepted order is appended to a local journal and acknowledged as soon
+as the journal is fsync'd.  Concurrent requests share that work (group
+commit): whatever arrived while the previous fsync was running is written
+and fsync'd together.  A background flusher inserts the buffered orders
+into MongoDB with ``add_many`` every ``FLUSH_INTERVAL`` seconds, or sooner
+once ``FLUSH_BATCH`` orders are waiting.  A Mongo stall therefore delays
+the flush, not the response.
+
+Each worker process journals into its own subdirectory of
+``FOODPREP_ORDER_JOURNAL_DIR`` (named after its pid) and holds an
+exclusive ``flock`` on the ``lock`` file inside it for as long as it
+runs.  The directory holds segment files, one JSON order per line.  A
+flush first seals the current segment and starts a new one.  Sealed
+segments are deleted only once every order in them is stored, and a
+worker only ever deletes segments it wrote or adopted.
+
+On start, a worker adopts the directories of workers that died with
+orders still journaled: a directory whose lock can be taken has no live
+owner.  Its segments are replayed into the buffer, and the directory is
+removed once they are all flushed.  Directories of live workers are
+left alone.  Replay is idempotent: orders already stored by an
+interrupted flush come back from the unique ``orderId`` index as
+duplicates and are dropped.
+
+``append`` only rejects an ``orderId`` that is already buffered;
+checking the database would put the round trip back on checkout.  An
+order whose ``orderId`` turns out to be taken by a *different* stored
+order is rejected at flush instead: it is dropped from the buffer,
+counted, logged, and passed to ``on_rejected``.
+
+Until an order is flushed, :meth:`OrderJournal.get` returns it, so reads of
+a just-placed order stay consistent.  Orders accepted by other workers
+are read from their journal directories with :meth:`OrderJournal.peer_orders`;
+the server does so when the database does not have an order (yet), so
+read-your-writes holds whichever worker serves the read.
+"""
+
+import asyncio
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no write-behind journal
+    fcntl = None
+
+from starlette.concurrency import run_in_threadpool
+
+from repositories import DUPLICATE, DuplicateError
+
+WRITE_BEHIND = os.getenv("FOODPREP_ORDER_WRITE_BEHIND", "0") == "1"
+JOURNAL_DIR = os.getenv("FOODPREP_ORDER_JOURNAL_DIR", "./order_journal")
+FLUSH_INTERVAL = float(os.getenv("FOODPREP_ORDER_FLUSH_INTERVAL", "0.05"))
+FLUSH_BATCH = int(os.getenv("FOODPREP_ORDER_FLUSH_BATCH", "500"))
+# Delay before retrying a flush that failed because MongoDB was unavailable
+RETRY_DELAY = 1.0
+# Set by the client at checkout and never changed afterwards
+IDENTITY_FIELDS = ("userEmail", "orderDate", "total", "items")
+
+SEGMENT_SUFFIX = ".jsonl"
+LOCK_FILE = "lock"
+
+
+def segment_name(number):
+    return f"{number:012d}{SEGMENT_SUFFIX}"
+
+
+def _segments(directory):
+    return sorted(
+        int(name[:-len(SEGMENT_SUFFIX)])
+        for name in os.listdir(directory)
+        if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+    )
+
+
+def _try_lock(path, create=False):
+    """An fd holding the exclusive lock on ``path``, or None if a live process holds it."""
+    try:
+        fd = os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o600)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _remove_segments(directory, numbers):
+    for number in numbers:
+        path = os.path.join(directory, segment_name(number))
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _remove_directory(directory, lock_fd):
+    """Delete a journal directory whose segments are all stored, then drop its lock."""
+    try:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    finally:
+        os.close(lock_fd)
+
+
+def same_order(a, b):
+    """True if ``a`` and ``b`` are the same checkout (a replay, not an orderId clash)."""
+    return all(a.get(field) == b.get(field) for field in IDENTITY_FIELDS)
+
+
+def read_segment(path):
+    """Orders in one segment; a torn final line (never acknowledged) is skipped."""
+    orders = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                orders.append(json.loads(line))
+            except ValueError:
+                continue
+    return orders
+
+
+class OrderJournal:
+    """Group-committed local journal plus an in-memory buffer flushed to MongoDB."""
+
+    def __init__(self, root, order_repo, on_flushed=None, on_rejected=None,
+                 flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.root = root
+        self.directory = None
+        self.lock_fd = None
+        # Directories of dead workers: [(directory, lock fd, segment numbers)]
+        self.adopted = []
+        self.order_repo = order_repo
+        # Awaited with the orders each flush actually inserted (e.g. analytics)
+        self.on_flushed = on_flushed
+        # Awaited with orders dropped because another order already has their orderId
+        self.on_rejected = on_rejected
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.buffer = {}
+        self.pending = []
+        self.sealed = []
+        self.segment = None
+        self.file = None
+        self.segment_lock = asyncio.Lock()
+        self.flush_lock = asyncio.Lock()
+        self.commit_wakeup = asyncio.Event()
+        self.flush_wakeup = asyncio.Event()
+        self.tasks = []
+        self.committing = False
+        self.commits = 0
+        self.flushed = 0
+        self.rejected = 0
+
+    # ---- journal files -------------------------------------------------
+
+    def _open_segment(self, number):
+        self.segment = number
+        self.file = open(os.path.join(self.directory, segment_name(number)), "ab")
+
+    def _claim_directory(self):
+        """Create and lock this worker's own directory."""
+        name, attempt = str(os.getpid()), 0
+        while True:
+            directory = os.path.join(self.root, name)
+            os.makedirs(directory, exist_ok=True)
+            fd = _try_lock(os.path.join(directory, LOCK_FILE), create=True)
+            if fd is not None:
+                self.directory, self.lock_fd = directory, fd
+                return
+            # Same pid as a live worker on another host sharing the volume
+            attempt += 1
+            name = f"{os.getpid()}-{attempt}"
+
+    def _adopt_orphans(self):
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            fd = _try_lock(os.path.join(directory, LOCK_FILE))
+            if fd is None:
+                continue
+            try:
+                numbers = _segments(directory)
+            except FileNotFoundError:
+                # Another worker adopted and removed it first
+                os.close(fd)
+                continue
+            orders = [
+                order for number in numbers
+                for order in read_segment(os.path.join(directory, segment_name(number)))
+            ]
+            if not orders:
+                _remove_directory(directory, fd)
+                continue
+            for order in orders:
+                self.buffer[order["orderId"]] = order
+            self.adopted.append((directory, fd, numbers))
+
+    def _replay(self):
+        if fcntl is None:
+            raise RuntimeError("The write-behind order journal needs fcntl (Linux or macOS)")
+        os.makedirs(self.root, exist_ok=True)
+        self._claim_directory()
+        # Segments left by an earlier process with the same pid
+        numbers = _segments(self.directory)
+        for number in numbers:
+            for order in read_segment(os.path.join(self.directory, segment_name(number))):
+                self.buffer[order["orderId"]] = order
+        self.sealed = numbers
+        self._adopt_orphans()
+        self._open_segment((numbers[-1] + 1) if numbers else 1)
+        return len(self.buffer)
+
+    def _write(self, lines):
+        self.file.write(b"".join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _seal(self):
+        self.file.close()
+        self.sealed.append(self.segment)
+        self._open_segment(self.segment + 1)
+
+    def _remove_flushed(self, numbers, adopted):
+        _remove_segments(self.directory, numbers)
+        for directory, fd, _ in adopted:
+            _remove_directory(directory, fd)
+
+    # ---- accepting orders ----------------------------------------------
+
+    async def append(self, order):
+        """Durably journal ``order``; returns once it is fsync'd."""
+        if order["orderId"] in self.buffer or any(o["orderId"] == order["orderId"] for o, _ in self.pending):
+            raise DuplicateError(f"Order {order['orderId']} is already buffered")
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((order, future))
+        self.commit_wakeup.set()
+        await future
+
+    async def _commit_loop(self):
+        while True:
+            await self.commit_wakeup.wait()
+            self.commit_wakeup.clear()
+            batch, self.pending = self.pending, []
+            if not batch:
+                continue
+            lines = [json.dumps(order, default=str).encode() + b"\n" for order, _ in batch]
+            self.committing = True
+            try:
+                async with self.segment_lock:
+                    await run_in_threadpool(self._write, lines)
+                    for order, _ in batch:
+                        self.buffer[order["orderId"]] = order
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.committing = False
+            self.commits += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+            if len(self.buffer) >= self.flush_batch:
+                self.flush_wakeup.set()
+
+    # ---- flushing to MongoDB -------------------------------------------
+
+    async def flush(self):
+        """Insert everything buffered so far; returns True once it is all stored."""
+        async with self.flush_lock:
+            async with self.segment_lock:
+                if not self.buffer:
+                    return True
+                await run_in_threadpool(self._seal)
+                sealed = list(self.sealed)
+                adopted = list(self.adopted)
+                orders = list(self.buffer.values())
+
+            inserted, rejected, complete = [], [], True
+            try:
+                for start in range(0, len(orders), self.flush_batch):
+                    chunk = orders[start:start + self.flush_batch]
+                    # add_many may add Mongo's _id to the documents; keep the buffered copies clean
+                    errors = await self.order_repo.add_many([dict(order) for order in chunk])
+                    duplicates = [chunk[index] for index, error in errors.items() if error[0] == DUPLICATE]
+                    stored = {}
+                    if duplicates:
+                        stored = {
+                            order["orderId"]: order
+                            for order in await self.order_repo.get_many([order["orderId"] for order in duplicates])
+                        }
+                    for index, order in enumerate(chunk):
+                        error = errors.get(index)
+                        if error is None:
+                            inserted.append(order)
+                        elif error[0] != DUPLICATE:
+                            complete = False
+                            print(f"⚠️ Order {order['orderId']} not flushed: {error[1]}")
+                            continue
+                        elif not same_order(order, stored.get(order["orderId"], {})):
+                            rejected.append(order)
+                            print(f"⚠️ Order {order['orderId']} rejected at flush: another order has this orderId")
+                        self.buffer.pop(order["orderId"], None)
+            finally:
+                # Report whatever was stored, even if a later chunk failed
+                self.flushed += len(inserted)
+                self.rejected += len(rejected)
+                if inserted and self.on_flushed:
+                    await self.on_flushed(inserted)
+                if rejected and self.on_rejected:
+                    await self.on_rejected(rejected)
+            if complete:
+                await run_in_threadpool(self._remove_flushed, sealed, adopted)
+                self.sealed = [number for number in self.sealed if number not in sealed]
+                self.adopted = [entry for entry in self.adopted if entry not in adopted]
+            return complete
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_wakeup.clear()
+            try:
+                if not await self.flush():
+                    await asyncio.sleep(RETRY_DELAY)
+            except Exception as e:
+                print(f"⚠️ Order journal flush failed, retrying in {RETRY_DELAY:.0f}s: {e}")
+                await asyncio.sleep(RETRY_DELAY)
+
+    # ---- reads and lifecycle -------------------------------------------
+
+    def get(self, order_id):
+        """The buffered (not yet stored) order, or None."""
+        order = self.buffer.get(order_id)
+        return dict(order) if order is not None else None
+
+    def buffered_for_user(self, email):
+        return [dict(order) for order in self.buffer.values() if order.get("userEmail") == email]
+
+    def _read_peers(self):
+        orders = {}
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            try:
+                for number in _segments(directory):
+                    for order in read_segment(os.path.join(directory, segment_name(number))):
+                        orders[order["orderId"]] = order
+            except FileNotFoundError:
+                # Flushed and cleaned up while we were reading
+                continue
+        return orders
+
+    async def peer_orders(self):
+        """Orders journaled by other workers and not yet cleaned up, by orderId."""
+        if self.directory is None:
+            return {}
+        return await run_in_threadpool(self._read_peers)
+
+    async def start(self):
+        replayed = await run_in_threadpool(self._replay)
+        if replayed:
+            print(f"↩️ Replaying {replayed} journaled order(s) into MongoDB.")
+        loop = asyncio.get_running_loop()
+        self.tasks = [loop.create_task(self._commit_loop()), loop.create_task(self._flush_loop())]
+
+    async def stop(self):
+        # Let in-flight appends reach the disk, then try one last flush
+        while self.pending or self.committing:
+            self.commit_wakeup.set()
+            await asyncio.sleep(0.01)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ {len(self.buffer)} order(s) left in the journal for the next start: {e}")
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.lock_fd is not None:
+            if self.buffer:
+                # Unlocked, so the next worker to start adopts what is left
+                os.close(self.lock_fd)
+            else:
+                _remove_directory(self.directory, self.lock_fd)
+            self.lock_fd = None
+        for _, fd, _ in self.adopted:
+            os.close(fd)
+        self.adopted = []
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "buffered": len(self.buffer),
+            "sealed_segments": len(self.sealed),
+            "adopted_directories": len(self.adopted),
+            "group_commits": self.commits,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+        }
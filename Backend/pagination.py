@@ -0,0 +1,80 @@
+"""Keyset pagination and streamed JSON output for the order list routes.
+
+Orders are listed newest first on ``(orderDate, orderId)``; ``orderId`` breaks
+ties between orders placed in the same instant.  A page's ``next`` token
+encodes the sort key of its last order, and the following page asks the
+order repository for everything strictly after that key (its ``before``
+argument), so each page is an index range scan no matter how deep the client
+pages.  ``filters`` below are the keyword filters of ``OrderRepository.list``.
+
+Without ``limit`` or ``cursor`` the routes keep returning a bare array of
+every match.  With either, they return ``{"orders": [...], "next": token}``
+where ``next`` is null on the last page.
+"""
+
+import base64
+import json
+
+from bson import json_util
+
+ORDER_SORT = [("orderDate", -1), ("orderId", -1)]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Orders fetched from the cursor per chunk written in streaming mode
+STREAM_BATCH_SIZE = 100
+
+
+def encode_cursor(order):
+    # json_util keeps datetime orderDates typed so the range query still matches
+    raw = json_util.dumps([order.get("orderDate"), order.get("orderId")])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return ``(orderDate, orderId)`` from a token; raises ValueError if malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        order_date, order_id = json_util.loads(base64.urlsafe_b64decode(padded).decode())
+    except Exception as e:
+        raise ValueError("Invalid pagination cursor") from e
+    return order_date, order_id
+
+
+async def fetch_page(order_repo, filters, limit, before=None):
+    """Return one page of raw orders plus the token for the next page."""
+    orders = await order_repo.list(**filters, before=before, limit=limit + 1)
+    if len(orders) > limit:
+        orders = orders[:limit]
+        return orders, encode_cursor(orders[-1])
+    return orders, None
+
+
+async def stream_orders(order_repo, filters, encode, limit=None, before=None):
+    """Yield a JSON response body chunk by chunk as the repository produces orders.
+
+    With ``limit`` the body is the paginated envelope, otherwise a bare array,
+    matching what the non-streaming route would have returned.  ``encode``
+    turns one raw order into its JSON text.
+    """
+    yield '{"orders": [' if limit else "["
+    sent = 0
+    next_token = None
+    has_more = False
+    async for batch in order_repo.iter_batches(
+        STREAM_BATCH_SIZE, **filters, before=before, limit=limit + 1 if limit else None
+    ):
+        if limit and sent + len(batch) > limit:
+            batch = batch[:limit - sent]
+            has_more = True
+        if not batch:
+            break
+        # Taken before encoding, which may rewrite datetime fields in place
+        next_token = encode_cursor(batch[-1])
+        chunk = ", ".join(encode(order) for order in batch)
+        yield (", " if sent else "") + chunk
+        sent += len(batch)
+    if limit:
+        next_token = next_token if has_more else None
+        yield f'], "next": {json.dumps(next_token)}}}'
+    else:
+        yield "]"
@@ -0,0 +1,174 @@
+"""On-demand and sampled request profiling, written as flamegraph folded stacks.
+
+A request is profiled when either:
+
+* it carries ``X-Profile: 1`` (or ``?profile=1``) and an ``X-Admin-Token``
+  matching ``FOODPREP_ADMIN_TOKEN``.  Without a configured token the flag
+  is ignored, so anonymous clients cannot make the server profile; or
+* it is the N-th request with ``FOODPREP_PROFILE_SAMPLE_EVERY=N`` set.
+
+While that request runs, a background thread samples the stacks of every
+Python thread (the event loop and the threadpool) every
+``SAMPLE_INTERVAL`` seconds.  The result is saved to ``FOODPREP_PROFILE_DIR``
+in the folded format read by flamegraph.pl and speedscope; the oldest
+files beyond ``PROFILE_KEEP`` are removed.  The response gets an
+``X-Profile-Id`` header naming the file, which ``/admin/profiles/{name}``
+serves.
+
+Other requests running at the same time appear in the samples too.
+Profiling runs one request at a time, and requests that arrive meanwhile
+are not profiled.  With profiling off, each request costs a scan of its
+headers and, in sampled mode, a counter increment.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+SAMPLE_EVERY = int(os.getenv("FOODPREP_PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_DIR = os.getenv("FOODPREP_PROFILE_DIR", "./profiles")
+PROFILE_KEEP = int(os.getenv("FOODPREP_PROFILE_KEEP", "50"))
+SAMPLE_INTERVAL = 0.001
+PROFILE_SUFFIX = ".folded"
+
+UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class StackSampler:
+    """Counts folded stacks of every thread except its own until stopped."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = False
+        self.thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while self.running:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    # A threadpool thread started after profiling began
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_name == "get" and code.co_filename.endswith("queue.py"):
+                        # An idle threadpool worker waiting for work
+                        stack = None
+                        break
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack is None:
+                    continue
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_path(directory, name):
+    """Path of a stored profile, or None if ``name`` is not one of them."""
+    if not name.endswith(PROFILE_SUFFIX) or UNSAFE_NAME.search(name):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles(directory):
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith(PROFILE_SUFFIX):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({"name": name, "bytes": stat.st_size,
+                             "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat()})
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+def save_profile(directory, name, folded, keep=PROFILE_KEEP):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(folded)
+    for stale in list_profiles(directory)[keep:]:
+        os.remove(os.path.join(directory, stale["name"]))
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware that profiles flagged or sampled requests."""
+
+    def __init__(self, app, admin_token=None, sample_every=SAMPLE_EVERY, directory=PROFILE_DIR):
+        self.app = app
+        self.admin_token = admin_token
+        self.sample_every = sample_every
+        self.directory = directory
+        self.requests = 0
+        self.busy = False
+
+    def _wanted(self, scope):
+        if scope["type"] != "http":
+            return None
+        flagged = any(key == b"x-profile" and value == b"1" for key, value in scope["headers"]) or (
+            b"profile=" in scope.get("query_string", b"")
+            and parse_qs(scope["query_string"].decode()).get("profile") == ["1"]
+        )
+        if flagged:
+            token = dict(scope["headers"]).get(b"x-admin-token", b"").decode()
+            if self.admin_token and token == self.admin_token:
+                return "request"
+        if self.sample_every:
+            self.requests += 1
+            if self.requests % self.sample_every == 0:
+                return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        reason = self._wanted(scope)
+        if reason is None or self.busy:
+            await self.app(scope, receive, send)
+            return
+
+        self.busy = True
+        name = "{}-{}-{}{}".format(
+            datetime.now().strftime("%Y%m%dT%H%M%S%f"), reason,
+            UNSAFE_NAME.sub("_", f"{scope['method']}{scope['path']}").strip("_")[:80], PROFILE_SUFFIX,
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            folded = sampler.stop()
+            self.busy = False
+            try:
+                await run_in_threadpool(save_profile, self.directory, name, folded)
+            except OSError as e:
+                print(f"⚠️ Could not save profile {name}: {e}")
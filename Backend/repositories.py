@@ -0,0 +1,370 @@
+"""Storage-neutral repositories for users, orders, food items and cache versions.
+
+Routes ask a repository for *what* they need ("the user with this email",
+"move this order to preparing if it is still confirmed") instead of writing
+Mongo filters inline, so the same operations can be served by another
+engine.  Two implementations exist:
+
+* the ``Mongo*`` classes below, wrapping :class:`storage.Collection`;
+* the ``Sqlite*`` classes in ``sqlite_repositories.py`` (WAL mode).
+
+Documents go in and come out as plain dicts shaped like the Mongo
+documents.  Lists of orders are always newest first (``ORDER_SORT``), and
+``before`` continues a list after the ``(orderDate, orderId)`` of the last
+order already seen.  An
+order keeps only its last ``RECENT_HISTORY`` status entries; the full
+timeline is in the order events, oldest first (``EVENT_SORT``).  Both
+implementations are checked against each other by
+``benchmarks/repository_suite.py``.
+"""
+
+import os
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from pagination import ORDER_SORT
+
+# Error codes in the mapping returned by OrderRepository.add_many
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+# statusHistory entries kept on the order document itself
+RECENT_HISTORY = int(os.getenv("FOODPREP_RECENT_HISTORY", "5"))
+# Order events are unique on (orderId, timestamp, status) and listed in this order
+EVENT_SORT = [("timestamp", 1), ("status", 1)]
+
+
+class DuplicateError(Exception):
+    """A unique key (email, userid, orderId, food id) is already taken."""
+
+
+class UserRepository:
+    async def count(self):
+        raise NotImplementedError
+
+    async def get_by_email(self, email):
+        raise NotImplementedError
+
+    async def get_by_userid(self, userid):
+        raise NotImplementedError
+
+    async def exists(self, email):
+        """Whether a user has this email, without fetching the document."""
+        raise NotImplementedError
+
+    async def known_emails(self, emails):
+        """The subset of ``emails`` that belong to registered users."""
+        raise NotImplementedError
+
+    async def add(self, user):
+        raise NotImplementedError
+
+    async def add_many(self, users):
+        raise NotImplementedError
+
+    async def set_password_hash(self, email, password_hash):
+        """Store a password hash and drop any plaintext password."""
+        raise NotImplementedError
+
+
+class OrderRepository:
+    async def get(self, order_id, fields=None):
+        """One order, optionally limited to ``fields``; None if unknown."""
+        raise NotImplementedError
+
+    async def get_many(self, order_ids):
+        raise NotImplementedError
+
+    async def latest_for_user(self, email):
+        raise NotImplementedError
+
+    async def list(self, user_email=None, status=None, placed_after=None, before=None, limit=None):
+        """Orders matching every given filter, newest first, sorting strictly after ``before``."""
+        raise NotImplementedError
+
+    async def iter_batches(self, batch_size, user_email=None, status=None, placed_after=None, before=None,
+                           limit=None):
+        """Like ``list``, but yields lists of up to ``batch_size`` orders as they are read."""
+        raise NotImplementedError
+        yield
+
+    async def add(self, order):
+        raise NotImplementedError
+
+    async def add_many(self, orders):
+        """Insert what can be inserted; returns ``{index: (code, detail)}`` for the rest."""
+        raise NotImplementedError
+
+    async def transition(self, order_id, allowed_previous, changes, history_entry):
+        """Atomically apply ``changes`` and append ``history_entry`` (keeping the
+        last ``RECENT_HISTORY``) if the order's status is one of
+        ``allowed_previous``.  Returns the order as it was before, or None if it
+        is unknown or in another status."""
+        raise NotImplementedError
+
+    async def transition_many(self, orders, changes, history_entry):
+        """Apply the same ``changes`` and ``history_entry`` to each of ``orders``
+        (documents as read) that is still in the status it was read in.
+        Returns the ones that moved, as they were before."""
+        raise NotImplementedError
+
+
+class OrderEventRepository:
+    async def add_many(self, events):
+        """Append status events; one already stored (same orderId, timestamp and status) is skipped."""
+        raise NotImplementedError
+
+    async def list(self, order_id, after=None, limit=None):
+        """Events of one order, oldest first, strictly after the ``(timestamp, status)`` ``after``."""
+        raise NotImplementedError
+
+
+class FoodRepository:
+    async def get(self, item_id):
+        raise NotImplementedError
+
+    async def list(self):
+        raise NotImplementedError
+
+    async def add(self, item):
+        raise NotImplementedError
+
+    async def delete(self, item_id):
+        """Returns True if an item was removed."""
+        raise NotImplementedError
+
+    async def image_in_use(self, image_filename):
+        """Whether any item still references this image file."""
+        raise NotImplementedError
+
+    async def image_variants(self, image_filename):
+        """The ``image_variants`` already recorded for this image on any item, or None."""
+        raise NotImplementedError
+
+    async def set_image_variants(self, image_filename, variants):
+        """Record ``variants`` on every item using this image."""
+        raise NotImplementedError
+
+    async def images_without_variants(self):
+        """Filenames of item images that have no variants recorded yet."""
+        raise NotImplementedError
+
+
+class VersionRepository:
+    """Named counters that tell every worker its cached copy is stale."""
+
+    async def get(self, name):
+        """Current version, 0 if never bumped."""
+        raise NotImplementedError
+
+    async def bump(self, name):
+        raise NotImplementedError
+
+
+# ==============================
+# MongoDB
+# ==============================
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def count(self):
+        return await self.collection.count_documents({})
+
+    async def get_by_email(self, email):
+        return await self.collection.find_one({"email": email})
+
+    async def get_by_userid(self, userid):
+        return await self.collection.find_one({"userid": userid})
+
+    async def exists(self, email):
+        # Covered by email_unique: only the index is read
+        return await self.collection.find_one({"email": email}, {"email": 1, "_id": 0}) is not None
+
+    async def known_emails(self, emails):
+        users = await self.collection.find({"email": {"$in": list(emails)}}, {"email": 1, "_id": 0})
+        return {user["email"] for user in users}
+
+    async def add(self, user):
+        try:
+            await self.collection.insert_one(user)
+        except DuplicateKeyError as e:
+            raise DuplicateError(str(e))
+
+    async def add_many(self, users):
+        await self.collection.insert_many(users)
+
+    async def set_password_hash(self, email, password_hash):
+        await self.collection.update_one(
+            {"email": email},
+            {"$set": {"password_hash": password_hash}, "$unset": {"password": ""}},
+        )
+
+
+class MongoOrderRepository(OrderRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, order_id, fields=None):
+        projection = {field: 1 for field in fields} if fields else None
+        return await self.collection.find_one({"orderId": order_id}, projection)
+
+    async def get_many(self, order_ids):
+        return await self.collection.find({"orderId": {"$in": list(order_ids)}})
+
+    async def latest_for_user(self, email):
+        return await self.collection.find_one({"userEmail": email}, sort=ORDER_SORT)
+
+    @staticmethod
+    def _query(user_email, status, placed_after, before):
+        query = {}
+        if user_email is not None:
+            query["userEmail"] = user_email
+        if status is not None:
+            query["status"] = status
+        if placed_after is not None:
+            query["orderDate"] = {"$gt": placed_after}
+        if before is not None:
+            # Keyset on the ORDER_SORT index, so a deep page is still a range scan
+            order_date, order_id = before
+            query["$or"] = [
+                {"orderDate": {"$lt": order_date}},
+                {"orderDate": order_date, "orderId": {"$lt": order_id}},
+            ]
+        return query
+
+    async def list(self, user_email=None, status=None, placed_after=None, before=None, limit=None):
+        query = self._query(user_email, status, placed_after, before)
+        return await self.collection.find(query, sort=ORDER_SORT, limit=limit or 0)
+
+    async def iter_batches(self, batch_size, user_email=None, status=None, placed_after=None, before=None,
+                           limit=None):
+        query = self._query(user_email, status, placed_after, before)
+        async for batch in self.collection.iter_batches(
+            query, sort=ORDER_SORT, limit=limit or 0, batch_size=batch_size
+        ):
+            yield batch
+
+    async def add(self, order):
+        try:
+            await self.collection.insert_one(order)
+        except DuplicateKeyError as e:
+            raise DuplicateError(str(e))
+
+    async def add_many(self, orders):
+        if not orders:
+            return {}
+        try:
+            await self.collection.insert_many(orders, ordered=False)
+        except BulkWriteError as e:
+            return {
+                error["index"]: (
+                    # Unique orderId index: already stored by an earlier attempt
+                    (DUPLICATE, "Order already exists") if error.get("code") == 11000
+                    else (FAILED, error.get("errmsg", "Order not saved due to server error."))
+                )
+                for error in e.details.get("writeErrors", [])
+            }
+        return {}
+
+    async def transition(self, order_id, allowed_previous, changes, history_entry):
+        # ReturnDocument.BEFORE is the default
+        return await self.collection.find_one_and_update(
+            {"orderId": order_id, "status": {"$in": list(allowed_previous)}},
+            {"$set": changes, "$push": {"statusHistory": {"$each": [history_entry], "$slice": -RECENT_HISTORY}}},
+        )
+
+    async def transition_many(self, orders, changes, history_entry):
+        if not orders:
+            return []
+        update = {"$set": changes, "$push": {"statusHistory": {"$each": [history_entry], "$slice": -RECENT_HISTORY}}}
+        result = await self.collection.bulk_write(
+            [UpdateOne({"orderId": order["orderId"], "status": order["status"]}, update) for order in orders],
+            ordered=False,
+        )
+        if result.matched_count == len(orders):
+            return list(orders)
+        # Some changed in between; the ones that moved now carry every change
+        landed = {
+            order["orderId"]
+            for order in await self.collection.find(
+                {"orderId": {"$in": [order["orderId"] for order in orders]}, **changes}, {"orderId": 1}
+            )
+        }
+        return [order for order in orders if order["orderId"] in landed]
+
+
+class MongoOrderEventRepository(OrderEventRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def add_many(self, events):
+        if not events:
+            return
+        try:
+            await self.collection.insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            # Unique (orderId, timestamp, status): a retried or replayed event is already there
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    async def list(self, order_id, after=None, limit=None):
+        query = {"orderId": order_id}
+        if after is not None:
+            timestamp, status = after
+            query["$or"] = [{"timestamp": {"$gt": timestamp}}, {"timestamp": timestamp, "status": {"$gt": status}}]
+        return await self.collection.find(query, {"_id": 0}, sort=EVENT_SORT, limit=limit or 0)
+
+
+class MongoFoodRepository(FoodRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, item_id):
+        return await self.collection.find_one({"id": item_id})
+
+    async def list(self):
+        return await self.collection.find({}, {"_id": 0})
+
+    async def add(self, item):
+        await self.collection.insert_one(item)
+
+    async def delete(self, item_id):
+        result = await self.collection.delete_one({"id": item_id})
+        return result.deleted_count > 0
+
+    async def image_in_use(self, image_filename):
+        return await self.collection.count_documents({"image_filename": image_filename}, limit=1) > 0
+
+    async def image_variants(self, image_filename):
+        item = await self.collection.find_one(
+            {"image_filename": image_filename, "image_variants": {"$exists": True}},
+            {"_id": 0, "image_variants": 1},
+        )
+        return item["image_variants"] if item else None
+
+    async def set_image_variants(self, image_filename, variants):
+        await self.collection.update_many(
+            {"image_filename": image_filename}, {"$set": {"image_variants": variants}}
+        )
+
+    async def images_without_variants(self):
+        items = await self.collection.find(
+            {"image_variants": {"$exists": False}, "image_filename": {"$exists": True}},
+            {"_id": 0, "image_filename": 1},
+        )
+        return {item["image_filename"] for item in items}
+
+
+class MongoVersionRepository(VersionRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, name):
+        doc = await self.collection.find_one({"_id": name})
+        return doc["version"] if doc else 0
+
+    async def bump(self, name):
+        await self.collection.update_one({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
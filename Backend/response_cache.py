@@ -0,0 +1,503 @@
+"""Encoded responses cached across workers, invalidated by tag.
+
+Each cached body carries tags (``order:<id>``, ``status:<s>``,
+``user:<email>``).  A write calls :meth:`ResponseCache.invalidate` with the
+tags it touched.  Invalidation does not search for entries.  Every tag has
+a version counter, and each entry records the versions of its tags from
+*before* its body was loaded.  An entry whose versions no longer match is
+a miss.  A read that raced a write therefore never outlives it, and
+invalidating costs one counter increment per tag.
+
+``FOODPREP_RESPONSE_CACHE`` picks the backend:
+
+* ``off`` (default): no caching;
+* ``memory``: an LRU in this process.  Invalidation only reaches this
+  worker, so use it with a single worker;
+* ``shm``: a fixed-size table in a memory-mapped file (``/dev/shm`` by
+  default) shared by every worker on the host, guarded by ``flock``;
+* ``redis://[:password@]host:port/db``: any server speaking the Redis
+  protocol, shared by every worker and host.  Give it enough memory not
+  to evict: an evicted tag counter can let a stale body be served until
+  that body expires.
+
+Entries also expire after ``FOODPREP_RESPONSE_CACHE_TTL`` seconds (default
+30).  A tag counter is dropped once it has not been bumped for twice that
+long (``PEXPIRE`` in Redis, a sweep in memory; the shm table is fixed
+size), so counters for old orders and users do not pile up.  A dropped
+counter reads as 0 again, which is safe: every entry stamped before its
+last bump has expired by then.  If the backend fails, the request is
+served from MongoDB and the error is counted; the cache never fails a
+request.
+"""
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: no shm backend
+    fcntl = None
+
+RESPONSE_CACHE = os.getenv("FOODPREP_RESPONSE_CACHE", "off")
+RESPONSE_CACHE_TTL = float(os.getenv("FOODPREP_RESPONSE_CACHE_TTL", "30"))
+# memory: total body bytes kept
+MEMORY_CACHE_BYTES = int(os.getenv("FOODPREP_RESPONSE_CACHE_MB", "64")) * 1024 * 1024
+# shm: file location, number of entries and largest entry
+SHM_PATH = os.getenv(
+    "FOODPREP_RESPONSE_CACHE_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "foodprep-response-cache"),
+)
+SHM_SLOTS = int(os.getenv("FOODPREP_RESPONSE_CACHE_SLOTS", "1024"))
+SHM_SLOT_BYTES = int(os.getenv("FOODPREP_RESPONSE_CACHE_SLOT_KB", "64")) * 1024
+SHM_TAG_SLOTS = 8192
+REDIS_POOL_SIZE = 8
+REDIS_TIMEOUT = 0.5
+REDIS_PREFIX = "foodprep:"
+
+
+def order_tag(order_id):
+    return f"order:{order_id}"
+
+
+def status_tag(status):
+    return f"status:{status}"
+
+
+def user_tag(email):
+    return f"user:{email}"
+
+
+ANALYTICS_TAG = "analytics"
+
+
+def _pack_entry(versions, body):
+    return json.dumps(versions).encode() + b"\n" + body
+
+
+def _unpack_entry(value):
+    versions, _, body = value.partition(b"\n")
+    return json.loads(versions), body
+
+
+def _digest(text, size=16):
+    return hashlib.blake2b(text.encode(), digest_size=size).digest()
+
+
+class CacheBackend:
+    """Stores opaque values by key, plus one version counter per tag."""
+
+    name = None
+
+    async def lookup(self, key, tags):
+        """``(value or None, [version of each tag])`` in one step."""
+        raise NotImplementedError
+
+    async def store(self, key, value, ttl):
+        raise NotImplementedError
+
+    async def bump(self, tags, ttl):
+        """Increment each tag's version; ``ttl`` is the entry lifetime the counter must outlast."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+# ==============================
+# In-process LRU
+# ==============================
+
+class MemoryBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_bytes=MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()  # key -> (expires, value)
+        self.versions = {}  # tag -> (version, time of the last bump)
+        self.next_sweep = 0.0
+
+    async def lookup(self, key, tags):
+        versions = [self.versions.get(tag, (0,))[0] for tag in tags]
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, versions
+        if entry[0] <= time.time():
+            self._drop(key)
+            return None, versions
+        self.entries.move_to_end(key)
+        return entry[1], versions
+
+    def _drop(self, key):
+        self.bytes -= len(self.entries.pop(key)[1])
+
+    async def store(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._drop(key)
+        self.entries[key] = (time.time() + ttl, value)
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+
+    async def bump(self, tags, ttl):
+        now = time.time()
+        if now >= self.next_sweep:
+            self.versions = {tag: kept for tag, kept in self.versions.items() if kept[1] > now - 2 * ttl}
+            self.next_sweep = now + ttl
+        for tag in tags:
+            self.versions[tag] = (self.versions.get(tag, (0,))[0] + 1, now)
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "tag_counters": len(self.versions)}
+
+
+# ==============================
+# Shared memory (one host)
+# ==============================
+
+class SharedMemoryBackend(CacheBackend):
+    """Direct-mapped table in a memory-mapped file, shared by every worker.
+
+    Layout: a header, ``tag_slots`` 8-byte version counters (a tag maps to
+    one by hash; two tags sharing a counter only cause extra misses), then
+    ``slots`` fixed-size entries.  A key maps to one slot, and storing
+    overwrites whatever was there.  Values larger than a slot are not
+    cached.  Readers hold a shared ``flock`` and writers an exclusive
+    one, only while copying bytes.
+
+    ``flock`` locks belong to an open file description, which a forked child
+    shares with its parent, so each process opens the file and maps it on
+    first use (like ``storage.Storage.connect``) instead of inheriting them.
+    """
+
+    name = "shm"
+    MAGIC = b"FPRC0001"
+    HEADER = struct.Struct("<8sIII")
+    SLOT_HEADER = struct.Struct("<16sdI")  # key digest, expiry (epoch seconds), value length
+    COUNTER = struct.Struct("<Q")
+
+    def __init__(self, path=SHM_PATH, slots=SHM_SLOTS, slot_bytes=SHM_SLOT_BYTES, tag_slots=SHM_TAG_SLOTS):
+        # Workers configured differently get separate files instead of resizing a shared one
+        self.path = f"{path}-{slots}x{slot_bytes}"
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.tag_slots = tag_slots
+        self.tags_at = 64
+        self.slots_at = self.tags_at + tag_slots * self.COUNTER.size
+        self.size = self.slots_at + slots * slot_bytes
+        self.too_large = 0
+        if fcntl is None:
+            raise RuntimeError("The shm response cache needs fcntl (Linux or macOS)")
+
+        self.fd = None
+        self.map = None
+        self.pid = None
+
+        # Create or check the file now, so a bad layout fails at startup, not on the first request
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = self.HEADER.pack(self.MAGIC, slots, slot_bytes, tag_slots)
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, header, 0)
+            elif os.fstat(fd).st_size != self.size or os.pread(fd, len(header), 0) != header:
+                raise RuntimeError(f"{self.path} is not a response cache with this layout")
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _attach(self):
+        """Open and map the file in the current process; a forked child gets its own."""
+        if self.pid == os.getpid():
+            return
+        if self.map is not None:
+            # Inherited from the parent: closing them here leaves the parent's untouched
+            self.map.close()
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_RDWR)
+        self.map = mmap.mmap(self.fd, self.size)
+        self.pid = os.getpid()
+
+    def _tag_offset(self, tag):
+        index = int.from_bytes(_digest(tag, 8), "little") % self.tag_slots
+        return self.tags_at + index * self.COUNTER.size
+
+    def _slot(self, digest):
+        return self.slots_at + int.from_bytes(digest[:8], "little") % self.slots * self.slot_bytes
+
+    async def lookup(self, key, tags):
+        digest = _digest(key)
+        offset = self._slot(digest)
+        self._attach()
+        fcntl.flock(self.fd, fcntl.LOCK_SH)
+        try:
+            versions = [self.COUNTER.unpack_from(self.map, self._tag_offset(tag))[0] for tag in tags]
+            stored, expires, length = self.SLOT_HEADER.unpack_from(self.map, offset)
+            if stored != digest or expires <= time.time():
+                return None, versions
+            start = offset + self.SLOT_HEADER.size
+            return self.map[start:start + length], versions
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    async def store(self, key, value, ttl):
+        if len(value) > self.slot_bytes - self.SLOT_HEADER.size:
+            self.too_large += 1
+            return
+        digest = _digest(key)
+        offset = self._slot(digest)
+        start = offset + self.SLOT_HEADER.size
+        self._attach()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            self.map[start:start + len(value)] = value
+            self.SLOT_HEADER.pack_into(self.map, offset, digest, time.time() + ttl, len(value))
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    async def bump(self, tags, ttl):
+        self._attach()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            for offset in {self._tag_offset(tag) for tag in tags}:
+                self.COUNTER.pack_into(self.map, offset, self.COUNTER.unpack_from(self.map, offset)[0] + 1)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    async def close(self):
+        if self.map is not None:
+            self.map.close()
+            os.close(self.fd)
+            self.fd = self.map = self.pid = None
+
+    def stats(self):
+        return {"path": self.path, "slots": self.slots, "slot_bytes": self.slot_bytes,
+                "bytes": self.size, "too_large": self.too_large}
+
+
+# ==============================
+# Redis protocol
+# ==============================
+
+class RedisError(Exception):
+    pass
+
+
+class RespConnection:
+    """One connection speaking RESP2, with pipelined commands."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, host, port, password=None, db=0):
+        reader, writer = await asyncio.open_connection(host, port)
+        connection = cls(reader, writer)
+        setup = []
+        if password:
+            setup.append(("AUTH", password))
+        if db:
+            setup.append(("SELECT", db))
+        if setup:
+            await connection.execute(*setup)
+        return connection
+
+    @staticmethod
+    def _encode(command):
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _reply(self):
+        line = await self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            if int(rest) < 0:
+                return None
+            return (await self.reader.readexactly(int(rest) + 2))[:-2]
+        if kind == b"*":
+            return None if int(rest) < 0 else [await self._reply() for _ in range(int(rest))]
+        raise RedisError(f"Unexpected reply: {line[:40]!r}")
+
+    async def execute(self, *commands):
+        """Send every command, then read one reply per command."""
+        self.writer.write(b"".join(self._encode(command) for command in commands))
+        await self.writer.drain()
+        return [await self._reply() for _ in commands]
+
+    def close(self):
+        self.writer.close()
+
+
+class RedisBackend(CacheBackend):
+    name = "redis"
+
+    def __init__(self, url, pool_size=REDIS_POOL_SIZE, timeout=REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(pool_size)
+        self.idle = []
+        self.opened = 0
+
+    async def _execute(self, *commands):
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(
+                        RespConnection.open(self.host, self.port, self.password, self.db), self.timeout
+                    )
+                    self.opened += 1
+                replies = await asyncio.wait_for(connection.execute(*commands), self.timeout)
+            except BaseException:
+                # The reply stream may be half read; never reuse this connection
+                if connection is not None:
+                    connection.close()
+                raise
+            self.idle.append(connection)
+        return replies
+
+    async def lookup(self, key, tags):
+        commands = [("GET", REDIS_PREFIX + "response:" + key)]
+        if tags:
+            commands.append(("MGET", *(REDIS_PREFIX + "tag:" + tag for tag in tags)))
+        replies = await self._execute(*commands)
+        versions = [int(version or 0) for version in replies[1]] if tags else []
+        return replies[0], versions
+
+    async def store(self, key, value, ttl):
+        await self._execute(("SET", REDIS_PREFIX + "response:" + key, value, "PX", int(ttl * 1000)))
+
+    async def bump(self, tags, ttl):
+        commands = []
+        for tag in tags:
+            name = REDIS_PREFIX + "tag:" + tag
+            commands += [("INCR", name), ("PEXPIRE", name, int(ttl * 2 * 1000))]
+        if commands:
+            await self._execute(*commands)
+
+    async def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
+
+    def stats(self):
+        return {"server": f"{self.host}:{self.port}/{self.db}", "connections_opened": self.opened,
+                "idle_connections": len(self.idle)}
+
+
+# ==============================
+# Cache
+# ==============================
+
+def backend_from_env(setting=RESPONSE_CACHE):
+    if setting in ("", "off"):
+        return None
+    if setting == "memory":
+        return MemoryBackend()
+    if setting == "shm":
+        return SharedMemoryBackend()
+    if setting.startswith("redis://"):
+        return RedisBackend(setting)
+    raise ValueError(f"Unknown FOODPREP_RESPONSE_CACHE backend: {setting!r}")
+
+
+class ResponseCache:
+    """Tagged, versioned response bodies over a :class:`CacheBackend` (or none)."""
+
+    def __init__(self, backend=None, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.errors = 0
+
+    def _failed(self, action, error):
+        self.errors += 1
+        if self.errors == 1 or self.errors % 1000 == 0:
+            print(f"⚠️ Response cache {action} failed ({self.errors} so far): {type(error).__name__}: {error}")
+
+    async def get_or_load(self, key, tags, load):
+        """The cached body for ``key``, or ``await load()`` (bytes) cached under ``tags``."""
+        if self.backend is None:
+            return await load()
+        key = json.dumps(key, default=str, separators=(",", ":"))
+        tags = list(tags)
+        try:
+            value, versions = await self.backend.lookup(key, tags)
+        except Exception as e:
+            self._failed("lookup", e)
+            return await load()
+        if value is not None:
+            stored_versions, body = _unpack_entry(value)
+            if stored_versions == versions:
+                self.hits += 1
+                return body
+            self.stale += 1
+        else:
+            self.misses += 1
+
+        body = await load()
+        try:
+            # Stamped with the versions read before loading, so a write that
+            # landed meanwhile makes this entry stale at once
+            await self.backend.store(key, _pack_entry(versions, body), self.ttl)
+        except Exception as e:
+            self._failed("store", e)
+        return body
+
+    async def invalidate(self, *tags):
+        if self.backend is None or not tags:
+            return
+        try:
+            await self.backend.bump(sorted(set(tags)), self.ttl)
+        except Exception as e:
+            self._failed("invalidate", e)
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "backend": self.backend.name if self.backend else "off",
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            **(self.backend.stats() if self.backend else {}),
+        }
@@ -0,0 +1,100 @@
+"""Fast JSON encoding and negotiated compression for large responses.
+
+The default FastAPI path for an order list is ``serialize_order`` (a Python
+pass that rewrites every document), then ``jsonable_encoder`` (a second,
+recursive Python pass), then ``json.dumps``.  :func:`json_response` skips
+both passes: orjson encodes the raw Mongo documents directly, handling
+``datetime`` natively and ``ObjectId`` through a tiny ``default`` hook.
+Bodies over ``COMPRESS_MIN_BYTES`` are brotli- or gzip-compressed according
+to the client's ``Accept-Encoding``; from ``THREADPOOL_COMPRESS_BYTES`` up
+that happens in the threadpool, so a large page does not stall the event
+loop for every other request.
+
+The fast path is opt-in with ``FOODPREP_FAST_JSON=1`` and needs the
+``orjson`` package; brotli is used only when the ``brotli`` package is
+installed.  Without them the same functions fall back to the standard
+library, so responses keep the same shape either way.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FAST_JSON = os.getenv("FOODPREP_FAST_JSON", "0") == "1" and orjson is not None
+
+# Smaller bodies are not worth the CPU or the extra header
+COMPRESS_MIN_BYTES = 1024
+# Larger bodies take long enough to compress to hand to a worker thread
+THREADPOOL_COMPRESS_BYTES = 64 * 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Encode ``payload`` to UTF-8 JSON bytes, raw Mongo types included."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def accepts_encoding(request, encoding):
+    accept = request.headers.get("accept-encoding", "")
+    return any(part.split(";")[0].strip() == encoding for part in accept.split(","))
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def compress_for(request, body):
+    """Return ``(body, content_encoding)`` for what the client accepts."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if brotli is not None and accepts_encoding(request, "br"):
+        encoding = "br"
+    elif accepts_encoding(request, "gzip"):
+        encoding = "gzip"
+    else:
+        return body, None
+    if len(body) >= THREADPOOL_COMPRESS_BYTES:
+        return await run_in_threadpool(_compress, body, encoding), encoding
+    return _compress(body, encoding), encoding
+
+
+async def json_response(request, payload, status_code=200):
+    """Encode and, where worthwhile, compress ``payload`` into a ready Response."""
+    return await body_response(request, dumps(payload), status_code)
+
+
+async def body_response(request, body, status_code=200):
+    """Response for an already encoded JSON ``body``, compressed where worthwhile."""
+    body, encoding = await compress_for(request, body)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
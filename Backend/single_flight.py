@@ -0,0 +1,96 @@
+"""Single-flight coalescing of identical concurrent reads.
+
+When many clients poll the same popular order, or dashboards refresh
+together, each request would otherwise run its own identical MongoDB
+query.  :meth:`SingleFlight.do` runs the first request's call for a key
+and hands every request that arrives while it is in flight the same
+result.  Routes coalesce on the encoded response body, so the JSON is
+built once too.
+
+With ``FOODPREP_COALESCE_TTL_MS`` above zero, a finished result is also
+reused for that many milliseconds.  The default of 0 shares only
+in-flight calls, so no result is ever older than the request that
+received it.  Writes call :meth:`SingleFlight.invalidate` for the keys
+they affect.  Later requests then start a fresh call instead of joining
+one that began before the write, and nothing from before the write is
+kept as a micro-TTL result.  Errors (such as a 404) are shared with the
+requests that were waiting but never kept.
+
+Keys are tuples such as ``("track_order", order_id)``;
+``invalidate(("orders_by_status", "confirmed"))`` drops every key that
+starts with that prefix.  State lives on one event loop, so no locks.
+"""
+
+import asyncio
+import os
+import time
+from functools import partial
+
+COALESCE_TTL = float(os.getenv("FOODPREP_COALESCE_TTL_MS", "0")) / 1000
+# Expired micro-TTL results are swept once this many are held
+MAX_RESULTS = 4096
+
+
+class SingleFlight:
+    def __init__(self, ttl=COALESCE_TTL, max_results=MAX_RESULTS):
+        self.ttl = ttl
+        self.max_results = max_results
+        self.flights = {}  # key -> task running the shared call
+        self.results = {}  # key -> (monotonic expiry, value)
+        self.calls = 0
+        self.shared = 0
+        self.reused = 0
+        self.invalidations = 0
+
+    async def do(self, key, fn):
+        """``await fn()``, unless an identical call is in flight or freshly done."""
+        cached = self.results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.reused += 1
+                return cached[1]
+            del self.results[key]
+
+        task = self.flights.get(key)
+        if task is None:
+            self.calls += 1
+            # A task of its own, so a caller that disconnects does not cancel the others
+            task = asyncio.ensure_future(fn())
+            self.flights[key] = task
+            task.add_done_callback(partial(self._landed, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _landed(self, key, task):
+        failed = task.cancelled() or task.exception() is not None
+        if self.flights.get(key) is not task:
+            # Invalidated while in flight: the result may predate a write
+            return
+        del self.flights[key]
+        if self.ttl > 0 and not failed:
+            if len(self.results) >= self.max_results:
+                now = time.monotonic()
+                self.results = {k: v for k, v in self.results.items() if v[0] > now}
+            self.results[key] = (time.monotonic() + self.ttl, task.result())
+
+    def invalidate(self, *prefixes):
+        """Forget in-flight calls and kept results for every key starting with a prefix."""
+        self.invalidations += 1
+        for store in (self.flights, self.results):
+            stale = [key for key in store if any(key[:len(prefix)] == prefix for prefix in prefixes)]
+            for key in stale:
+                del store[key]
+
+    def stats(self):
+        requests = self.calls + self.shared + self.reused
+        return {
+            "ttl_ms": self.ttl * 1000,
+            "in_flight": len(self.flights),
+            "kept_results": len(self.results),
+            "database_calls": self.calls,
+            "shared_in_flight": self.shared,
+            "reused_results": self.reused,
+            "invalidations": self.invalidations,
+            "coalesced_ratio": round((self.shared + self.reused) / requests, 4) if requests else None,
+        }
@@ -0,0 +1,231 @@
+"""Slow-query log with one explain plan captured per query shape.
+
+:class:`SlowQueryLog` is a PyMongo command listener.  Any ``find``,
+``aggregate`` or ``count`` that takes longer than ``FOODPREP_SLOW_QUERY_MS``
+(default 100; a negative value turns the log off) is recorded with:
+
+* its *shape*: the command with every literal value replaced by ``"?"``,
+  so entries group by query form and customer data never reaches the log;
+* its duration and the number of documents it returned.
+
+The first time a shape is slow, a background task re-runs the command
+with ``explain`` (``executionStats``).  It keeps only a summary: plan
+stages, indexes used, and keys/documents examined vs returned.  A shape
+whose plan is a ``COLLSCAN`` is printed as a warning, so a missing index
+announces itself.  ``/admin/slow_queries`` serves the log.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from pymongo.monitoring import CommandListener
+
+from indexes import plan_stages
+
+SLOW_QUERY_MS = float(os.getenv("FOODPREP_SLOW_QUERY_MS", "100"))
+LOG_SIZE = 500
+# Seconds between runs of the explain worker
+EXPLAIN_INTERVAL = 1.0
+
+LOGGED_COMMANDS = {"find", "aggregate", "count"}
+# Fields the driver adds to every command; not part of the query
+DRIVER_FIELDS = {
+    "lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "readConcern",
+    "writeConcern", "apiVersion", "apiStrict", "apiDeprecationErrors", "startTransaction",
+    "autocommit", "cursor", "batchSize", "singleBatch", "comment", "maxTimeMS",
+}
+
+
+def redact(value):
+    """Replace every literal in a filter with "?" while keeping field names and operators."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [redact(item) for item in value]
+        # ["?", "?", "?"] and ["?"] are the same shape
+        return items[:1] if all(item == "?" for item in items) else items
+    return "?"
+
+
+def query_shape(command_name, command):
+    collection = command.get(command_name)
+    if command_name == "find":
+        shape = {"find": collection, "filter": redact(command.get("filter", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        if command.get("limit"):
+            shape["limit"] = "?"
+    elif command_name == "count":
+        shape = {"count": collection, "query": redact(command.get("query", {}))}
+    else:
+        shape = {
+            "aggregate": collection,
+            # Only $match carries request values; other stages describe the computation
+            "pipeline": [
+                {name: redact(body) if name == "$match" else body for name, body in stage.items()}
+                for stage in command.get("pipeline", [])
+            ],
+        }
+    return shape
+
+
+def docs_returned(command_name, reply):
+    if command_name == "count":
+        return reply.get("n")
+    cursor = reply.get("cursor") or {}
+    return len(cursor.get("firstBatch", []))
+
+
+def summarize_explain(result):
+    """The parts of an explain result worth keeping; never includes the parsed query."""
+    planner = result.get("queryPlanner")
+    stats = result.get("executionStats")
+    if planner is None and result.get("stages"):
+        # Aggregations report the initial query under the first stage's $cursor
+        cursor = result["stages"][0].get("$cursor", {})
+        planner = cursor.get("queryPlanner")
+        stats = cursor.get("executionStats")
+    planner = planner or {}
+    stats = stats or {}
+    winning = planner.get("winningPlan", {})
+    stages = list(plan_stages(winning))
+    return {
+        "stages": stages,
+        "indexes": sorted(set(_plan_indexes(winning))),
+        "collscan": "COLLSCAN" in stages,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "docs_returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def _plan_indexes(plan):
+    if not isinstance(plan, dict):
+        return
+    if plan.get("indexName"):
+        yield plan["indexName"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_indexes(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_indexes(child)
+
+
+class SlowQueryLog(CommandListener):
+    """Records slow reads and explains each new slow shape once."""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, size=LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self.lock = threading.Lock()
+        self.entries = deque(maxlen=size)
+        self.shapes = {}
+        self.started_commands = {}
+        self.to_explain = deque()
+        self.task = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms >= 0
+
+    # ---- command listener ----------------------------------------------
+
+    def started(self, event):
+        if self.enabled and event.command_name in LOGGED_COMMANDS:
+            with self.lock:
+                self.started_commands[(event.request_id, event.connection_id)] = event.command
+
+    def succeeded(self, event):
+        if event.command_name not in LOGGED_COMMANDS:
+            return
+        with self.lock:
+            command = self.started_commands.pop((event.request_id, event.connection_id), None)
+        duration_ms = event.duration_micros / 1000
+        if command is None or duration_ms < self.threshold_ms:
+            return
+        self._record(event.command_name, command, duration_ms, docs_returned(event.command_name, event.reply))
+
+    def failed(self, event):
+        with self.lock:
+            self.started_commands.pop((event.request_id, event.connection_id), None)
+
+    def _record(self, command_name, command, duration_ms, returned):
+        shape = query_shape(command_name, command)
+        key = json.dumps(shape, sort_keys=True, default=str)
+        now = datetime.now().isoformat()
+        with self.lock:
+            summary = self.shapes.get(key)
+            first = summary is None
+            if first:
+                summary = self.shapes[key] = {
+                    "shape": shape, "command": command_name, "collection": command.get(command_name),
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "first_at": now, "plan": None,
+                }
+                explained = {k: v for k, v in command.items() if k not in DRIVER_FIELDS}
+                if command_name == "aggregate":
+                    explained["cursor"] = {}
+                self.to_explain.append((key, explained))
+            summary["count"] += 1
+            summary["total_ms"] += duration_ms
+            summary["max_ms"] = max(summary["max_ms"], duration_ms)
+            summary["last_at"] = now
+            self.entries.append({
+                "at": now, "command": command_name, "collection": summary["collection"],
+                "duration_ms": round(duration_ms, 3), "docs_returned": returned, "shape_key": key,
+            })
+        if first:
+            print(f"🐢 Slow {command_name} on {summary['collection']} ({duration_ms:.1f} ms): {key}")
+
+    # ---- explain worker ------------------------------------------------
+
+    async def _explain_loop(self, storage):
+        while True:
+            await asyncio.sleep(EXPLAIN_INTERVAL)
+            while self.to_explain:
+                key, command = self.to_explain.popleft()
+                try:
+                    result = await storage.command({"explain": command, "verbosity": "executionStats"})
+                    plan = summarize_explain(result)
+                except Exception as e:
+                    plan = {"error": f"{type(e).__name__}: {e}"[:200]}
+                with self.lock:
+                    self.shapes[key]["plan"] = plan
+                if plan.get("collscan"):
+                    print(f"⚠️ Slow query shape scans the whole collection "
+                          f"({plan['docs_examined']} docs examined for {plan['docs_returned']} returned): {key}")
+
+    def start(self, storage):
+        if self.enabled:
+            self.task = asyncio.get_running_loop().create_task(self._explain_loop(storage))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    # ---- queries -------------------------------------------------------
+
+    def report(self, collection=None, command=None, min_ms=0.0, limit=100):
+        """Slow shapes (worst total time first) and the latest matching entries."""
+        def matches(item):
+            return ((collection is None or item["collection"] == collection)
+                    and (command is None or item["command"] == command))
+
+        with self.lock:
+            shapes = [
+                {**summary, "key": key, "total_ms": round(summary["total_ms"], 3),
+                 "avg_ms": round(summary["total_ms"] / summary["count"], 3),
+                 "max_ms": round(summary["max_ms"], 3)}
+                for key, summary in self.shapes.items()
+                if matches(summary) and summary["max_ms"] >= min_ms
+            ]
+            entries = [
+                entry for entry in reversed(self.entries)
+                if matches(entry) and entry["duration_ms"] >= min_ms
+            ][:limit]
+        shapes.sort(key=lambda summary: summary["total_ms"], reverse=True)
+        return {"threshold_ms": self.threshold_ms, "shapes": shapes[:limit], "entries": entries}
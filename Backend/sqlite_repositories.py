@@ -0,0 +1,512 @@
+"""SQLite implementation of the repositories, for single-node deployments and tests.
+
+The database runs in WAL mode, so readers never wait for the writer.  Each
+threadpool thread that reads gets its own connection.  All writes share a
+single connection and a lock, and each write is one ``BEGIN IMMEDIATE``
+transaction; ``add_many`` inserts a whole batch with one ``executemany``
+in one transaction.  Statements are fixed strings with ``?`` parameters,
+so ``sqlite3``'s per-connection statement cache keeps them prepared.
+
+Every row keeps the full document as MongoDB Extended JSON in ``doc``.
+The fields that are filtered or sorted on are also copied into indexed
+columns that mirror the Mongo indexes in ``indexes.py``.  Use a file path,
+not ``:memory:``, because the reader and writer connections must see the
+same database.
+
+Running totals for ``/order_analytics`` are not kept here: with the orders
+in an indexed local table, :func:`read_order_analytics` aggregates them on
+each (cached) read instead.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from bson import json_util
+from starlette.concurrency import run_in_threadpool
+
+from repositories import (
+    DUPLICATE, RECENT_HISTORY, DuplicateError, FoodRepository, OrderEventRepository, OrderRepository,
+    UserRepository, VersionRepository,
+)
+
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+# SQLite's default limit on host parameters is 999 in older builds
+IN_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    userid TEXT NOT NULL UNIQUE,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    status TEXT NOT NULL,
+    order_date TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_user_date ON orders (user_email, order_date DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS orders_status_date ON orders (status, order_date DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS orders_date ON orders (order_date DESC);
+CREATE TABLE IF NOT EXISTS order_events (
+    order_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    PRIMARY KEY (order_id, timestamp, status)
+);
+CREATE TABLE IF NOT EXISTS food_items (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    image_filename TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS food_items_id ON food_items (id);
+CREATE INDEX IF NOT EXISTS food_items_image ON food_items (image_filename);
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+ORDER_BY = " ORDER BY order_date DESC, order_id DESC"
+
+
+def encode(document):
+    return json_util.dumps({key: value for key, value in document.items() if key != "_id"})
+
+
+def decode(text):
+    return json_util.loads(text)
+
+
+def placeholders(values):
+    return ",".join("?" * len(values))
+
+
+def chunks(values, size=IN_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class SqliteStore:
+    """Connections to one SQLite file: a locked writer plus a reader per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.writer = None
+        self.pid = None
+
+    def _open(self):
+        connection = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # transactions are explicit
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL survives application crashes; only an OS crash can lose the last commits
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connections_lock:
+            self.connections.append(connection)
+        return connection
+
+    def connect(self):
+        """Open the writer in the current process; a forked child never reuses the parent's connections."""
+        with self.write_lock:
+            if self.pid != os.getpid():
+                self.connections = []
+                self.local = threading.local()
+                self.writer = None
+                self.pid = os.getpid()
+            if self.writer is None:
+                self.writer = self._open()
+                self.writer.executescript(SCHEMA)
+
+    def _reader(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self._open()
+        return connection
+
+    def _read_sync(self, fn, args):
+        self.connect()
+        return fn(self._reader(), *args)
+
+    def _write_sync(self, fn, args):
+        self.connect()
+        with self.write_lock:
+            self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.writer, *args)
+            except BaseException:
+                self.writer.execute("ROLLBACK")
+                raise
+            self.writer.execute("COMMIT")
+            return result
+
+    async def read(self, fn, *args):
+        return await run_in_threadpool(self._read_sync, fn, args)
+
+    async def write(self, fn, *args):
+        return await run_in_threadpool(self._write_sync, fn, args)
+
+    async def ping(self):
+        await self.read(lambda db: db.execute("SELECT 1").fetchone())
+
+    def close(self):
+        with self.connections_lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
+        self.writer = None
+        self.local = threading.local()
+
+
+class SqliteUserRepository(UserRepository):
+    def __init__(self, store):
+        self.store = store
+
+    async def count(self):
+        return await self.store.read(lambda db: db.execute("SELECT COUNT(*) FROM users").fetchone()[0])
+
+    @staticmethod
+    def _one(db, column, value):
+        row = db.execute(f"SELECT doc FROM users WHERE {column} = ?", (value,)).fetchone()
+        return decode(row[0]) if row else None
+
+    async def get_by_email(self, email):
+        return await self.store.read(self._one, "email", email)
+
+    async def get_by_userid(self, userid):
+        return await self.store.read(self._one, "userid", userid)
+
+    async def exists(self, email):
+        def query(db):
+            return db.execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone() is not None
+        return await self.store.read(query)
+
+    async def known_emails(self, emails):
+        def query(db, emails):
+            found = set()
+            for chunk in chunks(emails):
+                sql = f"SELECT email FROM users WHERE email IN ({placeholders(chunk)})"
+                found.update(row[0] for row in db.execute(sql, chunk))
+            return found
+        return await self.store.read(query, list(emails))
+
+    @staticmethod
+    def _insert(db, users):
+        try:
+            db.executemany(
+                "INSERT INTO users (email, userid, doc) VALUES (?, ?, ?)",
+                [(user["email"], user["userid"], encode(user)) for user in users],
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateError(str(e))
+
+    async def add(self, user):
+        await self.store.write(self._insert, [user])
+
+    async def add_many(self, users):
+        await self.store.write(self._insert, list(users))
+
+    async def set_password_hash(self, email, password_hash):
+        def update(db):
+            row = db.execute("SELECT doc FROM users WHERE email = ?", (email,)).fetchone()
+            if not row:
+                return
+            user = decode(row[0])
+            user.pop("password", None)
+            user["password_hash"] = password_hash
+            db.execute("UPDATE users SET doc = ? WHERE email = ?", (encode(user), email))
+        await self.store.write(update)
+
+
+class SqliteOrderRepository(OrderRepository):
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, order_id, fields=None):
+        def query(db):
+            row = db.execute("SELECT doc FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+            if not row:
+                return None
+            order = decode(row[0])
+            if fields:
+                order = {field: order[field] for field in fields if field in order}
+            return order
+        return await self.store.read(query)
+
+    async def get_many(self, order_ids):
+        def query(db, order_ids):
+            orders = []
+            for chunk in chunks(order_ids):
+                sql = f"SELECT doc FROM orders WHERE order_id IN ({placeholders(chunk)})"
+                orders.extend(decode(row[0]) for row in db.execute(sql, chunk))
+            return orders
+        return await self.store.read(query, list(order_ids))
+
+    async def latest_for_user(self, email):
+        def query(db):
+            row = db.execute(
+                "SELECT doc FROM orders WHERE user_email = ?" + ORDER_BY + " LIMIT 1", (email,)
+            ).fetchone()
+            return decode(row[0]) if row else None
+        return await self.store.read(query)
+
+    async def list(self, user_email=None, status=None, placed_after=None, before=None, limit=None):
+        conditions, params = [], []
+        if user_email is not None:
+            conditions.append("user_email = ?")
+            params.append(user_email)
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if placed_after is not None:
+            conditions.append("order_date > ?")
+            params.append(placed_after)
+        if before is not None:
+            conditions.append("(order_date < ? OR (order_date = ? AND order_id < ?))")
+            params += [before[0], before[0], before[1]]
+        sql = "SELECT doc FROM orders"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += ORDER_BY
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return await self.store.read(lambda db: [decode(row[0]) for row in db.execute(sql, params)])
+
+    async def iter_batches(self, batch_size, user_email=None, status=None, placed_after=None, before=None,
+                           limit=None):
+        # One keyset read per batch, so no read transaction stays open between them
+        remaining = limit or float("inf")
+        while remaining > 0:
+            size = int(min(batch_size, remaining))
+            batch = await self.list(user_email, status, placed_after, before, size)
+            if batch:
+                yield batch
+            if len(batch) < size:
+                return
+            before = (batch[-1]["orderDate"], batch[-1]["orderId"])
+            remaining -= len(batch)
+
+    @staticmethod
+    def _row(order):
+        return (order["orderId"], order["userEmail"], order["status"], order["orderDate"], encode(order))
+
+    async def add(self, order):
+        def insert(db):
+            try:
+                db.execute(
+                    "INSERT INTO orders (order_id, user_email, status, order_date, doc) VALUES (?, ?, ?, ?, ?)",
+                    self._row(order),
+                )
+            except sqlite3.IntegrityError as e:
+                raise DuplicateError(str(e))
+        await self.store.write(insert)
+
+    async def add_many(self, orders):
+        def insert(db, orders):
+            existing = set()
+            ids = [order["orderId"] for order in orders]
+            for chunk in chunks(ids):
+                sql = f"SELECT order_id FROM orders WHERE order_id IN ({placeholders(chunk)})"
+                existing.update(row[0] for row in db.execute(sql, chunk))
+            errors, rows = {}, []
+            for index, order in enumerate(orders):
+                if order["orderId"] in existing:
+                    errors[index] = (DUPLICATE, "Order already exists")
+                else:
+                    existing.add(order["orderId"])
+                    rows.append(self._row(order))
+            db.executemany(
+                "INSERT INTO orders (order_id, user_email, status, order_date, doc) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            return errors
+        if not orders:
+            return {}
+        return await self.store.write(insert, list(orders))
+
+    @staticmethod
+    def _apply(db, row, changes, history_entry):
+        before = decode(row[0])
+        after = {**before, **changes}
+        after["statusHistory"] = (list(before.get("statusHistory", [])) + [history_entry])[-RECENT_HISTORY:]
+        db.execute(
+            "UPDATE orders SET status = ?, doc = ? WHERE order_id = ?",
+            (after["status"], encode(after), before["orderId"]),
+        )
+        return before
+
+    async def transition(self, order_id, allowed_previous, changes, history_entry):
+        def update(db, allowed_previous):
+            row = db.execute(
+                f"SELECT doc FROM orders WHERE order_id = ? AND status IN ({placeholders(allowed_previous)})",
+                [order_id, *allowed_previous],
+            ).fetchone()
+            return self._apply(db, row, changes, history_entry) if row else None
+        if not allowed_previous:
+            return None
+        return await self.store.write(update, list(allowed_previous))
+
+    async def transition_many(self, orders, changes, history_entry):
+        def update(db, orders):
+            moved = []
+            for order in orders:
+                row = db.execute(
+                    "SELECT doc FROM orders WHERE order_id = ? AND status = ?", (order["orderId"], order["status"])
+                ).fetchone()
+                if row:
+                    moved.append(self._apply(db, row, changes, history_entry))
+            return moved
+        if not orders:
+            return []
+        return await self.store.write(update, list(orders))
+
+
+class SqliteOrderEventRepository(OrderEventRepository):
+    def __init__(self, store):
+        self.store = store
+
+    async def add_many(self, events):
+        def insert(db, events):
+            db.executemany(
+                "INSERT OR IGNORE INTO order_events (order_id, timestamp, status, doc) VALUES (?, ?, ?, ?)",
+                [(event["orderId"], event["timestamp"], event["status"], encode(event)) for event in events],
+            )
+        if events:
+            await self.store.write(insert, list(events))
+
+    async def list(self, order_id, after=None, limit=None):
+        def query(db):
+            sql, params = "SELECT doc FROM order_events WHERE order_id = ?", [order_id]
+            if after is not None:
+                sql += " AND (timestamp > ? OR (timestamp = ? AND status > ?))"
+                params += [after[0], after[0], after[1]]
+            sql += " ORDER BY timestamp, status"
+            if limit:
+                sql += " LIMIT ?"
+                params.append(limit)
+            return [decode(row[0]) for row in db.execute(sql, params)]
+        return await self.store.read(query)
+
+
+class SqliteFoodRepository(FoodRepository):
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, item_id):
+        def query(db):
+            row = db.execute("SELECT doc FROM food_items WHERE id = ? ORDER BY seq LIMIT 1", (item_id,)).fetchone()
+            return decode(row[0]) if row else None
+        return await self.store.read(query)
+
+    async def list(self):
+        return await self.store.read(
+            lambda db: [decode(row[0]) for row in db.execute("SELECT doc FROM food_items ORDER BY seq")]
+        )
+
+    async def add(self, item):
+        await self.store.write(lambda db: db.execute(
+            "INSERT INTO food_items (id, image_filename, doc) VALUES (?, ?, ?)",
+            (item["id"], item.get("image_filename"), encode(item)),
+        ))
+
+    async def delete(self, item_id):
+        def remove(db):
+            # Like delete_one: only the first item with this id
+            cursor = db.execute(
+                "DELETE FROM food_items WHERE seq = (SELECT seq FROM food_items WHERE id = ? ORDER BY seq LIMIT 1)",
+                (item_id,),
+            )
+            return cursor.rowcount > 0
+        return await self.store.write(remove)
+
+    async def image_in_use(self, image_filename):
+        def query(db):
+            return db.execute(
+                "SELECT 1 FROM food_items WHERE image_filename = ? LIMIT 1", (image_filename,)
+            ).fetchone() is not None
+        return await self.store.read(query)
+
+    async def image_variants(self, image_filename):
+        def query(db):
+            for (doc,) in db.execute("SELECT doc FROM food_items WHERE image_filename = ?", (image_filename,)):
+                item = decode(doc)
+                if "image_variants" in item:
+                    return item["image_variants"]
+            return None
+        return await self.store.read(query)
+
+    async def set_image_variants(self, image_filename, variants):
+        def update(db):
+            rows = db.execute("SELECT seq, doc FROM food_items WHERE image_filename = ?", (image_filename,)).fetchall()
+            db.executemany(
+                "UPDATE food_items SET doc = ? WHERE seq = ?",
+                [(encode({**decode(doc), "image_variants": variants}), seq) for seq, doc in rows],
+            )
+        await self.store.write(update)
+
+    async def images_without_variants(self):
+        def query(db):
+            return {
+                filename
+                for filename, doc in db.execute(
+                    "SELECT image_filename, doc FROM food_items WHERE image_filename IS NOT NULL"
+                )
+                if "image_variants" not in decode(doc)
+            }
+        return await self.store.read(query)
+
+
+class SqliteVersionRepository(VersionRepository):
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, name):
+        def query(db):
+            row = db.execute("SELECT version FROM cache_versions WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else 0
+        return await self.store.read(query)
+
+    async def bump(self, name):
+        await self.store.write(lambda db: db.execute(
+            "INSERT INTO cache_versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET version = version + 1",
+            (name,),
+        ))
+
+
+async def read_order_analytics(store):
+    """The /order_analytics payload, aggregated from the orders table."""
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def query(db):
+        by_status = db.execute(
+            "SELECT status, COUNT(*), COALESCE(SUM(json_extract(doc, '$.total')), 0) FROM orders GROUP BY status"
+        ).fetchall()
+        today_orders = db.execute(
+            "SELECT COUNT(*) FROM orders WHERE order_date >= ? AND order_date < ?", (today, today + "~")
+        ).fetchone()[0]
+        return by_status, today_orders
+
+    by_status, today_orders = await store.read(query)
+    return {
+        "total_orders": sum(count for _, count, _ in by_status),
+        "today_orders": today_orders,
+        "status_breakdown": [
+            {"_id": status, "count": count, "total_amount": round(amount, 2)} for status, count, amount in by_status
+        ],
+    }
@@ -0,0 +1,317 @@
+"""Awaitable MongoDB access for Server.py.
+
+Routes never touch a driver directly; they go through :class:`Collection`,
+which exposes the same coroutine API whether it is backed by PyMongo's
+native asyncio client or by the classic blocking ``MongoClient``.  In sync
+mode each call is handed to Starlette's threadpool so a slow query never
+stalls the event loop.
+
+Creating a :class:`Storage` opens nothing.  The client is built by
+``connect()`` (called from the app's lifespan, i.e. inside each worker after
+any fork) or lazily on first use, so importing Server.py never holds a
+socket that a pre-fork server could share between processes.  Pool sizing
+comes from ``pool_options_from_env`` and live pool counters from
+:class:`PoolStats`.
+"""
+
+import os
+import threading
+
+from pymongo import MongoClient, AsyncMongoClient
+from pymongo.monitoring import ConnectionPoolListener
+from starlette.concurrency import run_in_threadpool
+
+DRIVER_ASYNC = "async"
+DRIVER_SYNC = "sync"
+DRIVERS = (DRIVER_ASYNC, DRIVER_SYNC)
+
+# Documents pulled per round trip when iterating a cursor in sync mode
+SYNC_BATCH_SIZE = 100
+
+# Client option -> (environment variable, default); unset defaults are left to the driver
+POOL_OPTIONS = {
+    "maxPoolSize": ("FOODPREP_MONGO_MAX_POOL_SIZE", 100),
+    "minPoolSize": ("FOODPREP_MONGO_MIN_POOL_SIZE", 0),
+    "maxIdleTimeMS": ("FOODPREP_MONGO_MAX_IDLE_TIME_MS", None),
+    "waitQueueTimeoutMS": ("FOODPREP_MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+    "serverSelectionTimeoutMS": ("FOODPREP_MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+}
+
+
+def pool_options_from_env():
+    """Client pool options from the environment, as keyword arguments."""
+    options = {}
+    for option, (variable, default) in POOL_OPTIONS.items():
+        value = os.getenv(variable)
+        if value is not None and value != "":
+            options[option] = int(value)
+        elif default is not None:
+            options[option] = default
+    return options
+
+
+class PoolStats(ConnectionPoolListener):
+    """Per-server connection pool counters fed by PyMongo's pool events."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.servers = {}
+
+    def _server(self, address):
+        key = f"{address[0]}:{address[1]}"
+        if key not in self.servers:
+            self.servers[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "created": 0,
+                "closed": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "checkout_wait_total_ms": 0.0,
+                "checkout_wait_max_ms": 0.0,
+                "cleared": 0,
+            }
+        return self.servers[key]
+
+    def _update(self, address, **changes):
+        with self.lock:
+            server = self._server(address)
+            for field, delta in changes.items():
+                server[field] += delta
+
+    def pool_created(self, event):
+        with self.lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        # ``duration`` (seconds) is reported by PyMongo 4.7+
+        wait_ms = (getattr(event, "duration", None) or 0) * 1000
+        with self.lock:
+            server = self._server(event.address)
+            server["checked_out"] += 1
+            server["checkouts"] += 1
+            server["checkout_wait_total_ms"] += wait_ms
+            server["checkout_wait_max_ms"] = max(server["checkout_wait_max_ms"], wait_ms)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def snapshot(self):
+        with self.lock:
+            servers = {}
+            for address, counters in self.servers.items():
+                server = dict(counters)
+                checkouts = server["checkouts"]
+                server["checkout_wait_avg_ms"] = (
+                    round(server["checkout_wait_total_ms"] / checkouts, 3) if checkouts else 0.0
+                )
+                server["checkout_wait_total_ms"] = round(server["checkout_wait_total_ms"], 3)
+                server["checkout_wait_max_ms"] = round(server["checkout_wait_max_ms"], 3)
+                servers[address] = server
+            return servers
+
+
+class Collection:
+    """Coroutine facade over a pymongo or async-pymongo collection."""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+    @property
+    def is_async(self):
+        return self.storage.is_async
+
+    @property
+    def raw(self):
+        return self.storage.db[self.name]
+
+    async def _call(self, method, *args, **kwargs):
+        fn = getattr(self.raw, method)
+        if self.is_async:
+            return await fn(*args, **kwargs)
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+    def _cursor(self, filter, projection=None, sort=None, limit=0, skip=0):
+        cursor = self.raw.find(filter, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    async def find_one(self, filter, projection=None, **kwargs):
+        return await self._call("find_one", filter, projection, **kwargs)
+
+    async def find(self, filter, projection=None, sort=None, limit=0, skip=0):
+        """Run a query and return every matching document as a list."""
+        if self.is_async:
+            cursor = self._cursor(filter, projection, sort, limit, skip)
+            return await cursor.to_list(None)
+        return await run_in_threadpool(
+            lambda: list(self._cursor(filter, projection, sort, limit, skip))
+        )
+
+    async def iter_batches(self, filter, projection=None, sort=None, limit=0,
+                           batch_size=SYNC_BATCH_SIZE):
+        """Yield lists of documents as the server cursor produces them."""
+        cursor = self._cursor(filter, projection, sort, limit).batch_size(batch_size)
+        if self.is_async:
+            try:
+                batch = []
+                async for doc in cursor:
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+            finally:
+                await cursor.close()
+            return
+
+        def next_batch():
+            return [doc for _, doc in zip(range(batch_size), cursor)]
+
+        try:
+            while True:
+                batch = await run_in_threadpool(next_batch)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            cursor.close()
+
+    async def aggregate(self, pipeline, **kwargs):
+        """Run an aggregation pipeline and return the results as a list."""
+        if self.is_async:
+            cursor = await self.raw.aggregate(pipeline, **kwargs)
+            return await cursor.to_list(None)
+        return await run_in_threadpool(lambda: list(self.raw.aggregate(pipeline, **kwargs)))
+
+    async def count_documents(self, filter, **kwargs):
+        return await self._call("count_documents", filter, **kwargs)
+
+    async def insert_one(self, document, **kwargs):
+        return await self._call("insert_one", document, **kwargs)
+
+    async def insert_many(self, documents, **kwargs):
+        return await self._call("insert_many", documents, **kwargs)
+
+    async def update_one(self, filter, update, **kwargs):
+        return await self._call("update_one", filter, update, **kwargs)
+
+    async def replace_one(self, filter, replacement, **kwargs):
+        return await self._call("replace_one", filter, replacement, **kwargs)
+
+    async def update_many(self, filter, update, **kwargs):
+        return await self._call("update_many", filter, update, **kwargs)
+
+    async def find_one_and_update(self, filter, update, **kwargs):
+        return await self._call("find_one_and_update", filter, update, **kwargs)
+
+    async def delete_one(self, filter, **kwargs):
+        return await self._call("delete_one", filter, **kwargs)
+
+    async def bulk_write(self, requests, **kwargs):
+        return await self._call("bulk_write", requests, **kwargs)
+
+    async def create_indexes(self, indexes, **kwargs):
+        return await self._call("create_indexes", indexes, **kwargs)
+
+
+class Storage:
+    """Owns the Mongo client and hands out :class:`Collection` wrappers."""
+
+    def __init__(self, uri, db_name, driver=DRIVER_ASYNC, listeners=(), **client_options):
+        if driver not in DRIVERS:
+            raise ValueError(f"Unknown database driver '{driver}'. Use one of: {', '.join(DRIVERS)}")
+        self.uri = uri
+        self.db_name = db_name
+        self.driver = driver
+        self.is_async = driver == DRIVER_ASYNC
+        self.client_options = client_options
+        # Extra PyMongo event listeners (command/pool monitoring) for every client built
+        self.listeners = list(listeners)
+        self.pool_stats = PoolStats()
+        self.client = None
+        self.pid = None
+
+    def connect(self):
+        """Build the client in the current process; a forked child gets its own."""
+        if self.client is not None and self.pid == os.getpid():
+            return
+        client_cls = AsyncMongoClient if self.is_async else MongoClient
+        self.pool_stats = PoolStats()
+        self.client = client_cls(
+            self.uri,
+            event_listeners=[self.pool_stats, *self.listeners],
+            **self.client_options,
+        )
+        self.pid = os.getpid()
+
+    @property
+    def db(self):
+        if self.client is None or self.pid != os.getpid():
+            self.connect()
+        return self.client[self.db_name]
+
+    def collection(self, name):
+        return Collection(self, name)
+
+    async def ping(self):
+        """Round-trip to the server; raises if it cannot be reached."""
+        if self.is_async:
+            return await self.db.client.admin.command("ping")
+        return await run_in_threadpool(self.db.client.admin.command, "ping")
+
+    async def command(self, command, **kwargs):
+        """Run a database command such as ``explain`` against the app database."""
+        if self.is_async:
+            return await self.db.command(command, **kwargs)
+        return await run_in_threadpool(self.db.command, command, **kwargs)
+
+    def stats(self):
+        """Pool configuration and live counters for this process."""
+        return {
+            "pid": os.getpid(),
+            "driver": self.driver,
+            "connected": self.client is not None and self.pid == os.getpid(),
+            "options": self.client_options,
+            "servers": self.pool_stats.snapshot(),
+        }
+
+    async def close(self):
+        if self.client is None:
+            return
+        client, self.client = self.client, None
+        if self.is_async:
+            await client.close()
+        else:
+            client.close()
@@ -0,0 +1,100 @@
+"""Bounded LRU + TTL cache of emails known to belong to registered users.
+
+``place_order`` only needs to know that the customer exists.  Routes
+that already know a user exists (``register_user``, ``login_user``)
+record the email with :meth:`KnownUsers.remember`.  Checkouts then ask
+:meth:`KnownUsers.exists`.  A hit costs no MongoDB round trip.  A miss
+uses ``UserRepository.exists``, an email-only lookup answered from the
+``email_unique`` index, and caches the email if it was found.
+
+Only positive answers are cached, so a user registered through another
+worker is found on the next miss.  Users are never deleted, and
+``FOODPREP_USER_CACHE_TTL`` (default 300 seconds) bounds how long a
+removed one could still be accepted.  ``FOODPREP_USER_CACHE_SIZE``
+(default 50000 emails, roughly 10 MB) bounds memory.  Hit and miss counts
+are exported on /metrics and served by ``/admin/user_cache``.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import registry, Counter
+
+USER_CACHE_TTL = float(os.getenv("FOODPREP_USER_CACHE_TTL", "300"))
+USER_CACHE_SIZE = int(os.getenv("FOODPREP_USER_CACHE_SIZE", "50000"))
+
+LOOKUPS = registry.register(Counter(
+    "foodprep_user_cache_lookups_total", "Known-user cache lookups by result (hit or miss)", ["result"]))
+
+
+class KnownUsers:
+    """Emails of registered users, least recently used evicted first."""
+
+    def __init__(self, user_repo, ttl=USER_CACHE_TTL, size=USER_CACHE_SIZE):
+        self.user_repo = user_repo
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.expires = OrderedDict()  # email -> monotonic expiry
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def remember(self, email):
+        with self.lock:
+            self.expires[email] = time.monotonic() + self.ttl
+            self.expires.move_to_end(email)
+            while len(self.expires) > self.size:
+                self.expires.popitem(last=False)
+                self.evictions += 1
+
+    def cached(self, email):
+        """True if ``email`` is cached and fresh; counts the hit or miss."""
+        with self.lock:
+            expires = self.expires.get(email)
+            if expires is not None and expires > time.monotonic():
+                self.expires.move_to_end(email)
+                self.hits += 1
+                hit = True
+            else:
+                if expires is not None:
+                    del self.expires[email]
+                self.misses += 1
+                hit = False
+        LOOKUPS.inc(("hit" if hit else "miss",))
+        return hit
+
+    async def exists(self, email):
+        if self.cached(email):
+            return True
+        if await self.user_repo.exists(email):
+            self.remember(email)
+            return True
+        return False
+
+    async def known(self, emails):
+        """The subset of ``emails`` that belong to registered users; one query for all misses."""
+        emails = set(emails)
+        found = {email for email in emails if self.cached(email)}
+        missing = emails - found
+        if missing:
+            for email in await self.user_repo.known_emails(missing):
+                self.remember(email)
+                found.add(email)
+        return found
+
+    def stats(self):
+        with self.lock:
+            size = len(self.expires)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -1,4 +1,6 @@
+// <generated-food-imports>
 import food_1751301831177 from "./food_1751301831177.jpeg";
+// </generated-food-imports>
 import basket_icon from './basket_icon.png'
 import logo from './logo.png'
 import logo_bottom from './logo-bottom.png'
@@ -120,6 +122,7 @@ export const menu_list = [
     }]
 
 export const food_list = [
+    // <generated-food-items>
     {
         _id: "1751301831177",
         name: "Aarya Nema",
@@ -128,6 +131,7 @@ export const food_list = [
         description: "dfghjk",
         category: "Rolls"
     },
+    // </generated-food-items>
     {
         _id: "1",
         name: "Greek salad",